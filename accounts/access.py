@@ -0,0 +1,167 @@
+# accounts/access.py
+"""
+Per-request and per-session cache of a user's roles and teaching assignments.
+
+for_user(user) returns a UserAccess with the user's role names, the classes
+they are assigned to (TeacherClass) and the subjects they teach with the
+forms each is offered in (TeacherSubject), so permission checks are set
+lookups:
+
+    access = for_user(request.user)
+    access.has_role('Teacher')          # or access.is_teacher
+    access.has_role('School Admin', 'HOD')
+    access.teaches_subject(subject_id)
+
+The first call in a request stores the UserAccess on the user object, so
+mixins, views and template filters share it. AccessMiddleware also keeps it
+in the session, stamped with the user's access generation, so it is loaded
+from the database (three queries) once per session rather than once per
+request. The generation is CustomUser.access_generation, read with the user
+that authenticates the request, so every worker sees the same value. The
+signal handlers in accounts/models.py bump it, in the transaction that makes
+the change, when a user's roles (ManageUserAPIView, the admin), class or
+subject assignments change, and for a role's users when it is renamed or
+deleted.
+"""
+import threading
+
+from django.db.models import F
+
+SESSION_KEY = '_access'
+
+_local = threading.local()
+
+
+def bump_users(user_ids):
+    """Invalidate the cached access of some users (ids, or a values('user_id') queryset), in every session."""
+    from .models import CustomUser
+
+    CustomUser.objects.filter(pk__in=user_ids).update(access_generation=F('access_generation') + 1)
+
+
+def bump_role(role_id):
+    """Invalidate the cached access of every user holding a role."""
+    from .models import CustomUser
+
+    CustomUser.objects.filter(profile__roles=role_id).update(access_generation=F('access_generation') + 1)
+
+
+class UserAccess:
+    """
+    access = UserAccess(user).load()
+
+    roles      frozenset of role names
+    classes    [{'id', 'form_level', 'form_level_id', 'stream', 'is_class_teacher', 'name'}], by form and stream;
+               form_level is the form number, form_level_id the school's FormLevel (None if it has none)
+    subjects   {subject_id: frozenset of form level ids the subject is offered in}
+    """
+
+    def __init__(self, user):
+        self.user_id = user.pk
+        self.roles = frozenset()
+        self.classes = []
+        self.subjects = {}
+
+    def load(self):
+        from django.db.models import OuterRef, Subquery
+
+        from school.models import FormLevel
+        from .models import Role, TeacherClass, TeacherSubject
+
+        if self.user_id is None:
+            return self
+        self.roles = frozenset(Role.objects.filter(profiles__user_id=self.user_id).values_list('name', flat=True))
+        self.classes = [
+            {**c, 'name': f"Form {c['form_level']} {c['stream']}"}  # TeacherClass.class_name
+            for c in TeacherClass.objects.filter(teacher_id=self.user_id)
+            .annotate(form_level_id=Subquery(
+                FormLevel.objects.filter(school_id=OuterRef('school_id'), number=OuterRef('form_level')).values('id')[:1]
+            ))
+            .order_by('form_level', 'stream')
+            .values('id', 'form_level', 'form_level_id', 'stream', 'is_class_teacher')
+        ]
+        subjects = {}
+        for subject_id, form_id in TeacherSubject.objects.filter(teacher_id=self.user_id).values_list('subject_id', 'subject__form_levels'):
+            forms = subjects.setdefault(subject_id, set())
+            if form_id is not None:
+                forms.add(form_id)
+        self.subjects = {subject_id: frozenset(forms) for subject_id, forms in subjects.items()}
+        return self
+
+    # Session storage
+    #----------------------------------------------------------------------
+    def to_session(self, generation):
+        return {
+            'user': self.user_id,
+            'generation': generation,
+            'roles': sorted(self.roles),
+            'classes': self.classes,
+            'subjects': [[subject_id, sorted(forms)] for subject_id, forms in self.subjects.items()],
+        }
+
+    @classmethod
+    def from_session(cls, user, stored, generation):
+        """The UserAccess kept in the session, or None if it belongs to another user or generation."""
+        if not stored or stored.get('user') != user.pk or stored.get('generation') != generation:
+            return None
+        access = cls(user)
+        access.roles = frozenset(stored['roles'])
+        access.classes = stored['classes']
+        access.subjects = {subject_id: frozenset(forms) for subject_id, forms in stored['subjects']}
+        return access
+
+    # Checks
+    #----------------------------------------------------------------------
+    def has_role(self, *names):
+        return not self.roles.isdisjoint(names)
+
+    @property
+    def is_teacher(self):
+        return 'Teacher' in self.roles
+
+    @property
+    def subject_ids(self):
+        return set(self.subjects)
+
+    @property
+    def subject_forms(self):
+        """Form level ids any of the user's subjects is offered in."""
+        return set().union(*self.subjects.values())
+
+    def teaches_subject(self, subject_id):
+        return subject_id in self.subjects
+
+
+def for_user(user):
+    """The user's UserAccess, loaded at most once per request and, under AccessMiddleware, per session."""
+    access = getattr(user, '_access', None)
+    if access is not None:
+        return access
+    if not user.is_authenticated:
+        access = UserAccess(user)
+    else:
+        session = getattr(_local, 'session', None)
+        if session is not None and session.get('_auth_user_id') == str(user.pk):
+            generation = user.access_generation
+            access = UserAccess.from_session(user, session.get(SESSION_KEY), generation)
+            if access is None:
+                access = UserAccess(user).load()
+                session[SESSION_KEY] = access.to_session(generation)
+        else:
+            access = UserAccess(user).load()
+    user._access = access
+    return access
+
+
+class AccessMiddleware:
+    """Let for_user() keep access in the session of the current request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _local.session = getattr(request, 'session', None)
+        try:
+            return self.get_response(request)
+        finally:
+            _local.session = None
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 23:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_teachergroup_teachergroupmembership'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='access_generation',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,9 +1,12 @@
 # Location: school_cheng_ji/accounts/models.py
 
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver 
+from exams import dashboard_cache
+from school import stats as school_stats
+from . import access
 from utils.validators import format_kenyan_phone_number, kenyan_phone_number_validator
 
 # A custom User model to allow for school multi-tenancy.
@@ -18,10 +21,20 @@ class CustomUser(AbstractUser):
         related_name='users'
     )
     
+    # Stamps the roles and assignments sessions keep for the user (accounts.access);
+    # only ever changed by an UPDATE in the transaction that changes them.
+    access_generation = models.PositiveIntegerField(default=0, editable=False)
+
     # We will use the username field for a user's email address
     # For a teacher, we can set it to their email. For a student, we can make it a combination of their admission number and school code.
 
     def save(self, *args, **kwargs):
+        # A user loaded before its access was bumped must not write the older generation back
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'access_generation'
+            ]
         super().save(*args, **kwargs)
     
 class Role(models.Model):
@@ -122,4 +135,70 @@ class TeacherGroupMembership(models.Model):
         unique_together = ('teacher', 'group')
 
     def __str__(self):
-        return f"{self.teacher.get_full_name()} in {self.group.name}"
\ No newline at end of file
+        return f"{self.teacher.get_full_name()} in {self.group.name}"
+
+# Dashboards count teachers and list each teacher's classes and subjects.
+def _bump_dashboards(school_id):
+    transaction.on_commit(lambda: dashboard_cache.bump_structure(school_id))
+
+@receiver([post_save, post_delete], sender=TeacherClass)
+def invalidate_dashboards_on_class_assignment(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _bump_dashboards(instance.school_id)
+
+@receiver([post_save, post_delete], sender=TeacherSubject)
+def invalidate_dashboards_on_subject_assignment(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _bump_dashboards(instance.teacher.school_id)
+
+@receiver(m2m_changed, sender=Profile.roles.through)
+def invalidate_dashboards_on_role_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        _bump_dashboards(instance.user.school_id)
+        return
+    profiles = Profile.objects.filter(pk__in=pk_set or ()).values_list('user__school_id', flat=True)
+    for school_id in set(profiles):
+        _bump_dashboards(school_id)
+
+# School counters include the number of teachers.
+@receiver(m2m_changed, sender=Profile.roles.through)
+def mark_school_stats_stale_on_role_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        school_stats.mark_stale(instance.user.school_id)
+        return
+    profiles = Profile.objects.filter(pk__in=pk_set or ()).values_list('user__school_id', flat=True)
+    for school_id in set(profiles):
+        school_stats.mark_stale(school_id)
+
+@receiver(post_delete, sender=CustomUser)
+def mark_school_stats_stale_on_user_delete(sender, instance, **kwargs):
+    school_stats.mark_stale(instance.school_id)
+
+# Sessions keep each user's roles and assignments (accounts.access); the
+# generation is bumped in the same transaction as the change it stamps.
+@receiver([post_save, post_delete], sender=TeacherClass)
+@receiver([post_save, post_delete], sender=TeacherSubject)
+def invalidate_access_on_assignment(sender, instance, raw=False, **kwargs):
+    if not raw:
+        access.bump_users([instance.teacher_id])
+
+@receiver(m2m_changed, sender=Profile.roles.through)
+def invalidate_access_on_role_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            access.bump_users([instance.user_id])
+    elif action == 'pre_clear':
+        # pk_set is None on clear; bump the role's users while they can still be found
+        access.bump_role(instance.pk)
+    elif action in ('post_add', 'post_remove'):
+        access.bump_users(Profile.objects.filter(pk__in=pk_set).values('user_id'))
+
+@receiver(post_save, sender=Role)
+@receiver(pre_delete, sender=Role)
+def invalidate_access_on_role_edit(sender, instance, raw=False, **kwargs):
+    if not raw:
+        access.bump_role(instance.pk)
@@ -1,3 +1,49 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from school.models import School
+from . import access
+from .models import CustomUser, Role
+
+
+class SessionAccessTests(TestCase):
+    """Access kept in a session is dropped once the user's roles change, whichever worker changed them."""
+
+    def setUp(self):
+        self.school = School.objects.create(name='Access School')
+        self.role = Role.objects.create(name='HOD')
+        self.user = CustomUser.objects.create_user('hod', password='x', school=self.school)
+        self.user.profile.roles.add(self.role)
+        self.session = {'_auth_user_id': str(self.user.pk)}
+
+    def tearDown(self):
+        access._local.session = None
+
+    def request_access(self):
+        """for_user() as a new request sees it: the user reloaded, the session kept."""
+        access._local.session = self.session
+        return access.for_user(CustomUser.objects.get(pk=self.user.pk))
+
+    def test_session_access_is_reused(self):
+        self.assertTrue(self.request_access().has_role('HOD'))
+        with self.assertNumQueries(1):  # the user
+            self.assertTrue(self.request_access().has_role('HOD'))
+
+    def test_role_removal_in_another_worker_is_seen(self):
+        self.assertTrue(self.request_access().has_role('HOD'))
+        # Revoked by another worker, with a local memory cache of its own
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'other-worker'}}):
+            self.user.profile.roles.remove(self.role)
+        self.assertFalse(self.request_access().has_role('HOD'))
+
+    def test_role_delete_is_seen(self):
+        self.assertTrue(self.request_access().has_role('HOD'))
+        self.role.delete()
+        self.assertFalse(self.request_access().has_role('HOD'))
+
+    def test_stale_user_save_keeps_the_bump(self):
+        stale = CustomUser.objects.get(pk=self.user.pk)
+        self.assertTrue(self.request_access().has_role('HOD'))
+        self.user.profile.roles.remove(self.role)
+        stale.first_name = 'Renamed'
+        stale.save()
+        self.assertFalse(self.request_access().has_role('HOD'))
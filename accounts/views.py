@@ -11,9 +11,12 @@ from django.core.mail import send_mail
 from datetime import datetime
 import random
 import string
+from .access import for_user
 from .models import CustomUser, Profile, TeacherClass, Role
 from school.models import School
 from students.models import Student
+from exams import dashboard_cache
+from exams.completion import CompletionMatrix
 from exams.models import ExamResult, Exam, GradingSystem, SubjectCategory, GradingRange
 from subjects.models import Subject, SubjectPaper
 from django.db.models import Count, Q, Avg, Max
@@ -28,18 +31,18 @@ class TeacherRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
     def test_func(self):
         if self.request.user.is_superuser:
             return True
-        return self.request.user.profile.roles.filter(name='Teacher').exists()
+        return for_user(self.request.user).is_teacher
 
 # Mixin to ensure a user is an HOD
 class HODRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
     def test_func(self):
-        return self.request.user.profile.roles.filter(name='HOD').exists()
+        return for_user(self.request.user).has_role('HOD')
 # Mixin to ensure a user is an admin (Principal or superuser)
 class AdminRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
     def test_func(self):
         if self.request.user.is_superuser:
             return True
-        return self.request.user.profile.roles.filter(name='Principal').exists()
+        return for_user(self.request.user).has_role('Principal')
 
 
 class CustomLoginView(LoginView):
@@ -61,8 +64,9 @@ class TeacherDashboardView(LoginRequiredMixin, TemplateView):
         # Get teacher's assigned classes
         assigned_classes = TeacherClass.objects.filter(teacher=user).order_by('form_level', 'stream')
 
-        # Get unique form levels assigned to this teacher
-        assigned_forms = assigned_classes.values_list('form_level', flat=True).distinct().order_by('form_level')
+        # Get unique classes and form levels assigned to this teacher
+        classes = list(dict.fromkeys((c['form_level'], c['form_level_id'], c['stream']) for c in for_user(user).classes))
+        assigned_forms = sorted({form_level for form_level, _, _ in classes})
 
         # Get subjects taught by this teacher
         taught_subjects = Subject.objects.filter(
@@ -70,52 +74,37 @@ class TeacherDashboardView(LoginRequiredMixin, TemplateView):
         ).distinct().order_by('name')
 
         # Get exam management data - exams where teacher has subjects
-        teacher_exams = []
-        for form_level in assigned_forms:
-            streams_in_form = assigned_classes.filter(form_level=form_level).values_list('stream', flat=True).distinct()
-            for stream in streams_in_form:
-                subjects_in_stream = taught_subjects.filter(
-                    teacher_assignments__teacher=user,
-                    teacher_assignments__form_level=form_level,
-                    teacher_assignments__stream=stream
-                )
-
-                for subject in subjects_in_stream:
-                    # Get exams for this subject/form/stream
-                    exams = Exam.objects.filter(
-                        school=school,
-                        exam_results__subject=subject,
-                        exam_results__student__form_level=form_level,
-                        exam_results__student__stream=stream
-                    ).distinct().order_by('-created_at')
-
+        def build_teacher_exams():
+            subjects = list(taught_subjects)
+            exams = list(Exam.objects.filter(school=school).order_by('-created_at'))
+            matrix = CompletionMatrix(user.school_id).load([exam.id for exam in exams])
+
+            teacher_exams = []
+            for form_level, form_level_id, stream in classes:
+                # Subject assignments are not scoped to a class, so every taught subject applies
+                for subject in subjects:
                     for exam in exams:
-                        # Check completion status
-                        total_students = Student.objects.filter(
-                            school=school,
-                            form_level=form_level,
-                            stream=stream
-                        ).count()
-
-                        existing_results = ExamResult.objects.filter(
-                            exam=exam,
-                            subject=subject,
-                            student__form_level=form_level,
-                            student__stream=stream
-                        ).count()
-
-                        completion_percentage = (existing_results / total_students * 100) if total_students > 0 else 0
-
+                        # The matrix is keyed by FormLevel id, the class by form number
+                        enrolled, entered = matrix.cell(exam.id, form_level_id, stream, subject.id)
+                        # Only exams the class already has results for
+                        if not entered:
+                            continue
                         teacher_exams.append({
                             'exam': exam,
                             'form_level': form_level,
+                            'form_level_id': form_level_id,
                             'stream': stream,
                             'subject': subject,
-                            'total_students': total_students,
-                            'existing_results': existing_results,
-                            'completion_percentage': completion_percentage,
+                            'total_students': enrolled,
+                            'existing_results': entered,
+                            'completion_percentage': matrix.percentage(enrolled, entered),
                             'status': 'Published' if exam.is_published else 'Draft',
                         })
+            return teacher_exams
+
+        teacher_exams = dashboard_cache.get_or_build(
+            'teacher_exams', build_teacher_exams, user.school_id, extra=user.id
+        )
 
         # Add the data to the context dictionary
         context.update({
@@ -434,7 +423,7 @@ class StudentDashboardView(LoginRequiredMixin, TemplateView):
         user = self.request.user
 
         # Check if user is a student
-        if not user.profile.roles.filter(name='Student').exists():
+        if not for_user(user).has_role('Student'):
             return redirect('accounts:teacher_dashboard')
 
         # Get student information
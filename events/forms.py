@@ -1,5 +1,6 @@
 from django import forms
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from .models import Event
 
 User = get_user_model()
@@ -16,7 +17,7 @@ class EventForm(forms.ModelForm):
 
     class Meta:
         model = Event
-        fields = ['name', 'event_type', 'start_date', 'end_date', 'participants_type', 'participants']
+        fields = ['name', 'event_type', 'start_date', 'end_date', 'repeat', 'repeat_until', 'participants_type', 'participants']
         widgets = {
             'name': forms.TextInput(attrs={
                 'class': 'form-control',
@@ -36,13 +37,22 @@ class EventForm(forms.ModelForm):
                 'class': 'form-control',
                 'type': 'datetime-local'
             }),
+            'repeat': forms.Select(attrs={
+                'class': 'form-control'
+            }),
+            'repeat_until': forms.DateInput(attrs={
+                'class': 'form-control',
+                'type': 'date'
+            }),
         }
 
     def __init__(self, *args, **kwargs):
         self.user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
+        # Clients that do not offer repeating create one-off events
+        self.fields['repeat'].required = False
         if self.user and self.user.school:
-            self.fields['participants'].queryset = User.objects.filter(profile__school=self.user.school)
+            self.fields['participants'].queryset = User.objects.filter(school=self.user.school)
 
     def clean(self):
         cleaned_data = super().clean()
@@ -56,4 +66,14 @@ class EventForm(forms.ModelForm):
         if end_date and start_date and end_date < start_date:
             raise forms.ValidationError("End date must be after start date")
 
+        repeat = cleaned_data['repeat'] = cleaned_data.get('repeat') or 'none'
+        repeat_until = cleaned_data.get('repeat_until')
+        if repeat != 'none':
+            if not repeat_until:
+                raise forms.ValidationError("Repeat until is required for repeating events")
+            if start_date and repeat_until < timezone.localtime(start_date).date():
+                raise forms.ValidationError("Repeat until must be on or after the start date")
+        else:
+            cleaned_data['repeat_until'] = None
+
         return cleaned_data
\ No newline at end of file
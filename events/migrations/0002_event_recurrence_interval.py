@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-18 00:12
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_ends_at(apps, schema_editor):
+    # Existing events do not repeat: they end at their end date, or at their start
+    Event = apps.get_model('events', 'Event')
+    Event.objects.filter(end_date__isnull=False).update(ends_at=F('end_date'))
+    Event.objects.filter(end_date__isnull=True).update(ends_at=F('start_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='repeat',
+            field=models.CharField(choices=[('none', 'Does not repeat'), ('weekly', 'Weekly')], default='none', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='repeat_until',
+            field=models.DateField(blank=True, help_text='Last day a repeating event occurs on, e.g. the end of term', null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='ends_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_ends_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='event',
+            name='ends_at',
+            field=models.DateTimeField(editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['school', 'start_date', 'ends_at'], name='event_school_interval_idx'),
+        ),
+    ]
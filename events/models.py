@@ -1,6 +1,7 @@
 from django.db import models
 from django.conf import settings
 from school.models import School
+from .occurrences import series_end
 
 class Event(models.Model):
     EVENT_TYPE_CHOICES = [
@@ -16,11 +17,20 @@ class Event(models.Model):
         ('all', 'All'),
     ]
 
+    REPEAT_CHOICES = [
+        ('none', 'Does not repeat'),
+        ('weekly', 'Weekly'),
+    ]
+
     school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='events')
     name = models.CharField(max_length=200)
     event_type = models.CharField(max_length=10, choices=EVENT_TYPE_CHOICES, default='single')
     start_date = models.DateTimeField()
     end_date = models.DateTimeField(null=True, blank=True)  # Only for range events
+    repeat = models.CharField(max_length=10, choices=REPEAT_CHOICES, default='none')
+    repeat_until = models.DateField(null=True, blank=True, help_text="Last day a repeating event occurs on, e.g. the end of term")
+    # End of the last occurrence, kept by save() for the (school, start_date, ends_at) interval index
+    ends_at = models.DateTimeField(editable=False)
     participants_type = models.CharField(max_length=20, choices=PARTICIPANT_TYPE_CHOICES, default='all')
     participants = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='events', blank=True)
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='created_events')
@@ -29,6 +39,16 @@ class Event(models.Model):
 
     class Meta:
         ordering = ['start_date']
+        indexes = [
+            models.Index(fields=['school', 'start_date', 'ends_at'], name='event_school_interval_idx'),
+        ]
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+    def save(self, *args, **kwargs):
+        self.ends_at = series_end(self.start_date, self.end_date, self.repeat, self.repeat_until)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'ends_at'}
+        super().save(*args, **kwargs)
@@ -0,0 +1,166 @@
+# events/occurrences.py
+"""
+Calendar windows and occurrences of repeating events.
+
+An event is stored once, however often it repeats: a weekly lesson for a
+term is one row with repeat='weekly' and repeat_until set to the last day of
+term. Event.ends_at holds the end of its last occurrence (its own end if it
+does not repeat), so the events overlapping a window are found with one
+range query on the (school, start_date, ends_at) index:
+
+    start_date < window end  and  ends_at >= window start
+
+EventWindow(school_id, first_day, end_day).load() runs that query and
+expands repeating events into Occurrence objects for the window only.
+Repeats are computed in local time, so a lesson at 08:00 stays at 08:00.
+"""
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+VIEWS = ('month', 'week', 'day', 'list')
+
+PERIODS = {
+    'weekly': timedelta(weeks=1),
+}
+
+
+def _local(value):
+    return timezone.localtime(value).replace(tzinfo=None)
+
+
+def _aware(value):
+    return timezone.make_aware(value)
+
+
+def _midnight(day):
+    return _aware(datetime.combine(day, time.min))
+
+
+def _repeat_bound(repeat, repeat_until):
+    """(period, exclusive local bound on occurrence starts), or (None, None) if the event does not repeat."""
+    period = PERIODS.get(repeat)
+    if period is None or repeat_until is None:
+        return None, None
+    return period, datetime.combine(repeat_until + timedelta(days=1), time.min)
+
+
+def overlaps(start, end, window_start, window_end):
+    """Whether [start, end) meets the window; an event without duration belongs to the window its instant is in."""
+    return start < window_end and (end > window_start or start >= window_start)
+
+
+def series_end(start, end, repeat, repeat_until):
+    """End of the last occurrence of an event."""
+    end = end or start
+    period, bound = _repeat_bound(repeat, repeat_until)
+    local_start = _local(start)
+    if period is None or bound <= local_start:
+        return end
+    repeats = (bound - local_start - timedelta(microseconds=1)) // period
+    return _aware(_local(end) + repeats * period)
+
+
+def occurrence_spans(start, end, repeat, repeat_until, window_start, window_end):
+    """(start, end) of each occurrence of an event that overlaps the window, in order."""
+    end = end or start
+    period, bound = _repeat_bound(repeat, repeat_until)
+    if period is None:
+        if overlaps(start, end, window_start, window_end):
+            yield start, end
+        return
+
+    local_start, local_end = _local(start), _local(end)
+    local_window_start, local_window_end = _local(window_start), _local(window_end)
+    # Skip straight to the first occurrence that can reach the window
+    n = max(0, (local_window_start - local_end) // period)
+    while True:
+        occurrence_start = local_start + n * period
+        if occurrence_start >= bound or occurrence_start >= local_window_end:
+            return
+        occurrence_end = local_end + n * period
+        if overlaps(occurrence_start, occurrence_end, local_window_start, local_window_end):
+            yield _aware(occurrence_start), _aware(occurrence_end)
+        n += 1
+
+
+def window_days(view_type, day):
+    """[first_day, end_day) shown by a calendar view around day; the list view covers the month."""
+    if view_type == 'day':
+        return day, day + timedelta(days=1)
+    if view_type == 'week':
+        monday = day - timedelta(days=day.weekday())
+        return monday, monday + timedelta(days=7)
+    first = day.replace(day=1)
+    return first, (first + timedelta(days=32)).replace(day=1)
+
+
+class Occurrence:
+    """One occurrence of an event; reads like the event itself in templates."""
+
+    def __init__(self, event, start_date, end_date):
+        self.event = event
+        self.start_date = start_date
+        self.end_date = end_date
+
+    def __getattr__(self, name):
+        return getattr(self.event, name)
+
+    @property
+    def is_repeat(self):
+        return self.event.repeat != 'none'
+
+    def days(self):
+        """Local dates the occurrence covers; an end at midnight does not cover that day."""
+        first = timezone.localtime(self.start_date).date()
+        end = timezone.localtime(self.end_date)
+        last = end.date()
+        if last > first and end.time() == time.min:
+            last -= timedelta(days=1)
+        return [first + timedelta(days=n) for n in range((last - first).days + 1)]
+
+
+class EventWindow:
+    """
+    window = EventWindow(school_id, first_day, end_day).load()
+    window.occurrences      every occurrence overlapping [first_day, end_day), by start
+    window.days()           [(date, [occurrences])] for each day of the window
+    """
+
+    def __init__(self, school_id, first_day, end_day):
+        self.school_id = school_id
+        self.first_day = first_day
+        self.end_day = end_day
+        self.start = _midnight(first_day)
+        self.end = _midnight(end_day)
+        self.occurrences = []
+
+    @classmethod
+    def for_view(cls, school_id, view_type, day):
+        return cls(school_id, *window_days(view_type, day))
+
+    def load(self):
+        from .models import Event
+
+        events = Event.objects.filter(
+            school_id=self.school_id,
+            start_date__lt=self.end,
+            ends_at__gte=self.start,
+        )
+        occurrences = []
+        for event in events:
+            for start, end in occurrence_spans(
+                event.start_date, event.end_date, event.repeat, event.repeat_until, self.start, self.end
+            ):
+                occurrences.append(Occurrence(event, start, end))
+        occurrences.sort(key=lambda occurrence: (occurrence.start_date, occurrence.event.id))
+        self.occurrences = occurrences
+        return self
+
+    def days(self):
+        by_day = {self.first_day + timedelta(days=n): [] for n in range((self.end_day - self.first_day).days)}
+        for occurrence in self.occurrences:
+            for day in occurrence.days():
+                if day in by_day:
+                    by_day[day].append(occurrence)
+        return list(by_day.items())
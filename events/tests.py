@@ -1,3 +1,93 @@
+import random
+from datetime import date, datetime, timedelta
+
 from django.test import TestCase
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from school.models import School
+from .models import Event
+from .occurrences import EventWindow, occurrence_spans, series_end
+
+
+def every_occurrence(start, end, repeat, repeat_until):
+    """Each (start, end) of an event, listed one week at a time from its first occurrence, in local time."""
+    end = end or start
+    if repeat != 'weekly' or repeat_until is None:
+        return [(start, end)]
+    local_start, local_end = timezone.localtime(start), timezone.localtime(end)
+    spans = []
+    week = 0
+    while (local_start + timedelta(weeks=week)).date() <= repeat_until:
+        spans.append((
+            timezone.make_aware(local_start.replace(tzinfo=None) + timedelta(weeks=week)),
+            timezone.make_aware(local_end.replace(tzinfo=None) + timedelta(weeks=week)),
+        ))
+        week += 1
+    return spans
+
+
+def in_window(span, window_start, window_end):
+    start, end = span
+    if start == end:
+        return window_start <= start < window_end
+    return start < window_end and end > window_start
+
+
+def random_event(generator):
+    """(start, end, repeat, repeat_until) with instants, same-day and multi-day spans, some repeating weekly."""
+    start = timezone.make_aware(datetime(2026, 1, 5) + timedelta(days=generator.randrange(90), hours=generator.choice([0, 8, 14, 23])))
+    end = generator.choice([None, start, start + timedelta(hours=generator.choice([1, 16, 24])), start + timedelta(days=generator.randrange(1, 10))])
+    if generator.random() < 0.6:
+        repeat_until = timezone.localtime(start).date() + timedelta(days=generator.randrange(-3, 80))
+        return start, end, 'weekly', repeat_until
+    return start, end, 'none', None
+
+
+class OccurrenceTests(TestCase):
+    """Weekly repeats in a window against listing every occurrence of the series."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.school = School.objects.create(name='Calendar School')
+        cls.user = CustomUser.objects.create_user('planner', password='x', school=cls.school)
+
+    def test_spans_and_series_end(self):
+        generator = random.Random(8)
+        for _ in range(300):
+            event = random_event(generator)
+            spans = every_occurrence(*event)
+            first_day = date(2026, 1, 1) + timedelta(days=generator.randrange(150))
+            window_start = timezone.make_aware(datetime.combine(first_day, datetime.min.time()))
+            window_end = window_start + timedelta(days=generator.choice([1, 7, 31]))
+            with self.subTest(event=event, window=first_day):
+                self.assertEqual(
+                    list(occurrence_spans(*event, window_start, window_end)),
+                    [span for span in spans if in_window(span, window_start, window_end)],
+                )
+                self.assertEqual(series_end(*event), spans[-1][1] if spans else event[1] or event[0])
+
+    def test_windows_load_every_overlapping_occurrence(self):
+        generator = random.Random(9)
+        events = []
+        for n in range(60):
+            start, end, repeat, repeat_until = random_event(generator)
+            events.append(Event.objects.create(
+                school=self.school, name=f'Event {n}', start_date=start, end_date=end,
+                repeat=repeat, repeat_until=repeat_until, created_by=self.user,
+            ))
 
-# Create your tests here.
+        for view_type in ('day', 'week', 'month'):
+            for _ in range(15):
+                day = date(2026, 1, 1) + timedelta(days=generator.randrange(150))
+                window = EventWindow.for_view(self.school.id, view_type, day).load()
+                expected = sorted(
+                    (span[0], event.id)
+                    for event in events
+                    for span in every_occurrence(event.start_date, event.end_date, event.repeat, event.repeat_until)
+                    if in_window(span, window.start, window.end)
+                )
+                with self.subTest(view=view_type, day=day):
+                    self.assertEqual(
+                        [(occurrence.start_date, occurrence.event.id) for occurrence in window.occurrences], expected
+                    )
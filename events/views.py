@@ -1,52 +1,68 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
-from datetime import datetime, timedelta
+from datetime import date, timedelta
 import calendar as cal
 from django.utils import timezone
-from .models import Event
 from .forms import EventForm
+from .occurrences import VIEWS, EventWindow
 
 @login_required
 def calendar_view(request):
     # Get current month/year from GET params or use current date
     now = timezone.now()
-    year = int(request.GET.get('year', now.year))
-    month = int(request.GET.get('month', now.month))
+    today = timezone.localdate()
+    year = int(request.GET.get('year', today.year))
+    month = int(request.GET.get('month', today.month))
     view_type = request.GET.get('view', 'month')  # month, week, day, list
+    if view_type not in VIEWS:
+        view_type = 'month'
+
+    # The day the week and day views show; defaults to today in the current month
+    try:
+        day = date.fromisoformat(request.GET['date'])
+    except (KeyError, ValueError):
+        day = today if (year, month) == (today.year, today.month) else date(year, month, 1)
+    if view_type in ('month', 'list'):
+        day = date(year, month, 1)
+    year, month = day.year, day.month
 
     # Create calendar
     cal_obj = cal.monthcalendar(year, month)
     month_name = cal.month_name[month]
 
-    # Get events for this month
-    start_date = timezone.make_aware(datetime(year, month, 1))
-    if month == 12:
-        end_date = timezone.make_aware(datetime(year + 1, 1, 1))
-    else:
-        end_date = timezone.make_aware(datetime(year, month + 1, 1))
-
-    events = Event.objects.filter(
-        school=request.user.school,
-        start_date__gte=start_date,
-        start_date__lt=end_date
-    )
+    # Every event overlapping the visible days, repeating events expanded for them only
+    window = EventWindow.for_view(request.user.school_id, view_type, day).load()
+    days = window.days()
 
     # Organize events by day
-    events_by_day = {}
-    for event in events:
-        day = event.start_date.day
-        if day not in events_by_day:
-            events_by_day[day] = []
-        events_by_day[day].append(event)
+    events_by_day = {d.day: occurrences for d, occurrences in days if d.month == month}
+    weeks = [
+        [{'day': number, 'events': events_by_day.get(number, [])} for number in week]
+        for week in cal_obj
+    ]
+
+    step = {'day': timedelta(days=1), 'week': timedelta(days=7)}.get(view_type)
+    if step:
+        previous_day, next_day = day - step, day + step
+    else:
+        previous_day = (day - timedelta(days=1)).replace(day=1)
+        next_day = (day + timedelta(days=32)).replace(day=1)
 
     context = {
         'calendar': cal_obj,
+        'weeks': weeks,
+        'days': days,
+        'occurrences': window.occurrences,
         'year': year,
         'month': month,
         'month_name': month_name,
         'events_by_day': events_by_day,
         'view_type': view_type,
+        'views': VIEWS,
+        'day': day,
+        'previous_day': previous_day,
+        'next_day': next_day,
         'today': now,
     }
 
@@ -36,15 +36,19 @@ INSTALLED_APPS = [
     'subjects',
     'billing',
     'events',
+    'jobs',
+    'perf',
 
 ]
 
 MIDDLEWARE = [
+    'perf.instrumentation.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.access.AccessMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -71,12 +75,89 @@ WSGI_APPLICATION = 'exam_system.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# SQLite unless DB_ENGINE=postgresql selects the production profile, configured
+# by DB_NAME, DB_USER, DB_PASSWORD, DB_HOST and DB_PORT. PostgreSQL connections
+# come from a psycopg pool (DB_POOL_MIN/DB_POOL_MAX); with DB_POOL=0 they are
+# kept open per thread for DB_CONN_MAX_AGE seconds instead.
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'exam_system'),
+            'USER': os.environ.get('DB_USER', 'postgres'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            'CONN_HEALTH_CHECKS': True,
+        }
     }
-}
+    if os.environ.get('DB_POOL', '1') == '1':
+        # Pooled connections replace persistent ones; Django requires CONN_MAX_AGE = 0
+        DATABASES['default']['OPTIONS'] = {
+            'pool': {
+                'min_size': int(os.environ.get('DB_POOL_MIN', 2)),
+                'max_size': int(os.environ.get('DB_POOL_MAX', 20)),
+                'timeout': 10,
+            },
+        }
+    else:
+        DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 600))
+else:
+    # WAL lets teachers read while another saves marks, and transactions take the
+    # write lock when they begin, waiting up to DB_BUSY_TIMEOUT ms for it, instead
+    # of failing with "database is locked" when a read upgrades to a write.
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 128 * 1024 * 1024,
+        'busy_timeout': int(os.environ.get('DB_BUSY_TIMEOUT', 20000)),
+    }
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            },
+        }
+    }
+
+# Cache
+# CACHE_URL selects a Redis-protocol server (redis://, rediss://) or a shared
+# directory (file:///path); without it each process keeps its own local memory
+# cache, so dashboards may lag writes made by other processes until
+# DASHBOARD_CACHE_TIMEOUT.
+CACHE_URL = os.environ.get('CACHE_URL', '')
+
+if CACHE_URL.startswith(('redis://', 'rediss://')):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+elif CACHE_URL.startswith('file://'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': CACHE_URL[len('file://'):],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'exam-system',
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+
+# Seconds a dashboard value is kept (exams.dashboard_cache)
+DASHBOARD_CACHE_TIMEOUT = int(os.environ.get('DASHBOARD_CACHE_TIMEOUT', 300))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -154,4 +235,8 @@ DEFAULT_FROM_EMAIL = 'noreply@schoolchengji.com'
 # Login/Logout URLs
 LOGIN_URL = '/accounts/find-account/'
 LOGIN_REDIRECT_URL = '/school/'
-LOGOUT_REDIRECT_URL = '/accounts/find-account/'
\ No newline at end of file
+LOGOUT_REDIRECT_URL = '/accounts/find-account/'
+# Request instrumentation (perf.instrumentation.QueryInstrumentationMiddleware)
+PERF_RING_BUFFER_SIZE = 500
+PERF_CAPTURE_SQL = False
+PERF_QUERY_LOG = None
@@ -4,12 +4,13 @@ from django.contrib.auth import views as auth_views
 from django.conf import settings
 from django.conf.urls.static import static # Import the static function
 from django.shortcuts import redirect
+from accounts.access import for_user
 
 def root_redirect(request):
     """Redirect root URL based on authentication status"""
     if request.user.is_authenticated:
         # Check if user is a student
-        if hasattr(request.user, 'profile') and request.user.profile.roles.filter(name='Student').exists():
+        if for_user(request.user).has_role('Student'):
             return redirect('accounts:student_dashboard')
         else:
             return redirect(settings.LOGIN_REDIRECT_URL)
@@ -33,6 +34,7 @@ urlpatterns = [
     path('reports/', include('reports.urls')),   # New: Added reports URL
     path('billing/', include('billing.urls')),   # New: Added billing URL
     path('events/', include('events.urls')),     # New: Added events URL
+    path('jobs/', include('jobs.urls')),         # Background job status polling
 ]
 
 # Only serve media files in development mode
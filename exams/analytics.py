@@ -0,0 +1,249 @@
+# exams/analytics.py
+"""
+Refresh of the materialized ExamSubjectStats and ExamDepartmentStats tables.
+
+Dashboards read subject means, extremes, spread and grade distributions
+from ExamSubjectStats instead of aggregating ExamResult per subject. The
+table is rebuilt here from a single ExamResult read whenever BulkSummaryEngine
+recalculates an exam, and for just the affected form and subject when
+IncrementalSummaryUpdater changes one student's result. Those refreshes are
+queued with refresh_on_commit() and run once per form and subject when the
+transaction commits, however many marks of the cohort it changed.
+
+ExamDepartmentStats rolls the results of each department (subject category)
+up per exam and form: mean and spread, every student's marks total, the top
+students and the results furthest from their subject's mean. It is refreshed
+with the subject stats, for just the affected department when one subject
+changes, and merged across exams by department_top_students(),
+department_spread() and department_deviations().
+"""
+import logging
+import math
+import threading
+from collections import Counter, defaultdict
+
+import numpy as np
+from django.db import transaction
+
+from . import grading_cache
+from .models import ExamDepartmentStats, ExamResult, ExamSubjectStats
+
+logger = logging.getLogger(__name__)
+
+WHOLE_FORM = ''
+TOP_STUDENTS = 10
+TOP_DEVIATIONS = 10
+
+_local = threading.local()
+
+
+def refresh_subject_stats(exam_id, school_id, form_level_id=None, subject_id=None, departments=True):
+    """
+    Recompute ExamSubjectStats rows for an exam, optionally limited to one
+    form level and/or subject, and then the department rows they roll up
+    into unless departments is False. Returns the rows written.
+    """
+    # Stats rows are per form; students without a form have no row to count in
+    results = ExamResult.objects.filter(exam_id=exam_id, student__school_id=school_id, student__form_level__isnull=False)
+    stale = ExamSubjectStats.objects.filter(exam_id=exam_id)
+    if form_level_id is not None:
+        results = results.filter(student__form_level_id=form_level_id)
+        stale = stale.filter(form_level_id=form_level_id)
+    if subject_id is not None:
+        results = results.filter(subject_id=subject_id)
+        stale = stale.filter(subject_id=subject_id)
+
+    marks_by_group = defaultdict(list)
+    grades_by_group = defaultdict(Counter)
+    categories = {}
+    rows = results.values_list(
+        'student__form_level_id', 'student__stream', 'subject_id', 'subject__category_id', 'final_marks', 'grade'
+    )
+    for form_level, stream, subject, category, marks, grade in rows:
+        categories[subject] = category
+        groups = [(form_level, WHOLE_FORM, subject)]
+        if stream:
+            groups.append((form_level, stream, subject))
+        for group in groups:
+            marks_by_group[group].append(marks)
+            if grade:
+                grades_by_group[group][grade] += 1
+
+    stats = []
+    for (form_level, stream, subject), marks in marks_by_group.items():
+        marks = np.asarray(marks, dtype=float)
+        mean = float(marks.mean())
+        mean_grade, _ = grading_cache.grade_table_for(school_id, categories[subject]).grade_and_points(mean)
+        stats.append(ExamSubjectStats(
+            exam_id=exam_id,
+            form_level_id=form_level,
+            stream=stream,
+            subject_id=subject,
+            student_count=len(marks),
+            total_marks=int(marks.sum()),
+            mean_marks=round(mean, 2),
+            min_marks=int(marks.min()),
+            max_marks=int(marks.max()),
+            std_dev=round(float(marks.std()), 2),
+            mean_grade=mean_grade,
+            grade_distribution=dict(grades_by_group[(form_level, stream, subject)]),
+        ))
+
+    with transaction.atomic():
+        stale.delete()
+        ExamSubjectStats.objects.bulk_create(stats)
+
+    logger.debug(f"Refreshed {len(stats)} subject stats rows for exam {exam_id}")
+
+    if not departments:
+        return stats
+    if subject_id is None:
+        refresh_department_stats(exam_id, school_id, form_level_id=form_level_id)
+    else:
+        from subjects.models import Subject
+
+        category_id = categories.get(subject_id) or Subject.objects.filter(id=subject_id).values_list('category_id', flat=True).first()
+        if category_id is not None:
+            refresh_department_stats(exam_id, school_id, form_level_id=form_level_id, category_id=category_id)
+    return stats
+
+
+def refresh_on_commit(exam_id, school_id, form_level_id, subject_id):
+    """
+    refresh_subject_stats() for one form and subject of an exam once the
+    transaction commits. Each form and subject queued in a transaction is
+    refreshed once, and each department they belong to once.
+    """
+    key = (exam_id, school_id, form_level_id, subject_id)
+    connection = transaction.get_connection()
+    pending = getattr(_local, 'pending', None)
+    # A commit or rollback replaces run_on_commit, dropping the previous transaction's set
+    if pending is not None and pending[0] is connection.run_on_commit:
+        pending[1].add(key)
+        return
+    pending = _local.pending = (connection.run_on_commit, {key})
+    transaction.on_commit(lambda: _refresh_pending(pending))
+
+
+def _refresh_pending(pending):
+    from subjects.models import Subject
+
+    if getattr(_local, 'pending', None) is pending:
+        _local.pending = None
+    keys = sorted(pending[1])
+    categories = dict(Subject.objects.filter(id__in={key[3] for key in keys}).values_list('id', 'category_id'))
+    departments = set()
+    for exam_id, school_id, form_level_id, subject_id in keys:
+        refresh_subject_stats(exam_id, school_id, form_level_id=form_level_id, subject_id=subject_id, departments=False)
+        if categories.get(subject_id) is not None:
+            departments.add((exam_id, school_id, form_level_id, categories[subject_id]))
+    for exam_id, school_id, form_level_id, category_id in sorted(departments):
+        refresh_department_stats(exam_id, school_id, form_level_id=form_level_id, category_id=category_id)
+
+
+def refresh_department_stats(exam_id, school_id, form_level_id=None, category_id=None):
+    """
+    Recompute ExamDepartmentStats rows for an exam, optionally limited to one
+    form level and/or department. Returns the rows written.
+    """
+    results = ExamResult.objects.filter(
+        exam_id=exam_id, student__school_id=school_id, student__form_level__isnull=False, subject__category__isnull=False
+    )
+    stale = ExamDepartmentStats.objects.filter(exam_id=exam_id)
+    if form_level_id is not None:
+        results = results.filter(student__form_level_id=form_level_id)
+        stale = stale.filter(form_level_id=form_level_id)
+    if category_id is not None:
+        results = results.filter(subject__category_id=category_id)
+        stale = stale.filter(category_id=category_id)
+
+    # Columns: form level, category, student, subject, marks
+    rows = np.array(
+        list(results.values_list('student__form_level_id', 'subject__category_id', 'student_id', 'subject_id', 'final_marks')),
+        dtype=np.int64,
+    ).reshape(-1, 5)
+    groups, group_of_row = np.unique(rows[:, :2], axis=0, return_inverse=True)
+
+    stats = []
+    for group, (form_level, category) in enumerate(groups):
+        group_rows = rows[group_of_row.ravel() == group]
+        marks = group_rows[:, 4].astype(float)
+
+        students, student_of_row = np.unique(group_rows[:, 2], return_inverse=True)
+        student_totals = np.bincount(student_of_row, weights=marks)
+        student_results = np.bincount(student_of_row)
+        student_means = student_totals / student_results
+        best = np.argsort(-student_means, kind='stable')[:TOP_STUDENTS]
+
+        _, subject_of_row = np.unique(group_rows[:, 3], return_inverse=True)
+        subject_means = np.bincount(subject_of_row, weights=marks) / np.bincount(subject_of_row)
+        deviations = marks - subject_means[subject_of_row]
+        furthest = np.argsort(-np.abs(deviations), kind='stable')[:TOP_DEVIATIONS]
+
+        stats.append(ExamDepartmentStats(
+            exam_id=exam_id,
+            form_level_id=int(form_level),
+            category_id=int(category),
+            student_count=len(students),
+            result_count=len(marks),
+            total_marks=int(marks.sum()),
+            mean_marks=round(float(marks.mean()), 2),
+            std_dev=round(float(marks.std()), 2),
+            student_marks=np.column_stack([students, student_totals.astype(np.int64), student_results]).tolist(),
+            top_students=[[int(students[i]), round(float(student_means[i]), 2)] for i in best],
+            deviations=[
+                [int(group_rows[i, 2]), int(group_rows[i, 3]), int(group_rows[i, 4]), round(float(deviations[i]), 2)]
+                for i in furthest
+            ],
+        ))
+
+    with transaction.atomic():
+        stale.delete()
+        ExamDepartmentStats.objects.bulk_create(stats)
+
+    logger.debug(f"Refreshed {len(stats)} department stats rows for exam {exam_id}")
+    return stats
+
+
+# Reads
+#----------------------------------------------------------------------
+def department_top_students(department_stats, limit):
+    """
+    [(student_id, mean marks)] of the students with the best mean over the
+    given ExamDepartmentStats rows (several exams and/or forms), best first.
+    """
+    student_marks = [row for stats in department_stats for row in stats.student_marks]
+    if not student_marks:
+        return []
+    student_marks = np.asarray(student_marks, dtype=np.int64)
+    students, student_of_row = np.unique(student_marks[:, 0], return_inverse=True)
+    means = np.bincount(student_of_row, weights=student_marks[:, 1]) / np.bincount(student_of_row, weights=student_marks[:, 2])
+    best = np.argsort(-means, kind='stable')[:limit]
+    return [(int(students[i]), float(means[i])) for i in best]
+
+
+def department_spread(department_stats):
+    """
+    (mean, standard deviation) of every result in the given ExamDepartmentStats
+    rows, pooled from each row's result count, total and standard deviation.
+    """
+    count = sum(stats.result_count for stats in department_stats)
+    if not count:
+        return 0, 0
+    mean = sum(stats.total_marks for stats in department_stats) / count
+    # A row's sum of squared marks is n * (std^2 + mean^2)
+    squares = sum(
+        stats.result_count * (stats.std_dev ** 2 + (stats.total_marks / stats.result_count) ** 2)
+        for stats in department_stats if stats.result_count
+    )
+    return mean, math.sqrt(max(squares / count - mean ** 2, 0))
+
+
+def department_deviations(department_stats, limit):
+    """
+    [(exam_id, student_id, subject_id, marks, deviation)] of the results
+    furthest from their subject's mean in their exam, over the given
+    ExamDepartmentStats rows, furthest first.
+    """
+    deviations = [(stats.exam_id, *deviation) for stats in department_stats for deviation in stats.deviations]
+    return sorted(deviations, key=lambda deviation: -abs(deviation[4]))[:limit]
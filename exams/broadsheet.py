@@ -0,0 +1,86 @@
+# exams/broadsheet.py
+"""
+Student x subject broadsheet for one exam and form, optionally one stream.
+
+Summaries are loaded in one query and ranked through the exam's rank index;
+every ExamResult in scope is then loaded in a second query and pivoted in
+memory so each row carries its subject results. Views, the merit list and
+PDF exports share this instead of querying results student by student.
+"""
+from collections import defaultdict
+
+from . import rank_index
+from .models import ExamResult, StudentExamSummary
+from subjects.models import Subject
+
+
+class Broadsheet:
+    """
+    Build with Broadsheet(exam, form_level_id, stream).build(). Afterwards:
+
+        rows      StudentExamSummary objects with positions applied, sorted by
+                  position (stream position when a stream is given), each with
+                  subject_results = {subject_id: ExamResult}
+        subjects  Subject columns: every subject with a result in scope,
+                  ordered by name
+    """
+
+    def __init__(self, exam, form_level_id, stream=None, school=None):
+        self.exam = exam
+        self.form_level_id = form_level_id
+        self.stream = stream
+        self.school_id = school.id if school is not None else exam.school_id
+        self.rows = []
+        self.subjects = []
+
+    def _scope(self, prefix=''):
+        scope = {
+            f'{prefix}school_id': self.school_id,
+            f'{prefix}form_level_id': self.form_level_id,
+        }
+        if self.stream is not None:
+            scope[f'{prefix}stream'] = self.stream
+        return scope
+
+    def build(self, include_results=True):
+        """Load and rank the summaries; pivot subject results unless told not to."""
+        self.rows = rank_index.apply_positions(self.exam, StudentExamSummary.objects.filter(
+            exam=self.exam,
+            **self._scope('student__')
+        ).select_related('student'))
+
+        if self.stream is not None:
+            self.rows.sort(key=lambda row: (row.stream_position, row.student.admission_number))
+        else:
+            self.rows.sort(key=lambda row: (row.overall_position, row.student.admission_number))
+
+        if include_results:
+            self._pivot_results()
+        return self
+
+    def _pivot_results(self):
+        results_by_student = defaultdict(dict)
+        for result in ExamResult.objects.filter(exam=self.exam, **self._scope('student__')).only(
+            'id', 'exam_id', 'student_id', 'subject_id', 'final_marks', 'grade', 'points', 'comment', 'teacher_id'
+        ):
+            results_by_student[result.student_id][result.subject_id] = result
+
+        subject_ids = set()
+        for row in self.rows:
+            row.subject_results = results_by_student.get(row.student_id, {})
+            subject_ids.update(row.subject_results)
+
+        self.subjects = list(Subject.objects.filter(id__in=subject_ids).order_by('name')) if subject_ids else []
+
+    def matrix(self):
+        """
+        Plain rows for tabular exports: one list per student holding the
+        final marks for each column in self.subjects (None where missing).
+        """
+        return [
+            [
+                row.subject_results[subject.id].final_marks if subject.id in row.subject_results else None
+                for subject in self.subjects
+            ]
+            for row in self.rows
+        ]
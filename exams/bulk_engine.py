@@ -0,0 +1,316 @@
+# exams/bulk_engine.py
+import logging
+from collections import defaultdict
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Q
+
+from . import dashboard_cache, grading_cache, rank_index
+from .analytics import refresh_on_commit, refresh_subject_stats
+from .models import ExamResult, StudentExamSummary, PaperResult
+from .grading_kernel import EMPTY_GRADE_TABLE, subject_final_marks
+from school import stats as school_stats
+from subjects.models import SubjectPaper, SubjectPaperRatio
+
+logger = logging.getLogger(__name__)
+
+BEST_OF = 7
+
+SUMMARY_FIELDS = [
+    'total_marks', 'mean_marks', 'mean_grade', 'total_points',
+    'stream_position', 'overall_position', 'subjects_count',
+    'best_of_seven_marks', 'best_of_seven_points', 'excluded_subjects',
+]
+
+
+def rank_competition(items, key):
+    """
+    Assign competition ranks ("1224") to items sorted by key, highest first.
+    Returns a dict of id(item) -> position.
+    """
+    positions = {}
+    ordered = sorted(items, key=key, reverse=True)
+    previous = None
+    position = 0
+    for index, item in enumerate(ordered, 1):
+        value = key(item)
+        if value != previous:
+            position = index
+            previous = value
+        positions[id(item)] = position
+    return positions
+
+
+def build_summary(exam_id, student_id, results):
+    """
+    Build an unsaved StudentExamSummary from a student's ExamResults. Mean
+    grade and positions are left for the caller to fill in.
+    """
+    ordered = sorted(results, key=lambda r: r.final_marks, reverse=True)
+    best_results = ordered[:BEST_OF]
+    excluded_results = ordered[BEST_OF:]
+    best_marks = sum(r.final_marks for r in best_results)
+    best_points = sum(r.points or 0 for r in best_results)
+    mean_marks = best_marks / BEST_OF
+
+    return StudentExamSummary(
+        exam_id=exam_id,
+        student_id=student_id,
+        total_marks=sum(r.final_marks for r in results),
+        mean_marks=mean_marks,
+        total_points=sum(r.points or 0 for r in results),
+        subjects_count=len(results),
+        best_of_seven_marks=best_marks,
+        best_of_seven_points=best_points,
+        excluded_subjects=[r.subject_id for r in excluded_results],
+        stream_position=0,
+        overall_position=0,
+    )
+
+
+class BulkSummaryEngine:
+    """
+    Recompute ExamResult and StudentExamSummary rows for a whole exam in a
+    fixed number of queries.
+
+    All PaperResult rows are read in one query and every calculation (final
+    marks, grades, best of 7, stream and overall positions) is done in memory,
+    through the vectorized grading kernel, before the rows that changed are
+    written back with upserts.
+
+    Positions are ranked within a form, so form_level_ids can limit the run
+    to the forms whose marks changed (None stands for students without a
+    form); PaperResultWriter does this after each batch of mark entry.
+    """
+
+    def __init__(self, exam, form_level_ids=None):
+        self.exam = exam
+        self.form_level_ids = None if form_level_ids is None else set(form_level_ids)
+        self.default_grade_table = EMPTY_GRADE_TABLE
+
+    def run(self):
+        paper_rows = self._load_paper_results()
+        manual_rows = self._load_manual_results()
+        students = {}
+        subject_categories = {}
+        paper_marks = defaultdict(dict)
+
+        for row in paper_rows:
+            students[row['student_id']] = (row['student__form_level_id'], row['student__stream'])
+            subject_categories[row['subject_paper__subject_id']] = row['subject_paper__subject__category_id']
+            paper_marks[row['subject_paper__subject_id']][(row['student_id'], row['subject_paper_id'])] = row['marks']
+
+        marks_by_subject = self._final_marks_by_subject(paper_marks)
+
+        # Results entered directly (e.g. CSV upload) have no papers; keep their marks.
+        saved_results = {(row['student_id'], row['subject_id']): row for row in manual_rows}
+        for row in manual_rows:
+            subject_marks = marks_by_subject.setdefault(row['subject_id'], {})
+            if row['student_id'] in subject_marks:
+                continue
+            students[row['student_id']] = (row['student__form_level_id'], row['student__stream'])
+            subject_categories[row['subject_id']] = row['subject__category_id']
+            subject_marks[row['student_id']] = row['final_marks']
+
+        if not any(marks_by_subject.values()):
+            logger.warning(f"No results found for exam {self.exam}")
+            return []
+
+        self._load_grading_systems()
+
+        exam_results = []
+        results_by_student = defaultdict(list)
+        for subject_id, subject_marks in marks_by_subject.items():
+            student_ids = list(subject_marks)
+            marks = np.rint(np.array([subject_marks[s] for s in student_ids], dtype=float)).astype(int)
+            grades, points = self.grade_table_for(subject_categories.get(subject_id)).lookup(marks)
+            for student_id, student_marks, grade, student_points in zip(student_ids, marks, grades, points):
+                result = ExamResult(
+                    exam_id=self.exam.id,
+                    student_id=student_id,
+                    subject_id=subject_id,
+                    final_marks=int(student_marks),
+                    grade=grade,
+                    points=int(student_points),
+                )
+                exam_results.append(result)
+                results_by_student[student_id].append(result)
+
+        summaries = [
+            build_summary(self.exam.id, student_id, results)
+            for student_id, results in results_by_student.items()
+        ]
+        mean_grades, _ = self.default_grade_table.lookup([s.mean_marks for s in summaries])
+        for summary, mean_grade in zip(summaries, mean_grades):
+            summary.mean_grade = mean_grade
+        self._assign_positions(summaries, students)
+
+        changed_results = [
+            result for result in exam_results
+            if self._result_changed(result, saved_results.get((result.student_id, result.subject_id)))
+        ]
+        saved_summaries = self._load_summaries()
+        changed_summaries = [
+            summary for summary in summaries
+            if self._summary_changed(summary, saved_summaries.get(summary.student_id))
+        ]
+
+        with transaction.atomic():
+            ExamResult.objects.bulk_create(
+                changed_results,
+                update_conflicts=True,
+                unique_fields=['exam', 'student', 'subject'],
+                update_fields=['final_marks', 'grade', 'points'],
+            )
+            StudentExamSummary.objects.bulk_create(
+                changed_summaries,
+                update_conflicts=True,
+                unique_fields=['exam', 'student'],
+                update_fields=SUMMARY_FIELDS,
+            )
+            school_stats.mark_forms_stale(
+                self.exam.school_id,
+                {students[row.student_id][0] for row in [*changed_results, *changed_summaries]},
+            )
+            rank_index.touch_exam(self.exam.id)
+            if self.form_level_ids is None:
+                refresh_subject_stats(self.exam.id, self.exam.school_id)
+                # Upserts bypass the summary signals; rebuild the rank indexes lazily
+                rank_index.invalidate_exam(self.exam.id)
+                transaction.on_commit(lambda: rank_index.invalidate_exam(self.exam.id))
+            else:
+                for form_level_id, subject_id in {(students[r.student_id][0], r.subject_id) for r in changed_results}:
+                    if form_level_id is not None:
+                        refresh_on_commit(self.exam.id, self.exam.school_id, form_level_id, subject_id)
+                moved = [(s.student_id, s.best_of_seven_marks, students[s.student_id]) for s in changed_summaries]
+                transaction.on_commit(lambda: self._record_positions(moved))
+            scopes = {(self.exam.id, form_level_id, stream) for form_level_id, stream in students.values()}
+            transaction.on_commit(lambda: dashboard_cache.bump_results(self.exam.school_id, scopes))
+
+        logger.info(
+            f"Calculated summaries for {len(summaries)} students in exam {self.exam}, "
+            f"{len(changed_summaries)} changed"
+        )
+        return summaries
+
+    def _record_positions(self, moved):
+        for student_id, score, group in moved:
+            rank_index.record_summary(self.exam.id, student_id, score, group)
+
+    # Loading
+    #----------------------------------------------------------------------
+    def _in_scope(self, queryset):
+        if self.form_level_ids is None:
+            return queryset
+        scope = Q(student__form_level_id__in=[f for f in self.form_level_ids if f is not None])
+        if None in self.form_level_ids:
+            scope |= Q(student__form_level__isnull=True)
+        return queryset.filter(scope)
+
+    def _load_paper_results(self):
+        return self._in_scope(PaperResult.objects.filter(
+            exam=self.exam,
+            student__school_id=self.exam.school_id,
+        )).values(
+            'student_id',
+            'student__form_level_id',
+            'student__stream',
+            'subject_paper__subject_id',
+            'subject_paper__subject__category_id',
+            'subject_paper_id',
+            'marks',
+        )
+
+    def _load_manual_results(self):
+        return self._in_scope(ExamResult.objects.filter(
+            exam=self.exam,
+            student__school_id=self.exam.school_id,
+        )).values(
+            'student_id',
+            'student__form_level_id',
+            'student__stream',
+            'subject_id',
+            'subject__category_id',
+            'final_marks',
+            'grade',
+            'points',
+        )
+
+    def _load_summaries(self):
+        """The saved summaries in scope, by student, to write back only what changed."""
+        return {
+            row['student_id']: row
+            for row in self._in_scope(StudentExamSummary.objects.filter(exam=self.exam)).values(
+                'student_id', *SUMMARY_FIELDS,
+            )
+        }
+
+    def _load_paper_ratios(self, subject_ids):
+        return {
+            ratio.subject_id: ratio
+            for ratio in SubjectPaperRatio.objects.filter(subject_id__in=list(subject_ids))
+        }
+
+    def _load_grading_systems(self):
+        """Resolve grade tables from the per-process cache (one version check once warm)."""
+        grading_cache.sync(self.exam.school_id)
+        self.default_grade_table = grading_cache.default_grade_table(self.exam.school_id)
+
+    # Calculation
+    #----------------------------------------------------------------------
+    def _final_marks_by_subject(self, paper_marks):
+        """
+        Build a (students x papers) matrix per subject and run it through the
+        grading kernel. Returns {subject_id: {student_id: final_marks}}.
+        """
+        papers_by_subject = defaultdict(list)
+        for paper in SubjectPaper.objects.filter(subject_id__in=list(paper_marks)):
+            papers_by_subject[paper.subject_id].append(paper)
+        ratios = self._load_paper_ratios(paper_marks)
+
+        marks_by_subject = {}
+        for subject_id, entries in paper_marks.items():
+            student_ids, marks = subject_final_marks(entries, papers_by_subject[subject_id], ratios.get(subject_id))
+            marks_by_subject[subject_id] = dict(zip(student_ids, marks.tolist()))
+
+        return marks_by_subject
+
+    @staticmethod
+    def _result_changed(result, saved):
+        return saved is None or (saved['final_marks'], saved['grade'], saved['points']) != (
+            result.final_marks, result.grade, result.points
+        )
+
+    @staticmethod
+    def _summary_changed(summary, saved):
+        return saved is None or any(saved[field] != getattr(summary, field) for field in SUMMARY_FIELDS)
+
+    def grade_table_for(self, category_id):
+        return grading_cache.grade_table_for(self.exam.school_id, category_id)
+
+    @staticmethod
+    def _assign_positions(summaries, students):
+        """
+        Rank summaries by best of 7 marks within each form level (overall)
+        and within each form level and stream (stream). Ties share a position.
+        """
+        by_form = defaultdict(list)
+        by_stream = defaultdict(list)
+        for summary in summaries:
+            form_level_id, stream = students[summary.student_id]
+            by_form[form_level_id].append(summary)
+            by_stream[(form_level_id, stream)].append(summary)
+
+        def best_marks(summary):
+            return summary.best_of_seven_marks or 0
+
+        for group in by_form.values():
+            positions = rank_competition(group, best_marks)
+            for summary in group:
+                summary.overall_position = positions[id(summary)]
+
+        for group in by_stream.values():
+            positions = rank_competition(group, best_marks)
+            for summary in group:
+                summary.stream_position = positions[id(summary)]
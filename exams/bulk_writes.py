@@ -0,0 +1,82 @@
+# exams/bulk_writes.py
+"""
+Bulk insert-or-update for the result importers.
+
+On PostgreSQL rows are streamed into a temporary table with COPY and merged
+with one INSERT ... SELECT ... ON CONFLICT DO UPDATE, which avoids building
+and parsing a multi-row VALUES statement per batch. Other databases use
+bulk_create(update_conflicts=True). Neither path sends model signals.
+"""
+import csv
+import io
+
+from django.db import connections, transaction
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def upsert(model, objs, unique_fields, update_fields, using='default', batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Insert objs, updating update_fields where a row with the same
+    unique_fields already exists. As with bulk_create, objs must not repeat a
+    unique key. Returns the number of rows written.
+    """
+    objs = list(objs)
+    if not objs:
+        return 0
+
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with transaction.atomic(using=using):
+            _copy_upsert(connection, model, objs, unique_fields, update_fields)
+    else:
+        model.objects.using(using).bulk_create(
+            objs,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=update_fields,
+        )
+    return len(objs)
+
+
+def _copy_upsert(connection, model, objs, unique_fields, update_fields):
+    opts = model._meta
+    quote = connection.ops.quote_name
+    fields = [field for field in opts.concrete_fields if not field.primary_key]
+    columns = ', '.join(quote(field.column) for field in fields)
+    conflict = ', '.join(quote(opts.get_field(name).column) for name in unique_fields)
+    updates = ', '.join(
+        f'{quote(opts.get_field(name).column)} = EXCLUDED.{quote(opts.get_field(name).column)}'
+        for name in update_fields
+    )
+    table = quote(opts.db_table)
+    staging = quote(f'{opts.db_table}_copy')
+    rows = ([field.get_db_prep_save(getattr(obj, field.attname), connection) for field in fields] for obj in objs)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE IF NOT EXISTS {staging} ON COMMIT DROP AS '
+            f'SELECT {columns} FROM {table} WITH NO DATA'
+        )
+        copy_sql = f'COPY {staging} ({columns}) FROM STDIN'
+        raw = cursor.cursor
+        if hasattr(raw, 'copy'):
+            # psycopg 3
+            with raw.copy(copy_sql) as copy:
+                for row in rows:
+                    copy.write_row(row)
+        else:
+            # psycopg2
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in rows:
+                writer.writerow(['\\N' if value is None else value for value in row])
+            buffer.seek(0)
+            raw.copy_expert(f"{copy_sql} WITH (FORMAT csv, NULL '\\N')", buffer)
+
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging} '
+            f'ON CONFLICT ({conflict}) DO UPDATE SET {updates}'
+        )
+        cursor.execute(f'DROP TABLE {staging}')
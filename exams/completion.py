@@ -0,0 +1,113 @@
+# exams/completion.py
+"""
+Mark entry completion per (exam, form, stream, subject).
+
+CompletionMatrix(school_id).load(exam_ids) answers "how many students in
+this class take the subject, and how many of them have a result" for every
+exam, form, stream and subject of a school from two grouped queries:
+
+    enrolment   students per (form, stream, subject), and per (form, stream)
+    entered     exam results per (exam, form, stream, subject)
+
+Enrolment is cached under the school's structure generation and the
+entered counts under each exam's results generation (see dashboard_cache),
+so after a result is written only that exam is counted again.
+"""
+from django.db.models import Count
+
+from students.models import Student
+from . import dashboard_cache
+from .models import ExamResult
+
+
+class CompletionMatrix:
+    """
+    matrix = CompletionMatrix(school_id).load(exam_ids)
+    enrolled, entered = matrix.cell(exam_id, form_id, stream, subject_id)
+    enrolled, entered = matrix.total(exam_id, form_id)   # every stream and subject
+    """
+
+    def __init__(self, school_id):
+        self.school_id = school_id
+        self.enrolment = {}      # (form_id, stream, subject_id) -> students taking the subject
+        self.stream_sizes = {}   # (form_id, stream) -> students
+        self.entered = {}        # exam_id -> {(form_id, stream, subject_id): results}
+
+    def load(self, exam_ids):
+        exam_ids = list(dict.fromkeys(exam_ids))
+        self.enrolment, self.stream_sizes = dashboard_cache.get_or_build(
+            'completion_enrolment', self._count_enrolment, self.school_id, results=False
+        )
+        self.entered = dashboard_cache.get_many_or_build(
+            'completion_entered', self._count_entered, self.school_id, exam_ids
+        ) if exam_ids else {}
+        return self
+
+    def _count_enrolment(self):
+        enrolment = {
+            (form_id, stream, subject_id): count
+            for form_id, stream, subject_id, count in Student.subjects.through.objects
+            .filter(student__school_id=self.school_id)
+            .values('student__form_level_id', 'student__stream', 'subject_id')
+            .annotate(count=Count('id'))
+            .values_list('student__form_level_id', 'student__stream', 'subject_id', 'count')
+        }
+        stream_sizes = {
+            (form_id, stream): count
+            for form_id, stream, count in Student.objects
+            .filter(school_id=self.school_id)
+            .values('form_level_id', 'stream')
+            .annotate(count=Count('id'))
+            .values_list('form_level_id', 'stream', 'count')
+        }
+        return enrolment, stream_sizes
+
+    def _count_entered(self, exam_ids):
+        entered = {exam_id: {} for exam_id in exam_ids}
+        rows = (
+            ExamResult.objects
+            .filter(exam_id__in=exam_ids, student__school_id=self.school_id)
+            .values('exam_id', 'student__form_level_id', 'student__stream', 'subject_id')
+            .annotate(count=Count('id'))
+            .values_list('exam_id', 'student__form_level_id', 'student__stream', 'subject_id', 'count')
+        )
+        for exam_id, form_id, stream, subject_id, count in rows:
+            entered[exam_id][(form_id, stream, subject_id)] = count
+        return entered
+
+    # Lookups
+    #----------------------------------------------------------------------
+    def cell(self, exam_id, form_id, stream, subject_id):
+        """(enrolled, entered) for one class and subject."""
+        key = (form_id, stream, subject_id)
+        return self.enrolment.get(key, 0), self.entered.get(exam_id, {}).get(key, 0)
+
+    def total(self, exam_id, form_id, stream=None, subject_ids=None):
+        """(enrolled, entered) summed over the form's streams (or one stream) and subjects (or the given ones)."""
+        def matches(key):
+            key_form, key_stream, key_subject = key
+            return (
+                key_form == form_id
+                and (stream is None or key_stream == stream)
+                and (subject_ids is None or key_subject in subject_ids)
+            )
+
+        enrolled = sum(count for key, count in self.enrolment.items() if matches(key))
+        entered = sum(count for key, count in self.entered.get(exam_id, {}).items() if matches(key))
+        return enrolled, entered
+
+    def streams(self, form_id):
+        """The form's streams, in the order the database sorts them (no stream first)."""
+        return sorted(
+            (stream for key_form, stream in self.stream_sizes if key_form == form_id),
+            key=lambda stream: (stream is not None, stream or '')
+        )
+
+    def stream_size(self, form_id, stream=None):
+        if stream is not None:
+            return self.stream_sizes.get((form_id, stream), 0)
+        return sum(count for (key_form, _), count in self.stream_sizes.items() if key_form == form_id)
+
+    @staticmethod
+    def percentage(enrolled, entered):
+        return (entered / enrolled * 100) if enrolled > 0 else 0
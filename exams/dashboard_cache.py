@@ -0,0 +1,172 @@
+# exams/dashboard_cache.py
+"""
+Versioned cache of dashboard data built from exam results.
+
+Values are stored in the default Django cache (Redis in production, local
+memory or files otherwise) under keys that embed generation counters:
+
+    dash:<name>:<school>:<exam>:<form>:<stream>:<extra>:<structure>.<results>
+
+where any of exam, form and stream may be '*' for data spanning all of them.
+
+    structure   one counter per school, bumped when exams, students or
+                teaching assignments change
+    results     one counter per (school, exam, form, stream) pattern, bumped
+                when results in that scope are written
+
+Writing results for a student bumps every pattern that covers them, i.e.
+each combination of their exam, form and stream with '*', so a write never
+scans for keys to delete: entries built from older generations are simply
+no longer asked for and age out of the cache. A missing counter (never set,
+or evicted) starts from a time-based value so that it cannot come back to a
+generation that was used before.
+"""
+import threading
+import time
+from itertools import product
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import cache
+
+ANY = '*'
+
+_lock = threading.Lock()
+_stats = {}  # name -> {'hits': int, 'misses': int}
+_local = threading.local()
+
+
+def _part(value):
+    return ANY if value is None else quote(str(value), safe='')
+
+
+def _scope_key(school_id, exam_id, form_id, stream):
+    return f'{school_id}:{_part(exam_id)}:{_part(form_id)}:{_part(stream)}'
+
+
+def _structure_key(school_id):
+    return f'dash:gen:{school_id}'
+
+
+def _results_key(school_id, exam_id, form_id, stream):
+    return f'dash:gen:{_scope_key(school_id, exam_id, form_id, stream)}'
+
+
+def _fresh_generation():
+    return time.time_ns() // 1000
+
+
+def _generations(keys):
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            fresh = _fresh_generation()
+            cache.add(key, fresh, timeout=None)
+            generations[key] = cache.get(key, fresh)
+    return [generations[key] for key in keys]
+
+
+def _bump(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Not set yet, or evicted; any fresh value invalidates older entries
+            cache.set(key, _fresh_generation(), timeout=None)
+
+
+def _value_key(name, school_id, exam_id, form_id, stream, extra, generations):
+    version = '.'.join(str(generation) for generation in generations)
+    return f'dash:{name}:{_scope_key(school_id, exam_id, form_id, stream)}:{_part(extra)}:{version}'
+
+
+def _count(name, outcome):
+    with _lock:
+        counters = _stats.setdefault(name, {'hits': 0, 'misses': 0})
+        counters[outcome] += 1
+    setattr(_local, outcome, getattr(_local, outcome, 0) + 1)
+
+
+def get_or_build(name, build, school_id, exam_id=None, form_id=None, stream=None, extra='', results=True):
+    """
+    Return the cached value of build() for a dashboard and scope, calling it
+    on a miss. extra distinguishes values that also depend on e.g. the user;
+    results=False leaves the results generation out of the key for data that
+    results do not affect.
+    """
+    keys = [_structure_key(school_id)]
+    if results:
+        keys.append(_results_key(school_id, exam_id, form_id, stream))
+    key = _value_key(name, school_id, exam_id, form_id, stream, extra, _generations(keys))
+
+    value = cache.get(key)
+    if value is not None:
+        _count(name, 'hits')
+        return value
+
+    _count(name, 'misses')
+    value = build()
+    cache.set(key, value, timeout=settings.DASHBOARD_CACHE_TIMEOUT)
+    return value
+
+
+def get_many_or_build(name, build, school_id, exam_ids, extra=''):
+    """
+    get_or_build for one value per exam, in two cache round trips however
+    many exams there are. build(missing_exam_ids) is called once with every
+    miss and returns {exam_id: value}, so the misses can share one query.
+    """
+    structure = _structure_key(school_id)
+    results = [_results_key(school_id, exam_id, None, None) for exam_id in exam_ids]
+    structure_generation, *result_generations = _generations([structure] + results)
+    keys = {
+        exam_id: _value_key(name, school_id, exam_id, None, None, extra, [structure_generation, generation])
+        for exam_id, generation in zip(exam_ids, result_generations)
+    }
+
+    cached = cache.get_many(list(keys.values()))
+    values = {}
+    missing = []
+    for exam_id, key in keys.items():
+        if key in cached:
+            _count(name, 'hits')
+            values[exam_id] = cached[key]
+        else:
+            _count(name, 'misses')
+            missing.append(exam_id)
+
+    if missing:
+        built = build(missing)
+        cache.set_many({keys[exam_id]: built[exam_id] for exam_id in missing}, timeout=settings.DASHBOARD_CACHE_TIMEOUT)
+        values.update(built)
+    return values
+
+
+def bump_results(school_id, scopes):
+    """Invalidate dashboards covering results written in the given (exam_id, form_id, stream) scopes."""
+    patterns = set()
+    for exam_id, form_id, stream in scopes:
+        patterns.update(product((exam_id, None), (form_id, None), (stream, None)))
+    _bump([_results_key(school_id, *pattern) for pattern in patterns])
+
+
+def bump_structure(school_id):
+    """Invalidate every dashboard of a school."""
+    if school_id is not None:
+        _bump([_structure_key(school_id)])
+
+
+def stats():
+    """Hit and miss counts per dashboard for this process."""
+    with _lock:
+        return {name: dict(counters) for name, counters in _stats.items()}
+
+
+def thread_counts():
+    """Running (hits, misses) of the current thread, for per-request accounting."""
+    return getattr(_local, 'hits', 0), getattr(_local, 'misses', 0)
+
+
+def reset_stats():
+    with _lock:
+        _stats.clear()
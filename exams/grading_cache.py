@@ -0,0 +1,151 @@
+# exams/grading_cache.py
+"""
+Per-process cache of compiled grading tables.
+
+Tables are compiled once per school, keyed by
+(school_id, subject_category_id, grading_system_id), and dropped by the
+GradingSystem/GradingRange signal handlers in exams/models.py whenever a
+school's grading configuration changes. After warm-up a grade lookup is an
+in-memory bisect with no queries.
+
+Other processes (web workers, run_workers) learn of the change through
+School.grading_version, which the same handlers bump in the writing
+transaction. A school's tables are stamped with the version they were
+loaded under, and sync(school_id), called once at the start of each unit of
+work that grades (an engine run, a mark update), reloads them when the
+stored version has moved on.
+"""
+import threading
+
+from django.db.models import F
+
+from .grading_kernel import EMPTY_GRADE_TABLE
+
+_lock = threading.RLock()
+_tables = {}           # (school_id, category_id, system_id) -> GradeTable
+_schools = {}          # school_id -> {'by_category': {...}, 'default': GradeTable}
+_system_schools = {}   # system_id -> school_id, to invalidate from a GradingRange
+
+
+def _grading_version(school_id):
+    from school.models import School
+
+    return School.objects.filter(pk=school_id).values_list('grading_version', flat=True).first()
+
+
+def _load_school(school_id):
+    from .models import GradingSystem
+
+    # Read before the systems: a change committed in between leaves the stamp behind, so sync() reloads
+    version = _grading_version(school_id)
+    systems = GradingSystem.objects.filter(
+        school_id=school_id,
+        is_active=True
+    ).prefetch_related('grading_ranges').order_by('-is_default', 'id')
+
+    by_category = {}
+    default = None
+    fallback = None
+    for system in systems:
+        table = system.compile_grade_table()
+        _tables[(school_id, system.subject_category_id, system.id)] = table
+        _system_schools[system.id] = school_id
+        if fallback is None:
+            fallback = table
+        if system.subject_category_id is not None:
+            by_category.setdefault(system.subject_category_id, table)
+        elif default is None:
+            default = table
+
+    bundle = {
+        'by_category': by_category,
+        'default': default or fallback or EMPTY_GRADE_TABLE,
+        'version': version,
+    }
+    _schools[school_id] = bundle
+    return bundle
+
+
+def _school_bundle(school_id):
+    bundle = _schools.get(school_id)
+    if bundle is None:
+        with _lock:
+            bundle = _schools.get(school_id) or _load_school(school_id)
+    return bundle
+
+
+def grade_table_for(school_id, category_id=None):
+    """
+    Return the table that grades a subject category in a school: the active
+    category-specific system if there is one, otherwise the school default.
+    """
+    bundle = _school_bundle(school_id)
+    if category_id is not None and category_id in bundle['by_category']:
+        return bundle['by_category'][category_id]
+    return bundle['default']
+
+
+def default_grade_table(school_id):
+    """Return the school's default table, used for mean grades."""
+    return _school_bundle(school_id)['default']
+
+
+def grade_table_for_system(grading_system):
+    """Return the compiled table for a specific GradingSystem instance."""
+    key = (grading_system.school_id, grading_system.subject_category_id, grading_system.id)
+    table = _tables.get(key)
+    if table is None:
+        _school_bundle(grading_system.school_id)
+        table = _tables.get(key)
+    if table is None:
+        # Inactive systems are not part of the school bundle; compile on demand.
+        with _lock:
+            table = grading_system.compile_grade_table()
+            _tables[key] = table
+            _system_schools[grading_system.id] = grading_system.school_id
+    return table
+
+
+def sync(school_id):
+    """Drop a school's cached tables if its grading changed since they were loaded, e.g. in another process."""
+    bundle = _schools.get(school_id)
+    if bundle is not None and bundle['version'] != _grading_version(school_id):
+        invalidate_school(school_id)
+
+
+def bump(school_id):
+    """Record a change to a school's grading, so that every process reloads its tables."""
+    from school.models import School
+
+    School.objects.filter(pk=school_id).update(grading_version=F('grading_version') + 1)
+
+
+def bump_system(grading_system_id):
+    """bump() for the school of a grading system, without loading the system."""
+    from school.models import School
+
+    School.objects.filter(grading_systems=grading_system_id).update(grading_version=F('grading_version') + 1)
+
+
+def invalidate_school(school_id):
+    """Drop every cached table for a school."""
+    with _lock:
+        _schools.pop(school_id, None)
+        for key in [key for key in _tables if key[0] == school_id]:
+            del _tables[key]
+        for system_id in [s for s, school in _system_schools.items() if school == school_id]:
+            del _system_schools[system_id]
+
+
+def invalidate_system(grading_system_id):
+    """Drop the tables of the school a grading system belongs to, if cached."""
+    school_id = _system_schools.get(grading_system_id)
+    if school_id is not None:
+        invalidate_school(school_id)
+
+
+def clear():
+    with _lock:
+        _tables.clear()
+        _schools.clear()
+        _system_schools.clear()
@@ -0,0 +1,168 @@
+# exams/grading_kernel.py
+"""
+Vectorized grading kernel shared by GradingService, BulkSummaryEngine and
+ExamResultsService.
+
+Final marks are computed for a whole cohort at once from a
+(students x papers) marks matrix, and grades are resolved by binning the
+marks against the sorted lower boundaries of a grading system.
+"""
+import bisect
+import re
+
+import numpy as np
+
+NO_GRADE = 'N/A'
+
+
+def paper_index(paper_number):
+    """
+    Return the 1-based paper index for values like '1', 'PP1' or 'Paper 1'.
+    """
+    match = re.search(r'(\d+)\s*$', str(paper_number or ''))
+    return int(match.group(1)) if match else None
+
+
+def paper_weights(papers, paper_ratio=None):
+    """
+    Return (max_marks, weights) arrays for papers, in the given order.
+
+    The subject's SubjectPaperRatio takes precedence for any paper it
+    configures; otherwise the paper's own max_marks and
+    student_contribution_marks are used.
+    """
+    max_marks = np.empty(len(papers), dtype=float)
+    weights = np.empty(len(papers), dtype=float)
+
+    for column, paper in enumerate(papers):
+        paper_max = paper.max_marks
+        weight = paper.student_contribution_marks
+        index = paper_index(paper.paper_number)
+        if paper_ratio is not None and index in (1, 2, 3):
+            ratio_max = getattr(paper_ratio, f'paper{index}_max_marks')
+            ratio_contribution = getattr(paper_ratio, f'paper{index}_contribution')
+            if ratio_max:
+                paper_max = ratio_max
+            if ratio_contribution is not None:
+                weight = ratio_contribution
+        max_marks[column] = paper_max or 100
+        weights[column] = float(weight or 0)
+
+    return max_marks, weights
+
+
+def final_marks(marks, max_marks, weights):
+    """
+    Combine a (students x papers) marks matrix into final subject marks
+    out of 100.
+
+    Each paper is scaled to a percentage of its max marks and the papers a
+    student sat (non-NaN entries) are averaged using their weights. When
+    none of the sat papers carries weight they count equally. Students who
+    sat no paper get NaN.
+    """
+    marks = np.asarray(marks, dtype=float)
+    if marks.ndim == 1:
+        marks = marks.reshape(1, -1)
+    max_marks = np.asarray(max_marks, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+
+    sat = ~np.isnan(marks)
+    percentages = np.where(sat, marks, 0.0) / max_marks * 100.0
+
+    paper_weight = np.where(sat, weights, 0.0)
+    total_weight = paper_weight.sum(axis=1)
+    unweighted = total_weight == 0
+    if unweighted.any():
+        paper_weight[unweighted] = sat[unweighted].astype(float)
+        total_weight = paper_weight.sum(axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result = (percentages * paper_weight).sum(axis=1) / total_weight
+    result[total_weight == 0] = np.nan
+    return result
+
+
+def subject_final_marks(entries, papers, paper_ratio=None):
+    """
+    Pivot {(student_id, paper_id): marks} for one subject into a
+    (students x papers) matrix and combine it with final_marks.
+
+    Returns (student_ids, final marks array) in matching order.
+    """
+    papers = sorted(papers, key=lambda p: (paper_index(p.paper_number) or 0, p.id))
+    columns = {paper.id: column for column, paper in enumerate(papers)}
+    student_ids = sorted({student_id for student_id, _ in entries})
+    rows = {student_id: row for row, student_id in enumerate(student_ids)}
+
+    matrix = np.full((len(student_ids), len(papers)), np.nan)
+    for (student_id, paper_id), marks in entries.items():
+        matrix[rows[student_id], columns[paper_id]] = marks
+
+    max_marks, weights = paper_weights(papers, paper_ratio)
+    return student_ids, final_marks(matrix, max_marks, weights)
+
+
+class GradeTable:
+    """
+    A grading system compiled into sorted boundary arrays.
+
+    Marks are binned on the lower boundary of each range, so fractional
+    marks that fall between two integer ranges (e.g. a mean of 64.5) take
+    the lower grade instead of no grade.
+    """
+
+    def __init__(self, min_marks, max_marks, grades, points):
+        order = np.argsort(np.asarray(min_marks, dtype=float), kind='stable')
+        self.min_marks = np.asarray(min_marks, dtype=float)[order]
+        self.max_marks = np.asarray(max_marks, dtype=float)[order]
+        self.grades = np.asarray(grades, dtype=object)[order]
+        self.points = np.asarray(points, dtype=int)[order]
+        self.ceiling = self.max_marks.max() if len(self.max_marks) else -np.inf
+        # Plain lists for single lookups, where bisect beats a numpy call
+        self._bounds = self.min_marks.tolist()
+        self._grade_list = self.grades.tolist()
+        self._point_list = self.points.tolist()
+
+    @classmethod
+    def from_ranges(cls, ranges):
+        """Build a table from GradingRange instances."""
+        ranges = list(ranges)
+        return cls(
+            [r.min_marks for r in ranges],
+            [r.max_marks for r in ranges],
+            [r.grade for r in ranges],
+            [r.points for r in ranges],
+        )
+
+    def __len__(self):
+        return len(self.min_marks)
+
+    def lookup(self, marks):
+        """
+        Return (grades, points) arrays for an array of marks. Marks outside
+        every range, or NaN, get 'N/A' and 0 points.
+        """
+        marks = np.atleast_1d(np.asarray(marks, dtype=float))
+        grades = np.full(marks.shape, NO_GRADE, dtype=object)
+        points = np.zeros(marks.shape, dtype=int)
+        if not len(self):
+            return grades, points
+
+        index = np.searchsorted(self.min_marks, marks, side='right') - 1
+        valid = (index >= 0) & (marks <= self.ceiling) & ~np.isnan(marks)
+        grades[valid] = self.grades[index[valid]]
+        points[valid] = self.points[index[valid]]
+        return grades, points
+
+    def grade_and_points(self, marks):
+        """Return the (grade, points) pair for a single mark, by bisection."""
+        if marks is None or marks != marks or marks > self.ceiling:
+            return NO_GRADE, 0
+        index = bisect.bisect_right(self._bounds, marks) - 1
+        if index < 0:
+            return NO_GRADE, 0
+        return self._grade_list[index], self._point_list[index]
+
+
+EMPTY_GRADE_TABLE = GradeTable([], [], [], [])
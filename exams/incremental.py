@@ -0,0 +1,185 @@
+# exams/incremental.py
+"""
+Incremental maintenance of ExamResult and StudentExamSummary rows.
+
+When a single PaperResult is saved or deleted only the affected student's
+subject result and summary are recomputed. Positions are then shifted for
+just the students whose rank moved, i.e. those whose best of 7 marks lie
+between the student's old and new score, so a mark correction costs one
+indexed UPDATE over the rank window instead of a whole-exam recalculation.
+Subject and department statistics are refreshed once per form and subject
+when the transaction commits (analytics.refresh_on_commit), not per save.
+"""
+import logging
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+from django.db import transaction
+from django.db.models import F
+
+from . import dashboard_cache, grading_cache, rank_index
+from . import analytics
+from .bulk_engine import build_summary
+from .grading_kernel import subject_final_marks
+from .models import ExamResult, StudentExamSummary, PaperResult
+from subjects.models import SubjectPaper, SubjectPaperRatio
+
+logger = logging.getLogger(__name__)
+
+_state = threading.local()
+
+
+@contextmanager
+def suspend_incremental_updates():
+    """
+    Disable the PaperResult signal handlers for the current thread, e.g.
+    while importing a whole exam that will be recalculated in bulk afterwards.
+    """
+    previous = getattr(_state, 'suspended', False)
+    _state.suspended = True
+    try:
+        yield
+    finally:
+        _state.suspended = previous
+
+
+def updates_suspended():
+    return getattr(_state, 'suspended', False)
+
+
+class IncrementalSummaryUpdater:
+    """
+    Bring one student's results for one subject, their summary and the
+    positions around them up to date after a paper mark changed.
+    """
+
+    def __init__(self, exam_id, student, subject_id, batched=False):
+        self.exam_id = exam_id
+        self.student = student
+        self.subject_id = subject_id
+        # Batched writers refresh subject statistics, dashboards and rank indexes once for the whole batch
+        self.batched = batched
+
+    def run(self):
+        if not self.batched:
+            grading_cache.sync(self.student.school_id)
+        with transaction.atomic():
+            self._update_exam_result()
+            self._update_summary()
+            if not self.batched:
+                if self.student.form_level_id is not None:
+                    analytics.refresh_on_commit(
+                        self.exam_id, self.student.school_id, self.student.form_level_id, self.subject_id
+                    )
+                scope = (self.exam_id, self.student.form_level_id, self.student.stream)
+                transaction.on_commit(lambda: dashboard_cache.bump_results(self.student.school_id, [scope]))
+                # Other processes rebuild their rank indexes; this one was updated in place
+                rank_index.touch_exam(self.exam_id)
+
+    # Subject result
+    #----------------------------------------------------------------------
+    def _update_exam_result(self):
+        entries = {
+            (self.student.id, row['subject_paper_id']): row['marks']
+            for row in PaperResult.objects.filter(
+                exam_id=self.exam_id,
+                student=self.student,
+                subject_paper__subject_id=self.subject_id,
+            ).values('subject_paper_id', 'marks')
+        }
+
+        if not entries:
+            ExamResult.objects.filter(
+                exam_id=self.exam_id,
+                student=self.student,
+                subject_id=self.subject_id,
+            ).delete()
+            return
+
+        papers = list(SubjectPaper.objects.filter(subject_id=self.subject_id).select_related('subject'))
+        paper_ratio = SubjectPaperRatio.objects.filter(subject_id=self.subject_id).first()
+        _, marks = subject_final_marks(entries, papers, paper_ratio)
+        final_marks = int(np.rint(marks[0]))
+
+        grade_table = grading_cache.grade_table_for(self.student.school_id, papers[0].subject.category_id)
+        grade, points = grade_table.grade_and_points(final_marks)
+
+        ExamResult.objects.update_or_create(
+            exam_id=self.exam_id,
+            student=self.student,
+            subject_id=self.subject_id,
+            defaults={'final_marks': final_marks, 'grade': grade, 'points': points},
+        )
+
+    # Summary and positions
+    #----------------------------------------------------------------------
+    def _update_summary(self):
+        previous = StudentExamSummary.objects.filter(
+            exam_id=self.exam_id,
+            student=self.student,
+        ).first()
+        old_score = previous.best_of_seven_marks or 0 if previous else None
+
+        results = list(ExamResult.objects.filter(exam_id=self.exam_id, student=self.student))
+        if not results:
+            if previous is not None:
+                previous.delete()
+                self._shift_positions(old_score, None)
+            return
+
+        summary = build_summary(self.exam_id, self.student.id, results)
+        summary.mean_grade, _ = grading_cache.default_grade_table(
+            self.student.school_id
+        ).grade_and_points(summary.mean_marks)
+        new_score = summary.best_of_seven_marks
+
+        if old_score != new_score:
+            self._shift_positions(old_score, new_score)
+
+        overall, stream = self._cohorts()
+        summary.overall_position = overall.filter(best_of_seven_marks__gt=new_score).count() + 1
+        summary.stream_position = stream.filter(best_of_seven_marks__gt=new_score).count() + 1
+
+        if previous is not None:
+            summary.pk = previous.pk
+        summary.save()
+
+    def _cohorts(self):
+        """Summaries ranked against this student: same form, and same stream."""
+        overall = StudentExamSummary.objects.filter(
+            exam_id=self.exam_id,
+            student__form_level_id=self.student.form_level_id,
+        ).exclude(student=self.student)
+        return overall, overall.filter(student__stream=self.student.stream)
+
+    def _shift_positions(self, old_score, new_score):
+        """
+        Competition ranking puts a student one place below everyone with a
+        strictly higher score, so moving from old_score to new_score only
+        changes the positions of students scoring in [new, old) (they move
+        up) or [old, new) (they move down). A student who appears or
+        disappears shifts everyone below them.
+        """
+        if old_score is None:
+            window, step = {'best_of_seven_marks__lt': new_score}, 1
+        elif new_score is None:
+            window, step = {'best_of_seven_marks__lt': old_score}, -1
+        elif new_score < old_score:
+            window, step = {'best_of_seven_marks__gte': new_score, 'best_of_seven_marks__lt': old_score}, -1
+        else:
+            window, step = {'best_of_seven_marks__gte': old_score, 'best_of_seven_marks__lt': new_score}, 1
+
+        overall, stream = self._cohorts()
+        shifted = overall.filter(**window).update(overall_position=F('overall_position') + step)
+        stream.filter(**window).update(stream_position=F('stream_position') + step)
+        logger.debug(f"Shifted {shifted} positions for exam {self.exam_id} after student {self.student.id} changed")
+
+
+def update_for_paper_result(paper_result):
+    """Entry point for the PaperResult signal handlers."""
+    IncrementalSummaryUpdater(
+        paper_result.exam_id,
+        paper_result.student,
+        paper_result.subject_paper.subject_id,
+    ).run()
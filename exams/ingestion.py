@@ -0,0 +1,164 @@
+# exams/ingestion.py
+"""
+Streaming CSV ingestion of exam results.
+
+Rows are read lazily from the uploaded file and processed in chunks.
+Admission numbers and subjects are resolved through dictionaries loaded
+once per upload, each chunk is validated in memory and written with a
+single upsert (COPY on PostgreSQL, see bulk_writes), and every rejected row
+is recorded in an IngestionReport.
+"""
+import csv
+import io
+import logging
+import time
+from itertools import islice
+
+from .bulk_writes import upsert
+from .models import ExamResult
+from students.models import Student
+from subjects.models import Subject
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+PRESENT = 'P'
+
+
+class IngestionReport:
+    """Counts, timing and per-row errors of one upload."""
+
+    def __init__(self):
+        self.rows = 0
+        self.saved = 0
+        self.skipped = 0
+        self.errors = []
+        self.elapsed = 0.0
+
+    @property
+    def error_count(self):
+        return len(self.errors)
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def add_error(self, row, admission_number, subject, error):
+        self.errors.append({
+            'row': row,
+            'admission_number': admission_number,
+            'subject': subject,
+            'error': error,
+        })
+
+    def errors_as_csv(self):
+        """Return the per-row errors as CSV text for download."""
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(['row', 'admission_number', 'subject', 'error'])
+        for error in self.errors:
+            writer.writerow([error['row'], error['admission_number'], error['subject'], error['error']])
+        return output.getvalue()
+
+
+class ResultsCsvIngestor:
+    """
+    Load final subject marks for an exam from a CSV with the columns
+    admission_number, subject_name (or subject_code), marks and an optional
+    status. Rows with a status other than 'P' carry no marks and are skipped.
+    """
+
+    def __init__(self, exam, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.exam = exam
+        self.chunk_size = chunk_size
+        self.students = {}
+        self.subjects = {}
+
+    def run(self, uploaded_file):
+        report = IngestionReport()
+        started = time.perf_counter()
+        self._load_lookups()
+
+        text = io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', newline='')
+        try:
+            # Header is line 1, so data rows start at 2
+            rows = enumerate(csv.DictReader(text), 2)
+            while True:
+                chunk = list(islice(rows, self.chunk_size))
+                if not chunk:
+                    break
+                results = self._validate_chunk(chunk, report)
+                self._write_chunk(results)
+                report.saved += len(results)
+        finally:
+            # Leave the uploaded file open for Django to clean up
+            text.detach()
+
+        report.elapsed = time.perf_counter() - started
+        logger.info(
+            f"Ingested {report.rows} rows for exam {self.exam} in {report.elapsed:.2f}s "
+            f"({report.rows_per_second:.0f} rows/sec): {report.saved} saved, "
+            f"{report.skipped} skipped, {report.error_count} errors"
+        )
+        return report
+
+    def _load_lookups(self):
+        self.students = dict(
+            Student.objects.filter(school_id=self.exam.school_id).values_list('admission_number', 'id')
+        )
+        for subject_id, name, code in Subject.objects.filter(
+            school_id=self.exam.school_id
+        ).values_list('id', 'name', 'code'):
+            self.subjects[name.strip().lower()] = subject_id
+            if code:
+                self.subjects.setdefault(code.strip().lower(), subject_id)
+
+    def _validate_chunk(self, chunk, report):
+        """Return the chunk's valid ExamResults, keeping the last row per student and subject."""
+        results = {}
+        for line, row in chunk:
+            report.rows += 1
+            admission_number = (row.get('admission_number') or '').strip()
+            subject_key = (row.get('subject_code') or row.get('subject_name') or '').strip()
+            marks_str = (row.get('marks') or '').strip()
+            status = (row.get('status') or PRESENT).strip().upper()
+
+            if not admission_number or not subject_key:
+                report.add_error(line, admission_number, subject_key, 'Missing admission number or subject')
+                continue
+
+            student_id = self.students.get(admission_number)
+            if student_id is None:
+                report.add_error(line, admission_number, subject_key, 'Unknown admission number')
+                continue
+
+            subject_id = self.subjects.get(subject_key.lower())
+            if subject_id is None:
+                report.add_error(line, admission_number, subject_key, 'Unknown subject')
+                continue
+
+            if status != PRESENT:
+                report.skipped += 1
+                continue
+
+            try:
+                marks = float(marks_str)
+            except ValueError:
+                report.add_error(line, admission_number, subject_key, f"Invalid marks '{marks_str}'")
+                continue
+            if not 0 <= marks <= 100:
+                report.add_error(line, admission_number, subject_key, f"Marks {marks_str} out of range 0-100")
+                continue
+
+            results[(student_id, subject_id)] = ExamResult(
+                exam_id=self.exam.id,
+                student_id=student_id,
+                subject_id=subject_id,
+                final_marks=round(marks),
+            )
+        return list(results.values())
+
+    def _write_chunk(self, results):
+        if not results:
+            return
+        upsert(ExamResult, results, unique_fields=['exam', 'student', 'subject'], update_fields=['final_marks'])
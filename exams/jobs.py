@@ -0,0 +1,58 @@
+# exams/jobs.py
+"""Background job handlers for heavy exam operations (see jobs.registry)."""
+import io
+
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+
+from jobs.registry import register
+from .bulk_engine import BulkSummaryEngine
+from .models import Exam
+
+RECALCULATE_SUMMARIES = 'exams.recalculate_summaries'
+PROCESS_SPREADSHEET = 'exams.process_spreadsheet'
+BACKUP_DATA = 'exams.backup_data'
+
+
+@register(RECALCULATE_SUMMARIES)
+def recalculate_summaries(job):
+    exam_ids = job.payload.get('exam_ids') or [job.payload['exam_id']]
+    job.set_progress(0, len(exam_ids))
+    students = 0
+    for done, exam in enumerate(Exam.objects.filter(pk__in=exam_ids), 1):
+        students += len(BulkSummaryEngine(exam).run())
+        job.set_progress(done)
+    return {'exams': len(exam_ids), 'students': students}
+
+
+@register(PROCESS_SPREADSHEET)
+def process_spreadsheet(job):
+    from subjects.models import Subject, SubjectPaper
+    from .utils.spreadsheet import SpreadsheetTemplate
+
+    exam = Exam.objects.get(pk=job.payload['exam_id'])
+    subject = Subject.objects.get(pk=job.payload['subject_id'])
+    paper_id = job.payload.get('paper_id')
+    paper = SubjectPaper.objects.get(pk=paper_id, subject=subject) if paper_id else None
+    path = job.payload['path']
+
+    try:
+        with default_storage.open(path, 'rb') as upload:
+            template = SpreadsheetTemplate(exam, subject, paper, job=job)
+            summary = template.process_spreadsheet(upload)
+    finally:
+        default_storage.delete(path)
+
+    if job.payload.get('recalculate', True):
+        BulkSummaryEngine(exam).run()
+    return summary
+
+
+@register(BACKUP_DATA)
+def backup_data(job):
+    output = io.StringIO()
+    options = {'output': job.payload.get('output', 'backups'), 'stdout': output}
+    if job.payload.get('school'):
+        options['school'] = job.payload['school']
+    call_command('backup_data', **options)
+    return {'log': output.getvalue().splitlines()}
@@ -3,6 +3,8 @@ from django.core.serializers import serialize
 import json
 import os
 from school.models import School
+from exams.jobs import BACKUP_DATA
+from jobs.models import Job
 
 class Command(BaseCommand):
     help = 'Backup data for all schools'
@@ -10,11 +12,17 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument('--school', type=str, help='School name to backup (optional, backups all if not specified)')
         parser.add_argument('--output', type=str, default='backups', help='Output directory')
+        parser.add_argument('--background', action='store_true', help='Queue the backup for run_workers instead of running it here')
 
     def handle(self, *args, **options):
         school_name = options['school']
         output_dir = options['output']
 
+        if options['background']:
+            job = Job.enqueue(BACKUP_DATA, {'school': school_name, 'output': os.path.abspath(output_dir)})
+            self.stdout.write(self.style.SUCCESS(f'Queued backup job #{job.pk}'))
+            return
+
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
 
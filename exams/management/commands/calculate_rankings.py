@@ -1,14 +1,26 @@
 from django.core.management.base import BaseCommand
 from exams.models import Exam
 from exams.services import GradingService
+from exams.jobs import RECALCULATE_SUMMARIES
+from jobs.models import Job
 
 class Command(BaseCommand):
     help = 'Calculate rankings and merit lists for all exams using best of 7 subjects logic'
 
     def add_arguments(self, parser):
         parser.add_argument('--exam-id', type=int, help='Specific exam ID to recalculate')
+        parser.add_argument('--background', action='store_true', help='Queue the work for run_workers instead of running it here')
 
     def handle(self, *args, **options):
+        if options['background']:
+            if options['exam_id']:
+                exam_ids = [options['exam_id']]
+            else:
+                exam_ids = list(Exam.objects.filter(is_active=True).values_list('id', flat=True))
+            job = Job.enqueue(RECALCULATE_SUMMARIES, {'exam_ids': exam_ids})
+            self.stdout.write(self.style.SUCCESS(f'Queued job #{job.pk} for {len(exam_ids)} exams'))
+            return
+
         if options['exam_id']:
             # Calculate for specific exam
             try:
@@ -6,6 +6,9 @@ from exams.models import (
     Exam, PaperResult, ExamResult, GradingSystem, GradingRange,
     StudentExamSummary
 )
+from exams import grading_cache
+from exams.bulk_engine import BulkSummaryEngine
+from exams.incremental import suspend_incremental_updates
 from students.models import Student
 from subjects.models import Subject, SubjectPaper
 from school.models import School
@@ -126,6 +129,11 @@ class Command(BaseCommand):
     @transaction.atomic
     def generate_results_for_exam(self, exam):
         """Generate results for a specific exam"""
+        # Results and summaries are written below, so skip per-mark updates
+        with suspend_incremental_updates():
+            return self._generate_results_for_exam(exam)
+
+    def _generate_results_for_exam(self, exam):
         # Get all students in this exam's form level
         students = Student.objects.filter(
             school=exam.school,
@@ -259,29 +267,9 @@ class Command(BaseCommand):
 
     def get_grade_and_points(self, school, subject, marks):
         """Get grade and points based on grading system"""
-        try:
-            # Find grading system for subject's category
-            if subject.category:
-                grading_system = GradingSystem.objects.filter(
-                    school=school,
-                    subject_category=subject.category,
-                    is_active=True
-                ).first()
-            else:
-                grading_system = None
-
-            # Find appropriate grade range
-            grade_range = GradingRange.objects.filter(
-                grading_system=grading_system,
-                min_marks__lte=marks,
-                max_marks__gte=marks
-            ).first()
-
-            if grade_range:
-                return grade_range.grade, grade_range.points
-
-        except (GradingSystem.DoesNotExist, GradingRange.DoesNotExist):
-            pass
+        grade, points = grading_cache.grade_table_for(school.id, subject.category_id).grade_and_points(marks)
+        if grade:
+            return grade, points
 
         # Fallback grading
         if marks >= 80:
@@ -311,107 +299,4 @@ class Command(BaseCommand):
 
     def update_exam_summaries(self, exam):
         """Update student exam summaries and rankings"""
-        students = Student.objects.filter(
-            exam_results__exam=exam
-        ).distinct()
-
-        for student in students:
-            results = ExamResult.objects.filter(exam=exam, student=student)
-
-            if not results:
-                continue
-
-            total_marks = sum(result.final_marks for result in results)
-            total_points = sum(result.points for result in results if result.points)
-            subject_count = results.count()
-
-            mean_marks = total_marks / subject_count if subject_count > 0 else 0
-            mean_points = total_points / subject_count if subject_count > 0 else 0
-
-            # Calculate mean grade from mean points
-            mean_grade = self.points_to_grade(mean_points)
-
-            # Calculate positions (simplified)
-            stream_position = self.calculate_stream_position(exam, student, mean_marks)
-            overall_position = self.calculate_overall_position(exam, student, mean_marks)
-
-            StudentExamSummary.objects.update_or_create(
-                exam=exam,
-                student=student,
-                defaults={
-                    'total_marks': total_marks,
-                    'mean_marks': mean_marks,
-                    'mean_grade': mean_grade,
-                    'total_points': total_points,
-                    'stream_position': stream_position,
-                    'overall_position': overall_position
-                }
-            )
-
-    def points_to_grade(self, mean_points):
-        """Convert mean points to mean grade"""
-        if mean_points >= 11.5:
-            return 'A'
-        elif mean_points >= 10.5:
-            return 'A-'
-        elif mean_points >= 9.5:
-            return 'B+'
-        elif mean_points >= 8.5:
-            return 'B'
-        elif mean_points >= 7.5:
-            return 'B-'
-        elif mean_points >= 6.5:
-            return 'C+'
-        elif mean_points >= 5.5:
-            return 'C'
-        elif mean_points >= 4.5:
-            return 'C-'
-        elif mean_points >= 3.5:
-            return 'D+'
-        elif mean_points >= 2.5:
-            return 'D'
-        elif mean_points >= 1.5:
-            return 'D-'
-        else:
-            return 'E'
-
-    def calculate_stream_position(self, exam, student, mean_marks):
-        """Calculate position within student's stream"""
-        stream_students = Student.objects.filter(
-            school=exam.school,
-            form_level__number=exam.form_level,
-            stream=student.stream
-        )
-
-        # Get mean marks for all students in stream
-        stream_means = []
-        for s in stream_students:
-            results = ExamResult.objects.filter(exam=exam, student=s)
-            if results:
-                s_mean = sum(r.final_marks for r in results) / results.count()
-                stream_means.append(s_mean)
-
-        stream_means.sort(reverse=True)
-        position = stream_means.index(mean_marks) + 1 if mean_marks in stream_means else len(stream_means) + 1
-
-        return position
-
-    def calculate_overall_position(self, exam, student, mean_marks):
-        """Calculate overall position in the form"""
-        form_students = Student.objects.filter(
-            school=exam.school,
-            form_level__number=exam.form_level
-        )
-
-        # Get mean marks for all students in form
-        form_means = []
-        for s in form_students:
-            results = ExamResult.objects.filter(exam=exam, student=s)
-            if results:
-                s_mean = sum(r.final_marks for r in results) / results.count()
-                form_means.append(s_mean)
-
-        form_means.sort(reverse=True)
-        position = form_means.index(mean_marks) + 1 if mean_marks in form_means else len(form_means) + 1
-
-        return position
\ No newline at end of file
+        BulkSummaryEngine(exam).run()
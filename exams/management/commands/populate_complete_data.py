@@ -11,6 +11,9 @@ User = get_user_model()
 class Command(BaseCommand):
     help = 'Populate database with complete data structure: forms, streams, students, subjects, and teachers'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--students-per-stream', type=int, default=5, help='Number of students to create in each stream')
+
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('Starting to populate complete data...'))
 
@@ -30,7 +33,7 @@ class Command(BaseCommand):
         self.create_teachers(school)
 
         # Create students
-        self.create_students(school)
+        self.create_students(school, options['students_per_stream'])
 
         self.stdout.write(self.style.SUCCESS('Complete data population completed!'))
 
@@ -247,7 +250,7 @@ class Command(BaseCommand):
 
                 self.stdout.write(f'Created teacher: {full_name} ({role_name})')
 
-    def create_students(self, school):
+    def create_students(self, school, students_per_stream=5):
         # Kenyan student names (mix of common names)
         first_names = [
             'David', 'Michael', 'John', 'James', 'Robert', 'William', 'Joseph', 'Daniel', 'Thomas', 'Andrew',
@@ -272,7 +275,7 @@ class Command(BaseCommand):
             for stream_name in streams:
                 stream = Stream.objects.get(school=school, form_level=form_level, name=stream_name)
 
-                for i in range(5):  # 5 students per stream
+                for i in range(students_per_stream):
                     # Generate unique admission number
                     admission_num = f"{form_num}{stream_name[0]}{str(i+1).zfill(2)}"
 
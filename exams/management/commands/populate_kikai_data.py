@@ -5,6 +5,7 @@ from students.models import Student
 from subjects.models import Subject, SubjectCategory, SubjectPaper, SubjectPaperRatio
 from accounts.models import Role, Profile, TeacherSubject, TeacherClass, TeacherGroup, TeacherGroupMembership
 from exams.models import GradingSystem, GradingRange, Exam, PaperResult, ExamResult, StudentExamSummary
+from exams.incremental import suspend_incremental_updates
 import csv
 import os
 from decimal import Decimal
@@ -53,7 +54,8 @@ class Command(BaseCommand):
         self.stdout.write('Clearing existing data...')
         StudentExamSummary.objects.all().delete()
         ExamResult.objects.all().delete()
-        PaperResult.objects.all().delete()
+        with suspend_incremental_updates():
+            PaperResult.objects.all().delete()
         Exam.objects.all().delete()
         GradingRange.objects.all().delete()
         GradingSystem.objects.all().delete()
@@ -0,0 +1,161 @@
+# exams/merit_list.py
+"""
+Keyset-paginated merit list pages for the JSON merit list endpoint.
+
+Pages are read in (overall_position, student_id) order, or by one subject's
+final marks then student_id, and continue from a cursor holding the last
+row's sort key rather than an OFFSET. Each page is a range scan on the
+(exam, overall_position, student) or (exam, subject, final_marks) index, so
+deep pages cost the same as the first.
+"""
+from django.db.models import Q
+
+from .models import ExamResult, ExamSubjectStats, StudentExamSummary
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidMeritListQuery(ValueError):
+    pass
+
+
+def encode_cursor(value, student_id):
+    return f"{value}:{student_id}"
+
+
+def decode_cursor(cursor):
+    try:
+        value, student_id = cursor.split(':')
+        return int(value), int(student_id)
+    except (AttributeError, ValueError):
+        raise InvalidMeritListQuery(f"Invalid cursor '{cursor}'")
+
+
+class MeritListPage:
+    """
+    One page of an exam's merit list for a form, optionally one stream.
+
+    sort is 'position' or 'subject:<id>'; order applies to subject sorts
+    ('desc' puts the highest marks first). Students without a result in the
+    sorted subject are left out of a subject-sorted list.
+    """
+
+    def __init__(self, exam, form_level_id, stream=None, school=None, sort='position',
+                 order='desc', limit=DEFAULT_PAGE_SIZE, after=None):
+        self.exam = exam
+        self.form_level_id = form_level_id
+        self.stream = stream
+        self.school_id = school.id if school is not None else exam.school_id
+        self.order = order
+        self.limit = limit
+        self.after = decode_cursor(after) if after else None
+        self.subject_id = None
+
+        if order not in ('asc', 'desc'):
+            raise InvalidMeritListQuery(f"Invalid order '{order}'")
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise InvalidMeritListQuery(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+        if sort != 'position':
+            kind, _, subject_id = sort.partition(':')
+            if kind != 'subject' or not subject_id.isdigit():
+                raise InvalidMeritListQuery(f"Invalid sort '{sort}'")
+            self.subject_id = int(subject_id)
+        self.sort = sort
+
+    def _student_scope(self):
+        scope = {
+            'student__school_id': self.school_id,
+            'student__form_level_id': self.form_level_id,
+        }
+        if self.stream:
+            scope['student__stream'] = self.stream
+        return scope
+
+    # Page keys
+    #----------------------------------------------------------------------
+    def _position_keys(self):
+        summaries = StudentExamSummary.objects.filter(exam=self.exam, **self._student_scope())
+        if self.after:
+            position, student_id = self.after
+            summaries = summaries.filter(
+                Q(overall_position__gt=position) | Q(overall_position=position, student_id__gt=student_id)
+            )
+        return list(summaries.order_by('overall_position', 'student_id').values_list(
+            'overall_position', 'student_id'
+        )[:self.limit + 1])
+
+    def _subject_keys(self):
+        results = ExamResult.objects.filter(exam=self.exam, subject_id=self.subject_id, **self._student_scope())
+        descending = self.order == 'desc'
+        if self.after:
+            marks, student_id = self.after
+            beyond = Q(final_marks__lt=marks) if descending else Q(final_marks__gt=marks)
+            results = results.filter(beyond | Q(final_marks=marks, student_id__gt=student_id))
+        ordering = '-final_marks' if descending else 'final_marks'
+        return list(results.order_by(ordering, 'student_id').values_list(
+            'final_marks', 'student_id'
+        )[:self.limit + 1])
+
+    # Page
+    #----------------------------------------------------------------------
+    def fetch(self):
+        keys = self._subject_keys() if self.subject_id else self._position_keys()
+        has_more = len(keys) > self.limit
+        keys = keys[:self.limit]
+        student_ids = [student_id for _, student_id in keys]
+
+        summaries = {
+            summary.student_id: summary
+            for summary in StudentExamSummary.objects.filter(
+                exam=self.exam, student_id__in=student_ids
+            ).select_related('student')
+        }
+        marks = {}
+        for result in ExamResult.objects.filter(exam=self.exam, student_id__in=student_ids).values(
+            'student_id', 'subject_id', 'final_marks', 'grade'
+        ):
+            marks.setdefault(result['student_id'], {})[result['subject_id']] = {
+                'marks': result['final_marks'],
+                'grade': result['grade'],
+            }
+
+        rows = []
+        for student_id in student_ids:
+            summary = summaries.get(student_id)
+            if summary is None:
+                continue
+            rows.append({
+                'student_id': student_id,
+                'admission_number': summary.student.admission_number,
+                'name': summary.student.name,
+                'stream': summary.student.stream,
+                'overall_position': summary.overall_position,
+                'stream_position': summary.stream_position,
+                'total_marks': summary.total_marks,
+                'mean_marks': summary.mean_marks,
+                'mean_grade': summary.mean_grade,
+                'total_points': summary.total_points,
+                'subjects': marks.get(student_id, {}),
+            })
+
+        return {
+            'exam': self.exam.id,
+            'form_level': self.form_level_id,
+            'stream': self.stream,
+            'sort': self.sort,
+            'order': self.order,
+            'subjects': self.subject_columns(),
+            'results': rows,
+            'next': encode_cursor(*keys[-1]) if has_more else None,
+        }
+
+    def subject_columns(self):
+        return [
+            {'id': subject_id, 'name': name, 'code': code}
+            for subject_id, name, code in ExamSubjectStats.objects.filter(
+                exam=self.exam,
+                form_level_id=self.form_level_id,
+                stream=self.stream or '',
+            ).order_by('subject__name').values_list('subject_id', 'subject__name', 'subject__code')
+        ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-17 22:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0002_initial'),
+        ('school', '0002_initial'),
+        ('subjects', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamSubjectStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stream', models.CharField(blank=True, help_text='Empty for the whole form', max_length=50)),
+                ('student_count', models.IntegerField(default=0)),
+                ('total_marks', models.IntegerField(default=0)),
+                ('mean_marks', models.FloatField(default=0)),
+                ('min_marks', models.IntegerField(default=0)),
+                ('max_marks', models.IntegerField(default=0)),
+                ('std_dev', models.FloatField(default=0)),
+                ('mean_grade', models.CharField(blank=True, max_length=10)),
+                ('grade_distribution', models.JSONField(default=dict, help_text='Number of students per grade')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subject_stats', to='exams.exam')),
+                ('form_level', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exam_subject_stats', to='school.formlevel')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exam_stats', to='subjects.subject')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['exam', 'form_level', 'stream'], name='exams_exams_exam_id_7fcffb_idx')],
+                'unique_together': {('exam', 'form_level', 'stream', 'subject')},
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-17 22:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0003_examsubjectstats'),
+        ('students', '0001_initial'),
+        ('subjects', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='examresult',
+            index=models.Index(fields=['exam', 'subject', 'final_marks'], name='exams_examr_exam_id_88289d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentexamsummary',
+            index=models.Index(fields=['exam', 'overall_position', 'student'], name='exams_stude_exam_id_0ddc13_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-17 22:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0004_merit_list_indexes'),
+        ('students', '0001_initial'),
+        ('subjects', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='examresult',
+            index=models.Index(fields=['subject', 'student'], name='exams_examr_subject_527034_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paperresult',
+            index=models.Index(fields=['exam', 'subject_paper'], name='exams_paper_exam_id_d530f7_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-17 23:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0005_result_access_indexes'),
+        ('school', '0003_schoolstats'),
+        ('subjects', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamDepartmentStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('student_count', models.IntegerField(default=0)),
+                ('result_count', models.IntegerField(default=0)),
+                ('total_marks', models.IntegerField(default=0)),
+                ('mean_marks', models.FloatField(default=0)),
+                ('std_dev', models.FloatField(default=0)),
+                ('student_marks', models.JSONField(default=list, help_text='[student id, total marks, results] per student')),
+                ('top_students', models.JSONField(default=list, help_text='[student id, mean marks] of the best students, best first')),
+                ('deviations', models.JSONField(default=list, help_text='[student id, subject id, marks, deviation from the subject mean], largest first')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exam_stats', to='subjects.subjectcategory')),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='department_stats', to='exams.exam')),
+                ('form_level', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exam_department_stats', to='school.formlevel')),
+            ],
+            options={
+                'unique_together': {('exam', 'form_level', 'category')},
+            },
+        ),
+    ]
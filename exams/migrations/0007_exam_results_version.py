@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 00:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0006_examdepartmentstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='results_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
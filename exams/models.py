@@ -1,10 +1,15 @@
 # exams/models.py
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.conf import settings  # Import settings to reference AUTH_USER_MODEL
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from school.models import School
+from school import stats as school_stats
 from subjects.models import SubjectCategory # Centralized SubjectCategory model
+from .grading_kernel import GradeTable
+from . import dashboard_cache, grading_cache, rank_index
 
 # We no longer need this line.
 # User = get_user_model()
@@ -20,18 +25,17 @@ class GradingSystem(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    def get_grade_and_points(self, marks):
+    def compile_grade_table(self):
         """
-        Get the grade and points for given marks.
+        Compile this system's ranges into a GradeTable for vectorized lookups.
         """
-        ranges = self.grading_ranges.filter(
-            min_marks__lte=marks,
-            max_marks__gte=marks
-        ).first()
+        return GradeTable.from_ranges(self.grading_ranges.all())
 
-        if ranges:
-            return ranges.grade, ranges.points
-        return 'N/A', 0
+    def get_grade_and_points(self, marks):
+        """
+        Get the grade and points for given marks from the cached grade table.
+        """
+        return grading_cache.grade_table_for_system(self).grade_and_points(marks)
 
     def __str__(self):
         return f"{self.school.name} - {self.name} Grading System"
@@ -65,9 +69,21 @@ class Exam(models.Model):
     is_published = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Bumped after each committed batch of summary changes, so processes rebuild
+    # older rank indexes (exams.rank_index); only ever changed by an UPDATE.
+    results_version = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         unique_together = ('school', 'name', 'form_level', 'year', 'term')
+
+    def save(self, *args, **kwargs):
+        # An exam loaded before its results were bumped must not write the older version back
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'results_version'
+            ]
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return f"{self.school.name} - {self.name} Form {self.form_level} ({self.year} Term {self.term})"
@@ -81,6 +97,10 @@ class PaperResult(models.Model):
     
     class Meta:
         unique_together = ('exam', 'student', 'subject_paper')
+        indexes = [
+            # Paper entry sheets and importers load a whole paper at a time
+            models.Index(fields=['exam', 'subject_paper']),
+        ]
     
     def __str__(self):
         return f"{self.student.name} - {self.subject_paper.subject.name} ({self.subject_paper.paper_number}) for {self.exam.name}"
@@ -101,6 +121,12 @@ class ExamResult(models.Model):
     
     class Meta:
         unique_together = ('exam', 'student', 'subject')
+        indexes = [
+            # Subject-sorted merit list pages, and any (exam, subject) filter
+            models.Index(fields=['exam', 'subject', 'final_marks']),
+            # Subject results across exams, joined to the student's form and stream
+            models.Index(fields=['subject', 'student']),
+        ]
     
     def __str__(self):
         return f"{self.student.name}'s {self.subject.name} result for {self.exam.name}"
@@ -124,6 +150,133 @@ class StudentExamSummary(models.Model):
 
     class Meta:
         unique_together = ('exam', 'student')
+        indexes = [
+            # Merit list pages keyed on (overall_position, student)
+            models.Index(fields=['exam', 'overall_position', 'student']),
+        ]
     
     def __str__(self):
         return f"{self.student.name}'s Summary for {self.exam.name}"
+
+# Materialized per-subject analytics for an exam, refreshed by exams/analytics.py
+# whenever the exam's results change. Rows with an empty stream cover the whole form.
+class ExamSubjectStats(models.Model):
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='subject_stats')
+    form_level = models.ForeignKey('school.FormLevel', on_delete=models.CASCADE, related_name='exam_subject_stats')
+    stream = models.CharField(max_length=50, blank=True, help_text="Empty for the whole form")
+    subject = models.ForeignKey('subjects.Subject', on_delete=models.CASCADE, related_name='exam_stats')
+    student_count = models.IntegerField(default=0)
+    total_marks = models.IntegerField(default=0)
+    mean_marks = models.FloatField(default=0)
+    min_marks = models.IntegerField(default=0)
+    max_marks = models.IntegerField(default=0)
+    std_dev = models.FloatField(default=0)
+    mean_grade = models.CharField(max_length=10, blank=True)
+    grade_distribution = models.JSONField(default=dict, help_text="Number of students per grade")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('exam', 'form_level', 'stream', 'subject')
+        indexes = [
+            models.Index(fields=['exam', 'form_level', 'stream']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject.name} stats for {self.exam.name} (Form {self.form_level.number} {self.stream or 'all streams'})"
+
+# Materialized per-department (subject category) rollups for an exam and form, refreshed by
+# exams/analytics.py alongside ExamSubjectStats whenever results in the department change.
+class ExamDepartmentStats(models.Model):
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='department_stats')
+    form_level = models.ForeignKey('school.FormLevel', on_delete=models.CASCADE, related_name='exam_department_stats')
+    category = models.ForeignKey('subjects.SubjectCategory', on_delete=models.CASCADE, related_name='exam_stats')
+    student_count = models.IntegerField(default=0)
+    result_count = models.IntegerField(default=0)
+    total_marks = models.IntegerField(default=0)
+    mean_marks = models.FloatField(default=0)
+    std_dev = models.FloatField(default=0)
+    student_marks = models.JSONField(default=list, help_text="[student id, total marks, results] per student")
+    top_students = models.JSONField(default=list, help_text="[student id, mean marks] of the best students, best first")
+    deviations = models.JSONField(
+        default=list, help_text="[student id, subject id, marks, deviation from the subject mean], largest first"
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('exam', 'form_level', 'category')
+
+    def __str__(self):
+        return f"{self.category.name} stats for {self.exam.name} (Form {self.form_level.number})"
+
+# Compiled grade tables are cached per process; drop them when grading changes
+# and bump the school's grading version so that other processes reload theirs.
+@receiver([post_save, post_delete], sender=GradingSystem)
+def invalidate_grading_system_tables(sender, instance, **kwargs):
+    grading_cache.bump(instance.school_id)
+    grading_cache.invalidate_system(instance.id)
+    grading_cache.invalidate_school(instance.school_id)
+
+@receiver([post_save, post_delete], sender=GradingRange)
+def invalidate_grading_range_tables(sender, instance, **kwargs):
+    grading_cache.bump_system(instance.grading_system_id)
+    grading_cache.invalidate_system(instance.grading_system_id)
+
+# Dashboards list exams and their publication state.
+@receiver([post_save, post_delete], sender=Exam)
+def invalidate_dashboards_on_exam_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    school_id = instance.school_id
+    transaction.on_commit(lambda: dashboard_cache.bump_structure(school_id))
+
+# School counters cover active and published exams and their summaries.
+@receiver([post_save, post_delete], sender=Exam)
+def mark_school_stats_stale_on_exam_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        school_stats.mark_stale(instance.school_id)
+
+@receiver(post_save, sender=StudentExamSummary)
+def mark_school_stats_stale_on_summary_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        school_stats.mark_summary_stale(instance.exam_id, instance.student_id)
+
+@receiver(post_delete, sender=StudentExamSummary)
+def mark_school_stats_stale_on_summary_delete(sender, instance, origin=None, **kwargs):
+    # Cascades from an exam or student deletion are covered by their own handlers
+    if origin is None or isinstance(origin, StudentExamSummary) or getattr(origin, 'model', None) is StudentExamSummary:
+        school_stats.mark_summary_stale(instance.exam_id, instance.student_id)
+
+# Keep the student's results, summary and the positions around them current
+# when a single paper mark changes.
+def _is_paper_result_deletion(origin):
+    return origin is None or isinstance(origin, PaperResult) or getattr(origin, 'model', None) is PaperResult
+
+@receiver(post_save, sender=PaperResult)
+def update_summary_on_paper_result_save(sender, instance, raw=False, **kwargs):
+    from .incremental import updates_suspended, update_for_paper_result
+
+    if raw or updates_suspended():
+        return
+    update_for_paper_result(instance)
+
+@receiver(post_delete, sender=PaperResult)
+def update_summary_on_paper_result_delete(sender, instance, origin=None, **kwargs):
+    from .incremental import updates_suspended, update_for_paper_result
+
+    # Cascades from an exam, student or paper deletion take the summary with them
+    if updates_suspended() or not _is_paper_result_deletion(origin):
+        return
+    update_for_paper_result(instance)
+
+# Keep the in-process rank indexes in step with committed summaries.
+@receiver(post_save, sender=StudentExamSummary)
+def update_rank_index_on_summary_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    exam_id, student_id, score = instance.exam_id, instance.student_id, instance.best_of_seven_marks
+    transaction.on_commit(lambda: rank_index.record_summary(exam_id, student_id, score))
+
+@receiver(post_delete, sender=StudentExamSummary)
+def update_rank_index_on_summary_delete(sender, instance, **kwargs):
+    exam_id, student_id = instance.exam_id, instance.student_id
+    transaction.on_commit(lambda: rank_index.discard_summary(exam_id, student_id))
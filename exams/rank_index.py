@@ -0,0 +1,287 @@
+# exams/rank_index.py
+"""
+Order-statistics indexes for exam positions.
+
+Each exam keeps one RankIndex per form level (overall positions) and one per
+form level and stream (stream positions), ranked on best of 7 marks. An
+index is a Fenwick tree over integer score buckets, so "position of score X"
+and "top N" are O(log n), and a changed score is an O(log n) update instead
+of a re-sort of the whole form.
+
+Indexes are built from StudentExamSummary on first use and kept current in
+this process by the StudentExamSummary signal handlers in exams/models.py.
+Summary writers also call touch_exam once per batch, which bumps
+Exam.results_version after the transaction commits, and an index loaded
+under an older version is rebuilt, so changes made by background workers or
+other web processes are picked up on the next read.
+"""
+import math
+import threading
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+
+_lock = threading.RLock()
+_exams = {}   # exam_id -> ExamRankIndexes
+_stamps = {}  # exam_id -> Exam.results_version the indexes reflect
+
+
+class RankIndex:
+    """
+    Competition ranking ("1224") of members by a non-negative integer score,
+    highest first.
+    """
+
+    def __init__(self, max_score=0):
+        self._size = 1
+        while self._size <= max_score:
+            self._size *= 2
+        self._tree = [0] * (self._size + 1)
+        self._scores = {}                  # member -> score
+        self._buckets = defaultdict(set)   # score -> members
+
+    def __len__(self):
+        return len(self._scores)
+
+    def __contains__(self, member):
+        return member in self._scores
+
+    # Fenwick tree
+    #----------------------------------------------------------------------
+    def _add(self, score, delta):
+        index = score + 1
+        while index <= self._size:
+            self._tree[index] += delta
+            index += index & -index
+
+    def _count_at_most(self, score):
+        index = min(score + 1, self._size)
+        total = 0
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+    def _grow(self, score):
+        while self._size <= score:
+            self._size *= 2
+        self._tree = [0] * (self._size + 1)
+        for bucket_score, members in self._buckets.items():
+            self._add(bucket_score, len(members))
+
+    # Updates
+    #----------------------------------------------------------------------
+    def insert(self, member, score):
+        """Add a member, or move it to a new score."""
+        score = int(score or 0)
+        if member in self._scores:
+            if self._scores[member] == score:
+                return
+            self.remove(member)
+        if score >= self._size:
+            self._grow(score)
+        self._scores[member] = score
+        self._buckets[score].add(member)
+        self._add(score, 1)
+
+    update = insert
+
+    def remove(self, member):
+        score = self._scores.pop(member, None)
+        if score is None:
+            return
+        self._buckets[score].discard(member)
+        if not self._buckets[score]:
+            del self._buckets[score]
+        self._add(score, -1)
+
+    # Queries
+    #----------------------------------------------------------------------
+    def score_of(self, member):
+        return self._scores.get(member)
+
+    def count_above(self, score):
+        """Number of members scoring strictly more than score."""
+        if score is None:
+            score = 0
+        floor = math.floor(score)
+        if floor < 0:
+            return len(self)
+        return len(self) - self._count_at_most(floor)
+
+    def position(self, score, exclude=None):
+        """
+        Position a score would hold. Pass exclude to leave a member's own
+        current score out, e.g. when ranking that member's new score.
+        """
+        above = self.count_above(score)
+        own = self._scores.get(exclude)
+        if own is not None and own > (score or 0):
+            above -= 1
+        return above + 1
+
+    def position_of(self, member):
+        score = self._scores.get(member)
+        return None if score is None else self.position(score)
+
+    def kth_largest(self, k):
+        """Score of the k-th highest member (1-based)."""
+        if not 1 <= k <= len(self):
+            return None
+        # Binary lifting for the (n - k + 1)-th smallest score
+        remaining = len(self) - k + 1
+        index = 0
+        step = self._size
+        while step:
+            probe = index + step
+            if probe <= self._size and self._tree[probe] < remaining:
+                index = probe
+                remaining -= self._tree[probe]
+            step //= 2
+        return index
+
+    def top(self, n):
+        """Return [(member, score, position)] for the first n positions."""
+        ranked = []
+        k = 1
+        while k <= min(n, len(self)):
+            score = self.kth_largest(k)
+            members = sorted(self._buckets[score], key=str)
+            ranked.extend((member, score, k) for member in members)
+            k += len(members)
+        return ranked
+
+
+class ExamRankIndexes:
+    """The overall and stream indexes of one exam."""
+
+    def __init__(self):
+        self.forms = defaultdict(RankIndex)     # form_level_id -> RankIndex
+        self.streams = defaultdict(RankIndex)   # (form_level_id, stream) -> RankIndex
+        self.groups = {}                        # student_id -> (form_level_id, stream)
+
+    def record(self, student_id, form_level_id, stream, score):
+        previous = self.groups.get(student_id)
+        if previous is not None and previous != (form_level_id, stream):
+            self.discard(student_id)
+        self.groups[student_id] = (form_level_id, stream)
+        self.forms[form_level_id].insert(student_id, score)
+        self.streams[(form_level_id, stream)].insert(student_id, score)
+
+    def discard(self, student_id):
+        group = self.groups.pop(student_id, None)
+        if group is None:
+            return
+        self.forms[group[0]].remove(student_id)
+        self.streams[group].remove(student_id)
+
+    def positions(self, student_id):
+        """Return (stream_position, overall_position), or None if unranked."""
+        group = self.groups.get(student_id)
+        if group is None:
+            return None
+        return self.streams[group].position_of(student_id), self.forms[group[0]].position_of(student_id)
+
+
+def _load_exam(exam):
+    from .models import StudentExamSummary
+
+    indexes = ExamRankIndexes()
+    rows = StudentExamSummary.objects.filter(exam_id=exam.id).values_list(
+        'student_id', 'student__form_level_id', 'student__stream', 'best_of_seven_marks'
+    )
+    for student_id, form_level_id, stream, score in rows:
+        indexes.record(student_id, form_level_id, stream, score)
+    _exams[exam.id] = indexes
+    _stamps[exam.id] = exam.results_version
+    return indexes
+
+
+def exam_indexes(exam):
+    """Return the exam's indexes, rebuilding them if the exam's results were bumped since."""
+    indexes = _exams.get(exam.id)
+    if indexes is None or _stamps.get(exam.id) != exam.results_version:
+        with _lock:
+            indexes = _exams.get(exam.id)
+            if indexes is None or _stamps.get(exam.id) != exam.results_version:
+                indexes = _load_exam(exam)
+    return indexes
+
+
+def form_index(exam, form_level_id):
+    return exam_indexes(exam).forms[form_level_id]
+
+
+def stream_index(exam, form_level_id, stream):
+    return exam_indexes(exam).streams[(form_level_id, stream)]
+
+
+def apply_positions(exam, summaries):
+    """
+    Set stream_position and overall_position on StudentExamSummary objects
+    from the index and return them as a list. Summaries the index does not
+    know keep their stored values.
+    """
+    indexes = exam_indexes(exam)
+    summaries = list(summaries)
+    for summary in summaries:
+        positions = indexes.positions(summary.student_id)
+        if positions is not None:
+            summary.stream_position, summary.overall_position = positions
+    return summaries
+
+
+def touch_exam(exam_id):
+    """
+    Bump the exam's results_version once the current transaction commits, so
+    processes holding older indexes rebuild them. Call it once per batch of
+    summary changes: the bump runs after commit, outside the writers' lock.
+    """
+    transaction.on_commit(lambda: _bump(exam_id))
+
+
+def _bump(exam_id):
+    from .models import Exam
+
+    Exam.objects.filter(pk=exam_id).update(results_version=F('results_version') + 1)
+    version = Exam.objects.filter(pk=exam_id).values_list('results_version', flat=True).first()
+    with _lock:
+        # This process's indexes were updated in place; they stay current if
+        # no other bump came between the version they were loaded at and ours
+        if version is not None and exam_id in _exams and _stamps.get(exam_id) == version - 1:
+            _stamps[exam_id] = version
+
+
+def record_summary(exam_id, student_id, score, group=None):
+    """Move a student to a new score, if the exam's indexes are loaded. group is (form_level_id, stream), if known."""
+    with _lock:
+        indexes = _exams.get(exam_id)
+        if indexes is None:
+            return
+        group = indexes.groups.get(student_id, group)
+        if group is None:
+            from students.models import Student
+            group = Student.objects.filter(pk=student_id).values_list('form_level_id', 'stream').first()
+            if group is None:
+                return
+        indexes.record(student_id, group[0], group[1], score)
+
+
+def discard_summary(exam_id, student_id):
+    with _lock:
+        indexes = _exams.get(exam_id)
+        if indexes is not None:
+            indexes.discard(student_id)
+
+
+def invalidate_exam(exam_id):
+    with _lock:
+        _exams.pop(exam_id, None)
+        _stamps.pop(exam_id, None)
+
+
+def clear():
+    with _lock:
+        _exams.clear()
+        _stamps.clear()
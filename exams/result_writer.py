@@ -0,0 +1,60 @@
+# exams/result_writer.py
+"""
+Batched writes of paper marks from the mark entry views.
+
+A view adds every mark in the submitted form to a PaperResultWriter and
+flushes once. The flush is a single short write transaction: one upsert of
+the paper results, then one BulkSummaryEngine pass over the affected forms,
+which recomputes subject results, summaries and positions in a fixed number
+of queries however many students the batch covers and writes back only the
+rows that changed. Subject statistics and the dashboard cache generations
+are refreshed once the transaction commits. Saving marks row by row with
+update_or_create took the write lock and ran the PaperResult signal
+handlers once per student, which is what made concurrent mark entry on
+SQLite fail with "database is locked".
+"""
+import logging
+
+from django.db import transaction
+
+from . import grading_cache
+from .bulk_engine import BulkSummaryEngine
+from .bulk_writes import upsert
+from .models import PaperResult
+
+logger = logging.getLogger(__name__)
+
+
+class PaperResultWriter:
+    """Collect marks for one exam and write them in one transaction."""
+
+    def __init__(self, exam):
+        self.exam = exam
+        self._marks = {}
+
+    def __len__(self):
+        return len(self._marks)
+
+    def add(self, student, subject_paper, marks):
+        """Queue a mark; a later mark for the same student and paper replaces it."""
+        self._marks[(student.id, subject_paper.id)] = (student, subject_paper, marks)
+
+    def flush(self):
+        """Write the queued marks and bring dependent results up to date. Returns the rows written."""
+        if not self._marks:
+            return 0
+
+        rows = [
+            PaperResult(exam=self.exam, student=student, subject_paper=paper, marks=marks)
+            for student, paper, marks in self._marks.values()
+        ]
+        form_level_ids = {student.form_level_id for student, _, _ in self._marks.values()}
+
+        grading_cache.sync(self.exam.school_id)
+        with transaction.atomic():
+            upsert(PaperResult, rows, unique_fields=['exam', 'student', 'subject_paper'], update_fields=['marks'])
+            BulkSummaryEngine(self.exam, form_level_ids).run()
+
+        logger.info(f"Wrote {len(rows)} paper results in {len(form_level_ids)} forms of exam {self.exam.id}")
+        self._marks = {}
+        return len(rows)
@@ -1,5 +1,8 @@
 from django.db.models import Avg, Count, Sum, F, Q
 from .models import ExamResult, StudentExamSummary, GradingSystem, GradingRange, PaperResult
+from . import rank_index
+from .bulk_engine import BulkSummaryEngine
+from .grading_kernel import final_marks, paper_weights
 from students.models import Student
 from subjects.models import Subject
 import logging
@@ -22,43 +25,18 @@ class GradingService:
         paper_ratio = SubjectPaperRatio.objects.filter(subject=subject).first()
 
         # Get all paper results for this exam, student, and subject
-        paper_results = PaperResult.objects.filter(
+        paper_results = list(PaperResult.objects.filter(
             exam=exam,
             student=student,
             subject_paper__subject=subject
-        ).select_related('subject_paper')
+        ).select_related('subject_paper'))
 
-        if not paper_results.exists():
+        if not paper_results:
             return 0
 
-        # If no paper ratio configured, use simple average
-        if not paper_ratio:
-            return sum(p.marks for p in paper_results) / len(paper_results)
-
-        total_weighted_marks = 0
-        total_weight = 0
-
-        for paper_result in paper_results:
-            paper_number = paper_result.subject_paper.paper_number
-
-            # Get the contribution percentage based on paper number
-            if paper_number == 1 and paper_ratio.paper1_contribution:
-                weight = paper_ratio.paper1_contribution / 100.0
-            elif paper_number == 2 and paper_ratio.paper2_contribution:
-                weight = paper_ratio.paper2_contribution / 100.0
-            elif paper_number == 3 and paper_ratio.paper3_contribution:
-                weight = paper_ratio.paper3_contribution / 100.0
-            else:
-                continue  # Skip papers without configured ratios
-
-            total_weighted_marks += paper_result.marks * weight
-            total_weight += weight
-
-        # If no valid ratios found, fall back to simple average
-        if total_weight == 0:
-            return sum(p.marks for p in paper_results) / len(paper_results)
-
-        return total_weighted_marks / total_weight if total_weight > 0 else 0
+        # Same kernel as the bulk engine, for a single-row marks matrix
+        max_marks, weights = paper_weights([p.subject_paper for p in paper_results], paper_ratio)
+        return float(final_marks([p.marks for p in paper_results], max_marks, weights)[0])
 
     @staticmethod
     def calculate_best_of_seven(exam_results):
@@ -178,38 +156,11 @@ class GradingService:
         """
         Calculate stream and overall positions for a student.
         """
-        # Get all students in the same form level and exam
-        form_students = Student.objects.filter(
-            school=exam.school,
-            form_level=student.form_level
-        )
-
-        # Get their best marks for comparison
-        student_summaries = StudentExamSummary.objects.filter(
-            exam=exam,
-            student__in=form_students
-        ).select_related('student')
-
-        # Calculate positions
-        all_marks = [(s.best_of_seven_marks or 0, s.student.stream) for s in student_summaries]
-        all_marks.append((best_marks, student.stream))
-        all_marks.sort(key=lambda x: x[0], reverse=True)
-
-        # Find positions
-        overall_position = 1
-        stream_position = 1
-        current_marks = best_marks
-
-        for marks, stream in all_marks:
-            if marks > current_marks:
-                overall_position += 1
-                if stream == student.stream:
-                    stream_position += 1
-            elif marks == current_marks:
-                # Handle ties - same position
-                pass
-            else:
-                break
+        # Rank against everyone else in the form; the student's own stored score is left out
+        form = rank_index.form_index(exam, student.form_level_id)
+        stream = rank_index.stream_index(exam, student.form_level_id, student.stream)
+        overall_position = form.position(best_marks, exclude=student.id)
+        stream_position = stream.position(best_marks, exclude=student.id)
 
         return stream_position, overall_position
 
@@ -217,20 +168,10 @@ class GradingService:
     def bulk_calculate_exam_summaries(exam):
         """
         Calculate exam summaries for all students in an exam.
+        Uses the set-based engine so the query count does not grow with the
+        number of students.
         """
-        students = Student.objects.filter(
-            school=exam.school,
-            form_level__in=exam.participating_forms.all()
-        )
-
-        summaries = []
-        for student in students:
-            summary = GradingService.calculate_student_exam_summary(student, exam)
-            if summary:
-                summaries.append(summary)
-
-        logger.info(f"Calculated summaries for {len(summaries)} students in exam {exam}")
-        return summaries
+        return BulkSummaryEngine(exam).run()
 
     @staticmethod
     def get_grading_ranges(grading_system):
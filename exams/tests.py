@@ -1,3 +1,596 @@
-from django.test import TestCase
+import io
+import math
+import random
+from types import SimpleNamespace
 
-# Create your tests here.
+import numpy as np
+import openpyxl
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from accounts.models import CustomUser, Role, TeacherClass, TeacherSubject
+from jobs.models import Job
+from school.models import FormLevel, School
+from students.models import Student
+from subjects.models import Subject, SubjectPaper
+from . import analytics, grading_cache, grading_kernel, rank_index
+from .grading_kernel import NO_GRADE, GradeTable
+from .jobs import PROCESS_SPREADSHEET
+from .merit_list import MeritListPage
+from .rank_index import RankIndex
+from .bulk_engine import BulkSummaryEngine
+from .models import Exam, ExamResult, ExamSubjectStats, GradingRange, GradingSystem, PaperResult, StudentExamSummary
+from .result_writer import PaperResultWriter
+from .utils.spreadsheet import SpreadsheetTemplate
+
+
+class CompletionFormLevelTests(TestCase):
+    """Teacher classes hold form numbers; completion is keyed by FormLevel id, which differs from the number."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Another school's forms first, so this school's FormLevel ids are not 1-4
+        other = School.objects.create(name='Other School')
+        for number in range(1, 5):
+            FormLevel.objects.create(school=other, number=number)
+
+        cls.school = School.objects.create(name='Completion School')
+        forms = {number: FormLevel.objects.create(school=cls.school, number=number) for number in range(1, 5)}
+        cls.form = forms[2]
+        assert cls.form.id != 2
+
+        cls.subject = Subject.objects.create(school=cls.school, name='Mathematics', code='MAT')
+        cls.subject.form_levels.add(cls.form)
+        cls.teacher = CustomUser.objects.create_user('teacher', password='x', school=cls.school)
+        cls.teacher.profile.roles.add(Role.objects.create(name='Teacher'))
+        TeacherClass.objects.create(teacher=cls.teacher, school=cls.school, form_level=2, stream='East', is_class_teacher=True)
+        TeacherSubject.objects.create(teacher=cls.teacher, subject=cls.subject)
+
+        cls.exam = Exam.objects.create(school=cls.school, name='Opener', form_level=2, year=2026, term=1)
+        cls.exam.participating_forms.add(cls.form)
+        for n, marks in enumerate([60, None]):
+            student = Student.objects.create(
+                school=cls.school, name=f'Student {n}', admission_number=f'C{n}', form_level=cls.form, stream='East'
+            )
+            student.subjects.add(cls.subject)
+            if marks is not None:
+                ExamResult.objects.create(exam=cls.exam, student=student, subject=cls.subject, final_marks=marks)
+
+    def setUp(self):
+        self.client.force_login(self.teacher)
+
+    def test_teacher_dashboard_completion(self):
+        response = self.client.get(reverse('accounts:teacher_dashboard'))
+        [row] = response.context['teacher_exams']
+        self.assertEqual((row['form_level'], row['form_level_id']), (2, self.form.id))
+        self.assertEqual((row['total_students'], row['existing_results']), (2, 1))
+        self.assertEqual(row['completion_percentage'], 50)
+
+    def test_my_classes_completion(self):
+        response = self.client.get(reverse('exams:my_classes_exam_management'), {'exam': self.exam.id})
+        [subject_class] = response.context['subject_classes']
+        [supervised_class] = response.context['supervised_classes']
+        for row in (subject_class, supervised_class):
+            self.assertEqual(row['status'], 'active')
+            self.assertEqual((row['enrolled'], row['entered']), (2, 1))
+
+    def test_update_exam_selection_participation(self):
+        response = self.client.post(reverse('exams:update_exam_selection'), {'exam_id': self.exam.id})
+        data = response.json()
+        self.assertEqual([row['status'] for row in data['subject_classes']], ['active'])
+        self.assertEqual([row['status'] for row in data['supervised_classes']], ['active'])
+
+    def filled_workbook(self, subject, paper, marks):
+        """A template for subject and paper with the given marks entered, in order, as Present."""
+        output = io.BytesIO()
+        SpreadsheetTemplate(self.exam, subject, paper).generate_template().save(output)
+        workbook = openpyxl.load_workbook(io.BytesIO(output.getvalue()))
+        sheet = workbook.worksheets[-1]
+        for row, value in enumerate(marks, 3):
+            sheet.cell(row=row, column=4, value=value)
+            sheet.cell(row=row, column=5, value='P')
+        output = io.BytesIO()
+        workbook.save(output)
+        output.seek(0)
+        return output
+
+    def test_spreadsheet_import_uses_the_upload_paper(self):
+        paper = SubjectPaper.objects.create(subject=self.subject, paper_number='1', max_marks=80)
+        template = SpreadsheetTemplate(self.exam, self.subject, paper)
+        template.process_spreadsheet(self.filled_workbook(self.subject, paper, [70, 45]))
+        self.assertEqual(
+            sorted(PaperResult.objects.filter(exam=self.exam).values_list('student__admission_number', 'subject_paper', 'marks')),
+            [('C0', paper.id, 70), ('C1', paper.id, 45)],
+        )
+
+    def test_spreadsheet_for_another_subject_is_rejected(self):
+        paper = SubjectPaper.objects.create(subject=self.subject, paper_number='1', max_marks=100)
+        other = Subject.objects.create(school=self.school, name='Physics', code='PHY')
+        other_paper = SubjectPaper.objects.create(subject=other, paper_number='1', max_marks=100)
+        for student in Student.objects.filter(school=self.school):
+            student.subjects.add(other)
+
+        template = SpreadsheetTemplate(self.exam, self.subject, paper)
+        valid, message = template.validate_spreadsheet(self.filled_workbook(other, other_paper, [90, 90]))
+        self.assertFalse(valid)
+        self.assertIn('different subject or paper', message)
+        with self.assertRaises(Exception):
+            template.process_spreadsheet(self.filled_workbook(other, other_paper, [90, 90]))
+        # Another paper of the same subject is rejected too
+        second = SubjectPaper.objects.create(subject=self.subject, paper_number='2', max_marks=100)
+        self.assertFalse(template.validate_spreadsheet(self.filled_workbook(self.subject, second, [90, 90]))[0])
+        self.assertFalse(PaperResult.objects.exists())
+
+        self.client.force_login(CustomUser.objects.create_superuser('admin', password='x', school=self.school))
+        response = self.client.post(
+            reverse('exams:paper_spreadsheet', args=[self.exam.id, self.subject.id, paper.id]),
+            {'file': SimpleUploadedFile('physics.xlsx', self.filled_workbook(other, other_paper, [90, 90]).read())},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Job.objects.exists())
+
+    def test_spreadsheet_download_and_upload(self):
+        self.client.force_login(CustomUser.objects.create_superuser('admin', password='x', school=self.school))
+        url = reverse('exams:subject_spreadsheet', args=[self.exam.id, self.subject.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post(url, {'file': SimpleUploadedFile('filled.xlsx', response.content)})
+        self.assertEqual(response.status_code, 202, response.content)
+        job = Job.objects.get(pk=response.json()['job_id'])
+        self.assertEqual((job.kind, job.payload['exam_id'], job.payload['subject_id']), (PROCESS_SPREADSHEET, self.exam.id, self.subject.id))
+        self.assertTrue(default_storage.exists(job.payload['path']))
+        default_storage.delete(job.payload['path'])
+
+        response = self.client.post(url, {'file': SimpleUploadedFile('notes.xlsx', b'not a workbook')})
+        self.assertEqual(response.status_code, 400)
+
+    def test_upload_errors_download(self):
+        self.client.force_login(CustomUser.objects.create_superuser('admin', password='x', school=self.school))
+        upload = SimpleUploadedFile('results.csv', b'admission_number,subject_name,marks,status\nC1,Mathematics,55,P\nX9,Mathematics,40,P\n')
+        response = self.client.post(reverse('exams:upload_results', args=[self.exam.id]), {'results_file': upload})
+        self.assertEqual(response.context['report'].error_count, 1)
+        errors_url = response.context['errors_url']
+
+        response = self.client.get(errors_url)
+        self.assertEqual(response.status_code, 200)
+        rows = b''.join(response.streaming_content).decode().splitlines()
+        response.close()
+        self.assertEqual(rows[0], 'row,admission_number,subject,error')
+        self.assertTrue(rows[1].startswith('3,X9,Mathematics,'))
+        default_storage.delete(f"uploads/errors/{self.exam.id}/{resolve(errors_url).kwargs['token'].hex}.csv")
+
+    def test_template_students_without_participating_forms(self):
+        exam = Exam.objects.create(school=self.school, name='Catch Up', form_level=2, year=2026, term=1)
+        students = SpreadsheetTemplate(exam, self.subject)._students()
+        self.assertEqual([student.admission_number for student in students], ['C0', 'C1'])
+
+
+# (min, max, grade, points) of a KCSE style grading system
+KCSE_RANGES = [
+    (80, 100, 'A', 12), (75, 79, 'A-', 11), (70, 74, 'B+', 10), (65, 69, 'B', 9),
+    (60, 64, 'B-', 8), (55, 59, 'C+', 7), (50, 54, 'C', 6), (45, 49, 'C-', 5),
+    (40, 44, 'D+', 4), (35, 39, 'D', 3), (30, 34, 'D-', 2), (0, 29, 'E', 1),
+]
+
+
+class GradingKernelTests(SimpleTestCase):
+    """The vectorized kernel against per-student loops."""
+
+    def setUp(self):
+        self.random = random.Random(20)
+
+    @staticmethod
+    def final_mark_oracle(row, max_marks, weights):
+        sat = [(mark / paper_max * 100, weight) for mark, paper_max, weight in zip(row, max_marks, weights) if mark is not None]
+        if not sat:
+            return None
+        if sum(weight for _, weight in sat) == 0:
+            return sum(percentage for percentage, _ in sat) / len(sat)
+        return sum(percentage * weight for percentage, weight in sat) / sum(weight for _, weight in sat)
+
+    def test_final_marks(self):
+        for _ in range(200):
+            papers = self.random.randint(1, 4)
+            max_marks = [self.random.choice([50, 80, 100]) for _ in range(papers)]
+            weights = [self.random.choice([0, 0, 20, 40, 60]) for _ in range(papers)]
+            rows = [
+                [self.random.choice([None, self.random.randint(0, paper_max)]) for paper_max in max_marks]
+                for _ in range(5)
+            ]
+            matrix = [[np.nan if mark is None else mark for mark in row] for row in rows]
+            result = grading_kernel.final_marks(matrix, max_marks, weights)
+            for row, value in zip(rows, result):
+                expected = self.final_mark_oracle(row, max_marks, weights)
+                if expected is None:
+                    self.assertTrue(math.isnan(value))
+                else:
+                    self.assertAlmostEqual(value, expected)
+
+    def test_subject_final_marks_pivots_by_student_and_paper(self):
+        papers = [
+            SimpleNamespace(id=7, paper_number='PP2', max_marks=80, student_contribution_marks=50),
+            SimpleNamespace(id=3, paper_number='Paper 1', max_marks=100, student_contribution_marks=50),
+        ]
+        entries = {(2, 3): 60, (2, 7): 40, (1, 7): 80}
+        student_ids, marks = grading_kernel.subject_final_marks(entries, papers)
+        self.assertEqual(student_ids, [1, 2])
+        self.assertAlmostEqual(marks[0], 100)  # sat paper 2 only
+        self.assertAlmostEqual(marks[1], (60 + 50) / 2)
+
+    def test_grade_lookup(self):
+        table = GradeTable(*zip(*KCSE_RANGES))
+
+        def oracle(mark):
+            if mark != mark or mark < 0 or mark > 100:
+                return NO_GRADE, 0
+            for low, high, grade, points in KCSE_RANGES:
+                # A fraction between two ranges takes the lower one
+                if low <= math.floor(mark) <= high:
+                    return grade, points
+
+        marks = [self.random.uniform(-5, 105) for _ in range(500)] + list(range(-1, 102)) + [64.5, 79.99, float('nan')]
+        grades, points = table.lookup(marks)
+        for mark, grade, point in zip(marks, grades, points):
+            self.assertEqual((grade, point), oracle(mark), mark)
+            self.assertEqual(table.grade_and_points(mark), oracle(mark), mark)
+
+    def test_empty_table(self):
+        grades, points = grading_kernel.EMPTY_GRADE_TABLE.lookup([50])
+        self.assertEqual((list(grades), list(points)), ([NO_GRADE], [0]))
+        self.assertEqual(grading_kernel.EMPTY_GRADE_TABLE.grade_and_points(50), (NO_GRADE, 0))
+
+
+class GradingVersionTests(TestCase):
+    """Grade tables cached in one process are reloaded once another process changes the grading."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.school = School.objects.create(name='Grading School')
+        form = FormLevel.objects.create(school=cls.school, number=1)
+        cls.exam = Exam.objects.create(school=cls.school, name='Opener', form_level=1, year=2026, term=1)
+        cls.system = GradingSystem.objects.create(school=cls.school, name='Pass/Fail', is_default=True)
+        cls.pass_range = GradingRange.objects.create(grading_system=cls.system, min_marks=50, max_marks=100, grade='P', points=2)
+        GradingRange.objects.create(grading_system=cls.system, min_marks=0, max_marks=49, grade='F', points=1)
+        subject = Subject.objects.create(school=cls.school, name='Mathematics', code='MAT')
+        paper = SubjectPaper.objects.create(subject=subject, paper_number='1', max_marks=100)
+        student = Student.objects.create(school=cls.school, name='Student', admission_number='G1', form_level=form)
+        PaperResult.objects.create(exam=cls.exam, student=student, subject_paper=paper, marks=60)
+
+    def setUp(self):
+        grading_cache.clear()
+
+    def tearDown(self):
+        grading_cache.clear()
+
+    def version(self):
+        return School.objects.get(pk=self.school.pk).grading_version
+
+    def test_grading_changes_bump_the_version(self):
+        version = self.version()
+        self.pass_range.grade = 'S'
+        self.pass_range.save()
+        self.assertEqual(self.version(), version + 1)
+        self.system.delete()
+        self.assertGreater(self.version(), version + 1)
+
+    def test_stale_process_reloads(self):
+        self.assertEqual(grading_cache.default_grade_table(self.school.id).grade_and_points(60), ('P', 2))
+        # Another process changes the grading: no signals reach this one's cache, only the version
+        GradingRange.objects.filter(pk=self.pass_range.pk).update(grade='S', points=3)
+        grading_cache.bump(self.school.id)
+
+        BulkSummaryEngine(Exam.objects.get(pk=self.exam.pk)).run()
+        self.assertEqual(list(ExamResult.objects.filter(exam=self.exam).values_list('grade', 'points')), [('S', 3)])
+
+    def test_school_save_keeps_the_version(self):
+        stale = School.objects.get(pk=self.school.pk)
+        grading_cache.bump(self.school.id)
+        stale.name = 'Renamed School'
+        stale.save()
+        self.assertEqual(self.version(), stale.grading_version + 1)
+
+
+def competition_positions(summaries):
+    """{student_id: (stream_position, overall_position)} recomputed from scratch, as the bulk engine ranks."""
+    def position(summary, cohort):
+        return 1 + sum((other.best_of_seven_marks or 0) > (summary.best_of_seven_marks or 0) for other in cohort)
+
+    return {
+        summary.student_id: (
+            position(summary, [o for o in summaries if o.student.stream == summary.student.stream and o is not summary]),
+            position(summary, [o for o in summaries if o is not summary]),
+        )
+        for summary in summaries
+    }
+
+
+class IncrementalPositionTests(TestCase):
+    """Positions shifted by IncrementalSummaryUpdater against a full recompute after every mark change."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.school = School.objects.create(name='Ranking School')
+        form = FormLevel.objects.create(school=cls.school, number=1)
+        cls.exam = Exam.objects.create(school=cls.school, name='Mid Term', form_level=1, year=2026, term=2)
+        cls.papers = []
+        for code in ('MAT', 'ENG', 'KIS'):
+            subject = Subject.objects.create(school=cls.school, name=code, code=code)
+            cls.papers.append(SubjectPaper.objects.create(subject=subject, paper_number='PP1', max_marks=100))
+        cls.students = [
+            Student.objects.create(
+                school=cls.school, name=f'Student {n}', admission_number=f'R{n}', form_level=form, stream='EW'[n % 2]
+            )
+            for n in range(8)
+        ]
+
+    def assert_positions_match_recompute(self):
+        summaries = list(StudentExamSummary.objects.filter(exam=self.exam).select_related('student'))
+        expected = competition_positions(summaries)
+        actual = {summary.student_id: (summary.stream_position, summary.overall_position) for summary in summaries}
+        self.assertEqual(actual, expected)
+
+    def test_random_mark_changes(self):
+        generator = random.Random(4)
+        for _ in range(120):
+            student = generator.choice(self.students)
+            paper = generator.choice(self.papers)
+            existing = PaperResult.objects.filter(exam=self.exam, student=student, subject_paper=paper).first()
+            if existing is not None and generator.random() < 0.2:
+                existing.delete()
+            elif existing is not None:
+                # Ties are common with a narrow range, which exercises the window edges
+                existing.marks = generator.choice([40, 50, 60, 70])
+                existing.save()
+            else:
+                PaperResult.objects.create(
+                    exam=self.exam, student=student, subject_paper=paper, marks=generator.choice([40, 50, 60, 70])
+                )
+            self.assert_positions_match_recompute()
+
+    def test_student_without_form(self):
+        formless = Student.objects.create(school=self.school, name='No Form', admission_number='R-none', stream='E')
+        PaperResult.objects.create(exam=self.exam, student=self.students[0], subject_paper=self.papers[0], marks=60)
+        PaperResult.objects.create(exam=self.exam, student=formless, subject_paper=self.papers[0], marks=50)
+        BulkSummaryEngine(self.exam).run()
+        self.assertEqual(
+            set(ExamSubjectStats.objects.filter(exam=self.exam).values_list('form_level__number', 'stream', 'student_count')),
+            {(1, '', 1), (1, 'E', 1)},
+        )
+
+    def stats_rows(self):
+        return sorted(ExamSubjectStats.objects.filter(exam=self.exam).values_list(
+            'form_level_id', 'stream', 'subject_id', 'student_count', 'total_marks', 'min_marks', 'max_marks', 'std_dev', 'mean_grade'
+        ))
+
+    def test_stats_refreshed_once_per_commit(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                for student in self.students:
+                    for paper in self.papers[:2]:
+                        PaperResult.objects.create(exam=self.exam, student=student, subject_paper=paper, marks=40 + student.pk % 7)
+            self.assertFalse(ExamSubjectStats.objects.filter(exam=self.exam).exists())
+        self.assertEqual(sum('refresh_on_commit' in callback.__qualname__ for callback in callbacks), 1)
+
+        incremental = self.stats_rows()
+        analytics.refresh_subject_stats(self.exam.id, self.school.id)
+        self.assertEqual(incremental, self.stats_rows())
+        self.assertEqual(len(incremental), 2 * 3)  # two subjects, for the form and each stream
+
+    def test_rank_index_follows_mark_changes(self):
+        rank_index.clear()
+        generator = random.Random(6)
+        for _ in range(40):
+            with self.captureOnCommitCallbacks(execute=True):
+                PaperResult.objects.update_or_create(
+                    exam=self.exam, student=generator.choice(self.students), subject_paper=generator.choice(self.papers),
+                    defaults={'marks': generator.choice([40, 50, 60])},
+                )
+            exam = Exam.objects.get(pk=self.exam.pk)
+            indexes = rank_index.exam_indexes(exam)
+            summaries = list(StudentExamSummary.objects.filter(exam=self.exam).select_related('student'))
+            self.assertEqual(
+                {summary.student_id: indexes.positions(summary.student_id) for summary in summaries},
+                competition_positions(summaries),
+            )
+        rank_index.clear()
+
+    def test_results_version_bumped_once_per_commit(self):
+        version = self.exam.results_version
+        with self.captureOnCommitCallbacks(execute=True):
+            PaperResult.objects.create(exam=self.exam, student=self.students[0], subject_paper=self.papers[0], marks=50)
+        self.exam.refresh_from_db()
+        self.assertEqual(self.exam.results_version, version + 1)
+
+        writer = PaperResultWriter(self.exam)
+        for student in self.students:
+            for paper in self.papers:
+                writer.add(student, paper, 55)
+        with self.captureOnCommitCallbacks(execute=True):
+            writer.flush()
+        self.exam.refresh_from_db()
+        self.assertEqual(self.exam.results_version, version + 2)
+        self.assert_positions_match_recompute()
+
+    def flush_queries(self, students, marks):
+        writer = PaperResultWriter(self.exam)
+        for student in students:
+            for paper in self.papers:
+                writer.add(student, paper, marks)
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            writer.flush()
+        return len(queries)
+
+    def test_writer_queries_do_not_grow_with_students(self):
+        rank_index.clear()
+        rank_index.exam_indexes(Exam.objects.get(pk=self.exam.pk))
+        self.assertEqual(self.flush_queries(self.students[:2], 45), self.flush_queries(self.students, 65))
+
+        summaries = list(StudentExamSummary.objects.filter(exam=self.exam).select_related('student'))
+        indexes = rank_index.exam_indexes(Exam.objects.get(pk=self.exam.pk))
+        self.assertEqual(
+            {summary.student_id: indexes.positions(summary.student_id) for summary in summaries},
+            competition_positions(summaries),
+        )
+        incremental = self.stats_rows()
+        analytics.refresh_subject_stats(self.exam.id, self.school.id)
+        self.assertEqual(incremental, self.stats_rows())
+        rank_index.clear()
+
+    def test_exam_save_keeps_results_version(self):
+        stale = Exam.objects.get(pk=self.exam.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            rank_index.touch_exam(self.exam.pk)
+        stale.name = 'Renamed'
+        stale.save()
+        self.exam.refresh_from_db()
+        self.assertEqual((self.exam.name, self.exam.results_version), ('Renamed', stale.results_version + 1))
+
+
+class RankIndexTests(SimpleTestCase):
+    """The Fenwick tree index against sorting every member's score."""
+
+    def assert_matches_oracle(self, index, scores):
+        ordered = sorted(scores.values(), reverse=True)
+        self.assertEqual(len(index), len(scores))
+        for member, score in scores.items():
+            self.assertEqual(index.position_of(member), 1 + sum(other > score for other in ordered))
+        for k in range(1, len(ordered) + 1):
+            self.assertEqual(index.kth_largest(k), ordered[k - 1])
+        self.assertIsNone(index.kth_largest(len(ordered) + 1))
+        for probe in (-1, 0, 0.5, 99.9, 250, 10 ** 4):
+            self.assertEqual(index.count_above(probe), sum(other > probe for other in ordered))
+
+        # top(n) includes every member tied at the n-th position
+        for n in (1, 3, len(scores)):
+            expected = sorted(
+                ((member, score, 1 + sum(other > score for other in ordered)) for member, score in scores.items()),
+                key=lambda row: (-row[1], str(row[0])),
+            )
+            if n < len(expected):
+                expected = [row for row in expected if row[2] <= expected[n - 1][2]]
+            self.assertEqual(index.top(n), expected)
+
+    def test_random_updates(self):
+        generator = random.Random(5)
+        index = RankIndex(max_score=100)
+        scores = {}
+        for step in range(400):
+            member = generator.randrange(40)
+            if member in scores and generator.random() < 0.25:
+                index.remove(member)
+                del scores[member]
+            else:
+                # Mostly small scores, so members tie; occasionally large ones, so the tree grows
+                score = generator.choice([generator.randrange(20), generator.randrange(700)])
+                index.insert(member, score)
+                scores[member] = score
+            if step % 20 == 0:
+                self.assert_matches_oracle(index, scores)
+        self.assert_matches_oracle(index, scores)
+
+    def test_position_excluding_own_score(self):
+        index = RankIndex()
+        for member, score in {'a': 90, 'b': 80, 'c': 70}.items():
+            index.insert(member, score)
+        # c moving up to 85 would pass b but not a
+        self.assertEqual(index.position(85, exclude='c'), 2)
+        # a dropping to 75 falls behind b; its own 90 no longer counts
+        self.assertEqual(index.position(75, exclude='a'), 2)
+        self.assertEqual(index.position(75), 3)
+
+
+class MeritListPageTests(TestCase):
+    """Keyset pages, followed cursor to cursor, against one fully ordered list."""
+
+    @classmethod
+    def setUpTestData(cls):
+        school = School.objects.create(name='Merit School')
+        cls.form = FormLevel.objects.create(school=school, number=3)
+        other_form = FormLevel.objects.create(school=school, number=4)
+        cls.exam = Exam.objects.create(school=school, name='End Term', form_level=3, year=2026, term=3)
+        cls.subject = Subject.objects.create(school=school, name='Biology', code='BIO')
+        generator = random.Random(7)
+        students = [
+            Student.objects.create(
+                school=school, name=f'Student {n}', admission_number=f'M{n}',
+                form_level=other_form if n % 9 == 0 else cls.form, stream='EW'[n % 2],
+            )
+            for n in range(37)
+        ]
+        # Narrow ranges so positions and marks tie across page boundaries
+        StudentExamSummary.objects.bulk_create(
+            StudentExamSummary(
+                exam=cls.exam, student=student, total_marks=0, mean_marks=0, mean_grade='', total_points=0,
+                stream_position=1, overall_position=generator.randrange(1, 12),
+            )
+            for student in students
+        )
+        ExamResult.objects.bulk_create(
+            ExamResult(exam=cls.exam, student=student, subject=cls.subject, final_marks=generator.choice([45, 50, 55, 60]))
+            for student in students if student.pk % 5
+        )
+
+    def follow(self, **options):
+        rows, after = [], None
+        while True:
+            page = MeritListPage(self.exam, self.form.id, limit=4, after=after, **options).fetch()
+            self.assertLessEqual(len(page['results']), 4)
+            rows += [row['student_id'] for row in page['results']]
+            after = page['next']
+            if after is None:
+                return rows
+
+    def scope(self, queryset, stream=None):
+        queryset = queryset.filter(exam=self.exam, student__form_level=self.form)
+        return queryset.filter(student__stream=stream) if stream else queryset
+
+    def test_position_pages(self):
+        for stream in (None, 'E'):
+            with self.subTest(stream=stream):
+                summaries = self.scope(StudentExamSummary.objects.all(), stream)
+                expected = [s.student_id for s in sorted(summaries, key=lambda s: (s.overall_position, s.student_id))]
+                self.assertEqual(self.follow(stream=stream), expected)
+
+    def test_subject_pages(self):
+        results = list(self.scope(ExamResult.objects.filter(subject=self.subject)))
+        for order, sign in (('desc', -1), ('asc', 1)):
+            with self.subTest(order=order):
+                expected = [r.student_id for r in sorted(results, key=lambda r: (sign * r.final_marks, r.student_id))]
+                self.assertEqual(self.follow(sort=f'subject:{self.subject.id}', order=order), expected)
+
+
+class DepartmentReadTests(SimpleTestCase):
+    """Department figures merged across exams against the pooled marks of those exams."""
+
+    def rollup(self, exam_id, marks):
+        marks = np.asarray(marks, dtype=float)
+        deviations = [[n, 1, int(mark), round(float(mark - marks.mean()), 2)] for n, mark in enumerate(marks)]
+        return SimpleNamespace(
+            exam_id=exam_id, result_count=len(marks), total_marks=int(marks.sum()), std_dev=round(float(marks.std()), 2),
+            deviations=sorted(deviations, key=lambda deviation: -abs(deviation[3]))[:analytics.TOP_DEVIATIONS],
+        )
+
+    def test_spread_and_deviations(self):
+        generator = np.random.default_rng(3)
+        exams = {exam_id: generator.integers(20, 95, size=size) for exam_id, size in ((1, 40), (2, 7), (3, 25))}
+        rollups = [self.rollup(exam_id, marks) for exam_id, marks in exams.items()]
+        pooled = np.concatenate(list(exams.values())).astype(float)
+
+        mean, std_dev = analytics.department_spread(rollups)
+        self.assertAlmostEqual(mean, pooled.mean())
+        self.assertAlmostEqual(std_dev, pooled.std(), delta=0.01)
+
+        expected = sorted(
+            (abs(mark - marks.mean()), exam_id) for exam_id, marks in exams.items() for mark in marks.astype(float)
+        )[::-1][:5]
+        deviations = analytics.department_deviations(rollups, 5)
+        self.assertEqual([round(abs(deviation[4]), 2) for deviation in deviations], [round(dev, 2) for dev, _ in expected])
+
+    def test_no_results(self):
+        self.assertEqual(analytics.department_spread([]), (0, 0))
+        self.assertEqual(analytics.department_deviations([], 5), [])
@@ -21,8 +21,11 @@ urlpatterns = [
     path('<int:pk>/results/', views.exam_results_upload_choice, name='exam_results_upload_choice'),
     path('<int:pk>/results/download-template/', views.download_exam_results_template, name='download_exam_results_template'),
     path('<int:pk>/results/upload/', views.upload_results, name='upload_results'),
+    path('<int:pk>/results/upload/errors/<uuid:token>/', views.download_upload_errors, name='download_upload_errors'),
     path('<int:pk>/results/summary/', views.exam_results_summary, name='exam_results_summary'),
     path('<int:exam_pk>/subject/<int:subject_pk>/results/', views.subject_results, name='subject_results'),
+    path('<int:exam_pk>/subject/<int:subject_pk>/spreadsheet/', views.subject_spreadsheet, name='subject_spreadsheet'),
+    path('<int:exam_pk>/subject/<int:subject_pk>/paper/<int:paper_pk>/spreadsheet/', views.subject_spreadsheet, name='paper_spreadsheet'),
     path('<int:exam_pk>/stream/<int:form_level>/<str:stream>/results/', views.stream_results, name='stream_results'),
     path('<int:pk>/results/entry/', views.exam_results_entry, name='exam_results_entry'),
     # Grading System URLs
@@ -1,8 +1,13 @@
 # exams/utilities.py
+from collections import defaultdict
+
 from django.db.models import Sum, F, ExpressionWrapper, DecimalField, Avg
-from decimal import Decimal
 from students.models import Student
+from subjects.models import SubjectPaperRatio
 from .models import Exam, ExamResult, GradingSystem, SubjectCategory, GradingRange, PaperResult
+from .grading_kernel import subject_final_marks
+from . import grading_cache
+from .rank_index import RankIndex
 
 class ExamResultsService:
     @staticmethod
@@ -12,75 +17,63 @@ class ExamResultsService:
         Returns a dictionary of student summaries.
         """
         exam = Exam.objects.get(pk=exam_id)
-        students = Student.objects.filter(form_level=exam.form_level, school=exam.school).order_by('stream', 'name')
+        grading_cache.sync(exam.school_id)
+        students = list(
+            Student.objects.filter(form_level__number=exam.form_level, school=exam.school).order_by('stream', 'name')
+        )
 
-        student_data = {}
-        all_subjects = {}
+        # Load every paper result for the exam at once and group it by subject
+        paper_results = PaperResult.objects.filter(
+            exam=exam,
+            student__in=students
+        ).select_related('subject_paper', 'subject_paper__subject')
+
+        subjects = {}
+        papers_by_subject = defaultdict(dict)
+        marks_by_subject = defaultdict(dict)
+        for paper_result in paper_results:
+            subject = paper_result.subject_paper.subject
+            subjects[subject.id] = subject
+            papers_by_subject[subject.id][paper_result.subject_paper_id] = paper_result.subject_paper
+            marks_by_subject[subject.id][(paper_result.student_id, paper_result.subject_paper_id)] = paper_result.marks
+
+        ratios = {
+            ratio.subject_id: ratio
+            for ratio in SubjectPaperRatio.objects.filter(subject_id__in=list(subjects))
+        }
+        # Step 1 and 2: Combine papers into subject marks and grade them, one subject at a time
+        subject_results = defaultdict(dict)
+        for subject_id, subject in subjects.items():
+            student_ids, subject_marks = subject_final_marks(
+                marks_by_subject[subject_id],
+                papers_by_subject[subject_id].values(),
+                ratios.get(subject_id)
+            )
+
+            grade_table = grading_cache.grade_table_for(exam.school_id, subject.category_id)
+            grades, points = grade_table.lookup(subject_marks)
+
+            for student_id, marks, grade, student_points in zip(student_ids, subject_marks, grades, points):
+                subject_results[student_id][subject.name] = (marks, grade, student_points)
 
+        student_data = {}
         for student in students:
-            # Prefetch PaperResults to minimize queries
-            paper_results = PaperResult.objects.filter(
-                exam=exam,
-                student=student
-            ).select_related('subject_paper', 'subject_paper__subject')
-
-            subject_marks = {}
-            total_exam_marks = Decimal(0)
-            total_points = Decimal(0)
+            total_exam_marks = 0.0
+            total_points = 0
             subject_count = 0
+            subject_grades = {}
+
+            for subject_name, (marks, grade, points) in subject_results[student.id].items():
+                if grade is None or grade == 'N/A':
+                    # Fallback if no grading system found
+                    subject_grades[subject_name] = 'N/A'
+                    continue
+                subject_grades[subject_name] = grade
+                total_points += int(points)
+                total_exam_marks += float(marks)
+                subject_count += 1
 
-            # Step 1: Aggregate paper marks into subjects and calculate total marks/points
-            for paper_result in paper_results:
-                subject_name = paper_result.subject_paper.subject.name
-                all_subjects[subject_name] = True
-                
-                # Check if we have a valid max_marks and contribution for the subject
-                # This prevents division by zero if data is missing
-                if paper_result.subject_paper.max_marks > 0 and paper_result.subject_paper.student_contribution_marks > 0:
-                    contribution_marks = (paper_result.marks / paper_result.subject_paper.max_marks) * paper_result.subject_paper.student_contribution_marks
-                else:
-                    contribution_marks = 0
-
-                if subject_name not in subject_marks:
-                    subject_marks[subject_name] = {
-                        'total_marks': Decimal(0),
-                        'total_contribution': Decimal(0),
-                        'grade': None,
-                        'points': None
-                    }
-
-                subject_marks[subject_name]['total_marks'] += contribution_marks
-                subject_marks[subject_name]['total_contribution'] += paper_result.subject_paper.student_contribution_marks
-
-            # Step 2: Calculate subject grades and points
-            for subject_name, data in subject_marks.items():
-                if data['total_contribution'] > 0:
-                    final_subject_marks = data['total_marks'] / (data['total_contribution'] / 100)
-                    
-                    # Find the grading system for the subject and get the grade/points
-                    try:
-                        subject = all_subjects.get(subject_name)
-                        category = subject.category
-                        grading_system = GradingSystem.objects.get(
-                            is_active=True,
-                            subject_category=category
-                        )
-                        grading_range = GradingRange.objects.get(
-                            grading_system=grading_system,
-                            min_marks__lte=final_subject_marks,
-                            max_marks__gte=final_subject_marks
-                        )
-                        data['grade'] = grading_range.grade
-                        data['points'] = grading_range.points
-                        total_points += grading_range.points
-                        total_exam_marks += final_subject_marks
-                        subject_count += 1
-                    except (GradingSystem.DoesNotExist, GradingRange.DoesNotExist):
-                        # Fallback if no grading system found
-                        data['grade'] = 'N/A'
-                        data['points'] = 0
-
-            mean_marks = total_exam_marks / subject_count if subject_count > 0 else Decimal(0)
+            mean_marks = total_exam_marks / subject_count if subject_count > 0 else 0.0
             mean_grade = ExamResultsService.calculate_mean_grade_from_points(total_points, subject_count)
 
             student_data[student.admission_number] = {
@@ -92,11 +85,11 @@ class ExamResultsService:
                 'total_points': total_points,
                 'mean_grade': mean_grade,
                 'num_subjects': subject_count,
-                'subject_marks': { k: v['grade'] for k, v in subject_marks.items() },
+                'subject_marks': subject_grades,
             }
-        
+
         return student_data
-    
+
     @staticmethod
     def calculate_mean_grade_from_points(total_points, num_subjects):
         """Calculates the mean grade based on total points and number of subjects."""
@@ -121,20 +114,16 @@ class ExamResultsService:
         Calculates stream and overall positions based on total points.
         Returns the updated student_data dictionary.
         """
-        # Overall position
-        sorted_overall = sorted(student_data.values(), key=lambda x: x['total_points'], reverse=True)
-        for i, student in enumerate(sorted_overall, 1):
-            student['class_position'] = f"{i}/{len(sorted_overall)}"
-
-        # Stream position
-        streams = {}
-        for student in sorted_overall:
-            if student['stream'] not in streams:
-                streams[student['stream']] = []
-            streams[student['stream']].append(student)
-
-        for stream, students in streams.items():
-            for i, student in enumerate(students, 1):
-                student['stream_position'] = f"{i}/{len(students)}"
+        overall = RankIndex()
+        streams = defaultdict(RankIndex)
+        for admission_no, student in student_data.items():
+            overall.insert(admission_no, student['total_points'])
+            streams[student['stream']].insert(admission_no, student['total_points'])
+
+        # Tied students share a position
+        for admission_no, student in student_data.items():
+            stream = streams[student['stream']]
+            student['class_position'] = f"{overall.position_of(admission_no)}/{len(overall)}"
+            student['stream_position'] = f"{stream.position_of(admission_no)}/{len(stream)}"
 
         return student_data
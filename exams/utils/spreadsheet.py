@@ -1,21 +1,90 @@
 # exams/utils/spreadsheet.py
+"""
+Mark entry spreadsheets: template download, upload validation and import.
+
+Templates are written with a write-only (streaming) openpyxl workbook.
+Rows go straight to the output as students are read from the database, so
+memory does not grow with the class size. Styles are named styles
+registered once per workbook and applied per column rather than per cell,
+and each paper sheet gets one data validation per entry column.
+
+Uploads are validated and imported with column operations: each sheet is
+joined against one frame of the school's students rather than looking
+students up row by row. Marks only go to the papers the upload was made
+for; a sheet whose metadata names another exam, subject or paper is
+rejected.
+"""
+from functools import reduce
+from operator import or_
+
 import pandas as pd
+from django.db.models import Exists, OuterRef
 from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Font, Border, Side, Alignment, Protection
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Protection, Side
 from openpyxl.utils import get_column_letter
-from io import BytesIO
-from django.http import HttpResponse
-from students.models import Student, StudentSubjectEnrollment
-from exams.models import Exam, PaperResult, SubjectPaper
+from openpyxl.worksheet.datavalidation import DataValidation
+
+from students.models import Student
+from exams.models import PaperResult
+from subjects.models import SubjectPaper
+from exams.bulk_writes import upsert
+
+TEMPLATE_VERSION = '1.1'
+SHEET_PASSWORD = 'examsheet'
+STATUSES = ('P', 'A', 'D')
+STUDENTS_CHUNK = 500
+
+# (column name, width); upload headers are matched on the name, so the
+# template may add a note in brackets, e.g. 'Marks (out of 100)'
+COLUMNS = [
+    ('Admission Number', 15),
+    ('Student Name', 30),
+    ('Stream', 10),
+    ('Marks', 15),
+    ('Status', 10),
+    ('Entry Date', 15),
+    ('Comments', 30),
+]
+LOCKED_COLUMNS = 3
+
+# Raw marks band edges of the grades counted in the processing summary
+GRADES = ['A', 'B', 'C', 'D', 'E']
+GRADE_BANDS = [float('-inf'), 40, 50, 65, 80, float('inf')]
+
+
+def _template_styles():
+    """Named styles of a template; they are bound to one workbook, so build them per template."""
+    thin = Side(style='thin')
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    return [
+        NamedStyle(
+            'template_header',
+            font=Font(bold=True),
+            fill=PatternFill(start_color="CCE5FF", end_color="CCE5FF", fill_type="solid"),
+            border=border,
+            alignment=Alignment(horizontal='center'),
+        ),
+        NamedStyle(
+            'template_locked',
+            fill=PatternFill(start_color="F2F2F2", end_color="F2F2F2", fill_type="solid"),
+            border=border,
+        ),
+        NamedStyle('template_entry', border=border, protection=Protection(locked=False)),
+    ]
+
+
+def column_name(header):
+    """'Marks (out of 100)' -> 'Marks'."""
+    return str(header).split(' (')[0].strip()
+
 
 class SpreadsheetTemplate:
-    def __init__(self, exam, subject, papers=None):
+    def __init__(self, exam, subject, papers=None, job=None):
         self.exam = exam
+        self.job = job
         self.subject = subject
         self.papers = papers if isinstance(papers, list) else ([papers] if papers else [])
-        self.wb = Workbook()
-        self.summary_sheet = self.wb.active
-        self.summary_sheet.title = 'Summary'
         self.validation_errors = []
         self.processing_progress = {
             'total': 0,
@@ -23,118 +92,121 @@ class SpreadsheetTemplate:
             'success': 0,
             'errors': 0
         }
-        
-        # Define styles
-        self.header_fill = PatternFill(start_color="CCE5FF", end_color="CCE5FF", fill_type="solid")
-        self.locked_fill = PatternFill(start_color="F2F2F2", end_color="F2F2F2", fill_type="solid")
-        self.border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-    
+
     def generate_template(self):
-        """Generate a multi-sheet workbook with papers and summary"""
-        # Get eligible students
-        self.students = Student.objects.filter(
-            form_level__in=self.exam.participating_forms.all(),
-            studentsubjectenrollment__subject=self.subject,
-            studentsubjectenrollment__is_enrolled=True
-        ).exclude(
-            paperresult__exam=self.exam,
-            paperresult__subject=self.subject
-        ).order_by('admission_number')
+        """
+        Build the template workbook: a Summary sheet followed by one entry
+        sheet per paper (or a single Direct Entry sheet). The workbook is
+        write-only; save it once, e.g. workbook.save(response).
+        """
+        self.wb = Workbook(write_only=True)
+        self._named_styles = {style.name: style for style in _template_styles()}
+        for style in self._named_styles.values():
+            self.wb.add_named_style(style)
 
-        # Create paper sheets
-        if self.papers:
-            for paper in self.papers:
-                self._create_paper_sheet(paper)
-        else:
-            # Create single sheet for direct entry
-            self._create_paper_sheet(None)
-            
-        # Create summary sheet
-        self._create_summary_sheet()
-        
+        self._create_summary_sheet(self._students().count())
+        for paper in self.papers or [None]:
+            self._create_paper_sheet(paper)
         return self.wb
-        
+
+    def _students(self):
+        """Students enrolled in the subject who still miss a result for one of the template's papers."""
+        forms = list(self.exam.participating_forms.values_list('id', flat=True))
+        # Without participating forms the exam's form_level is a form number, not a FormLevel id
+        in_forms = {'form_level_id__in': forms} if forms else {'form_level__number': self.exam.form_level}
+        entered = PaperResult.objects.filter(
+            exam=self.exam,
+            student=OuterRef('pk'),
+            subject_paper__subject=self.subject
+        )
+        missing = [~Exists(entered.filter(subject_paper=paper)) for paper in self.papers] or [~Exists(entered)]
+        return Student.objects.filter(
+            reduce(or_, missing),
+            school_id=self.exam.school_id,
+            **in_forms,
+            subjects=self.subject
+        ).order_by('admission_number')
+
     def _create_paper_sheet(self, paper):
-        """Create a worksheet for a specific paper or direct entry"""
-        sheet_name = paper.name if paper else "Direct Entry"
-        ws = self.wb.create_sheet(sheet_name)
-        
-        # Set up protection
+        """Stream a worksheet for a specific paper or direct entry"""
+        max_marks = paper.max_marks if paper else 100
+        ws = self.wb.create_sheet(f"Paper {paper.paper_number}" if paper else "Direct Entry")
         ws.protection.sheet = True
-        ws.protection.password = 'examsheet'
-        
-        # Add metadata
+        ws.protection.password = SHEET_PASSWORD
+        for index, (_, width) in enumerate(COLUMNS):
+            # Student rows are written as plain values and take their column's
+            # style; styling every cell would double the generation time
+            style = self._named_styles['template_locked' if index < LOCKED_COLUMNS else 'template_entry']
+            column = ws.column_dimensions[get_column_letter(index + 1)]
+            column.width = width
+            column.fill = style.fill
+            column.border = style.border
+            column.protection = style.protection
+
+        # Hidden metadata read back during upload
         ws.row_dimensions[1].hidden = True
-        self._add_metadata(ws, paper)
-        
-        # Add headers
-        headers = ['Admission Number', 'Student Name', 'Stream']
-        if paper:
-            headers.append(f'Marks (out of {paper.max_marks})')
-        else:
-            headers.append('Marks (out of 100)')
-        headers.append('Status (P/A/D)')
-        headers.extend(['Entry Date', 'Comments'])
-        
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=2, column=col)
-            cell.value = header
-            cell.fill = self.header_fill
-            cell.font = Font(bold=True)
-            cell.border = self.border
-            cell.alignment = Alignment(horizontal='center')
-            
-        # Add student data
-        for row, student in enumerate(self.students, 3):
-            self._add_student_row(ws, row, student, paper)
-            
-        # Set column widths
-        column_widths = {
-            'A': 15,  # Admission Number
-            'B': 30,  # Name
-            'C': 10,  # Stream
-            'D': 15,  # Marks
-            'E': 10,  # Status
-            'F': 15,  # Entry Date
-            'G': 30,  # Comments
+        ws.append(self._metadata(paper))
+
+        headers = [name for name, _ in COLUMNS]
+        headers[3] = f'Marks (out of {max_marks})'
+        headers[4] = 'Status (P/A/D)'
+        ws.append([self._cell(ws, header, 'template_header') for header in headers])
+
+        rows = 0
+        students = self._students().values_list('admission_number', 'name', 'stream')
+        for admission_number, name, stream in students.iterator(chunk_size=STUDENTS_CHUNK):
+            ws.append((admission_number, name, stream or ''))
+            rows += 1
+
+        if rows:
+            last = rows + 2
+            marks = DataValidation(
+                type='whole', operator='between', formula1='0', formula2=str(max_marks),
+                allow_blank=True, showErrorMessage=True,
+                errorTitle='Marks', error=f'Marks must be a whole number from 0 to {max_marks}',
+            )
+            marks.add(f'D3:D{last}')
+            status = DataValidation(
+                type='list', formula1=f'"{",".join(STATUSES)}"',
+                allow_blank=True, showInputMessage=True, showErrorMessage=True,
+                promptTitle='Status', prompt='P=Present, A=Absent, D=Disqualified',
+            )
+            status.add(f'E3:E{last}')
+            ws.data_validations.append(marks)
+            ws.data_validations.append(status)
+
+    def _cell(self, ws, value, style):
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = style
+        return cell
+
+    def _metadata(self, paper):
+        """Cells of the hidden first row, 'key:value' each"""
+        metadata = {
+            'exam_id': self.exam.id,
+            'subject_id': self.subject.id,
+            'paper_id': paper.id if paper else '',
+            'max_marks': paper.max_marks if paper else 100,
+            'template_version': TEMPLATE_VERSION
         }
-        
-        for col, width in column_widths.items():
-            ws.column_dimensions[col].width = width
-            
-    def _create_summary_sheet(self):
+        return [f"{key}:{value}" for key, value in metadata.items()]
+
+    def _create_summary_sheet(self, students):
         """Create a summary sheet with statistics and validation status"""
-        ws = self.summary_sheet
-        
-        # Add exam and subject info
-        ws['A1'] = 'Exam:'
-        ws['B1'] = self.exam.name
-        ws['A2'] = 'Subject:'
-        ws['B2'] = self.subject.name
-        
-        # Add paper summary
-        ws['A4'] = 'Papers Summary:'
+        ws = self.wb.create_sheet('Summary')
+        ws.column_dimensions['A'].width = 30
+
+        ws.append(['Exam:', self.exam.name])
+        ws.append(['Subject:', self.subject.name])
+        ws.append([])
+        ws.append(['Papers Summary:'])
         headers = ['Paper', 'Max Marks', 'Students', 'Entries', 'Missing', 'Invalid']
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=5, column=col)
-            cell.value = header
-            cell.fill = self.header_fill
-            cell.font = Font(bold=True)
-            
-        row = 6
+        ws.append([self._cell(ws, header, 'template_header') for header in headers])
         for paper in self.papers:
-            ws.cell(row=row, column=1, value=paper.name)
-            ws.cell(row=row, column=2, value=paper.max_marks)
-            ws.cell(row=row, column=3, value=len(self.students))
-            row += 1
-            
-        # Add validation section
-        ws['A10'] = 'Validation Rules:'
+            ws.append([f"Paper {paper.paper_number}", paper.max_marks, students])
+
+        ws.append([])
+        ws.append(['Validation Rules:'])
         rules = [
             'All student information must remain unchanged',
             'Marks must be within allowed range for each paper',
@@ -142,90 +214,58 @@ class SpreadsheetTemplate:
             'Present students must have valid marks',
             'Absent/Disqualified students should not have marks'
         ]
-        
-        for i, rule in enumerate(rules, 11):
-            ws[f'A{i}'] = f'• {rule}'
-        
-        # Add student data
-        for row, student in enumerate(students, 3):
-            # Locked cells
-            self.ws.cell(row=row, column=1, value=student.admission_number).protection = Protection(locked=True)
-            self.ws.cell(row=row, column=2, value=student.name).protection = Protection(locked=True)
-            self.ws.cell(row=row, column=3, value=student.stream).protection = Protection(locked=True)
-            
-            # Mark entry cell
-            marks_cell = self.ws.cell(row=row, column=4)
-            marks_cell.protection = Protection(locked=False)
-            
-            # Status cell with data validation
-            status_cell = self.ws.cell(row=row, column=5)
-            status_cell.protection = Protection(locked=False)
-            
-            # Apply styles
-            for col in range(1, 6):
-                cell = self.ws.cell(row=row, column=col)
-                cell.border = self.border
-                if col < 4:  # Locked cells
-                    cell.fill = self.locked_fill
-        
-        # Add data validation for status column
-        status_range = f'E3:E{len(students) + 2}'
-        self.ws.data_validation = {
-            status_range: 'P,A,D',
-            'type': 'list',
-            'allowBlank': False,
-            'showInputMessage': True,
-            'promptTitle': 'Status',
-            'prompt': 'P=Present, A=Absent, D=Disqualified'
-        }
-        
-        # Set column widths
-        self.ws.column_dimensions['A'].width = 15  # Admission Number
-        self.ws.column_dimensions['B'].width = 30  # Name
-        self.ws.column_dimensions['C'].width = 10  # Stream
-        self.ws.column_dimensions['D'].width = 15  # Marks
-        self.ws.column_dimensions['E'].width = 10  # Status
-        
-        return self.wb
-    
-    def _add_metadata(self):
-        """Add hidden metadata for validation during upload"""
-        metadata = {
-            'exam_id': self.exam.id,
-            'subject_id': self.subject.id,
-            'paper_id': self.paper.id if self.paper else '',
-            'max_marks': self.paper.max_marks if self.paper else 100,
-            'template_version': '1.0'
+        for rule in rules:
+            ws.append([f'• {rule}'])
+
+    def _read_sheets(self, file):
+        """{sheet name: (rows, metadata)} for every entry sheet of an upload"""
+        xlsx = pd.ExcelFile(file)
+        return {
+            sheet_name: self._read_sheet(xlsx, sheet_name)
+            for sheet_name in xlsx.sheet_names
+            if sheet_name != 'Summary'
         }
-        
-        for col, (key, value) in enumerate(metadata.items(), 1):
-            cell = self.ws.cell(row=1, column=col)
-            cell.value = f"{key}:{value}"
-    
+
+    def _read_sheet(self, xlsx, sheet_name):
+        """Return the entry rows of a sheet, with bracketed header notes dropped, and its metadata"""
+        df = pd.read_excel(xlsx, sheet_name=sheet_name, header=1, dtype={'Admission Number': str})
+        df.columns = [column_name(column) for column in df.columns]
+        meta_row = pd.read_excel(xlsx, sheet_name=sheet_name, header=None, nrows=1)
+        # Rows left completely empty below the class list are not entries
+        return df.dropna(how='all'), self._parse_metadata(meta_row.iloc[0].tolist() if len(meta_row) else [])
+
+    def _parse_metadata(self, values):
+        """Parse the 'key:value' cells of the metadata row"""
+        metadata = {}
+        for value in values:
+            if isinstance(value, str) and ':' in value:
+                key, _, value = value.partition(':')
+                metadata[key] = int(value) if value.isdigit() else (value or None)
+        return metadata
+
+    def _student_frame(self):
+        """The school's students, indexed by admission number, to join uploaded rows against"""
+        students = Student.objects.filter(school_id=self.exam.school_id).values_list(
+            'admission_number', 'id', 'name', 'stream'
+        )
+        frame = pd.DataFrame.from_records(list(students), columns=['admission_number', 'student_id', 'name', 'stream'])
+        frame['stream'] = frame['stream'].fillna('')
+        return frame.set_index('admission_number')
+
+    def _match_students(self, df, students):
+        """Each row's student (student_id, name, stream), NaN where the admission number is unknown"""
+        numbers = df['Admission Number'].astype('string').str.strip()
+        matched = students.reindex(numbers)
+        matched.index = df.index
+        return numbers, matched
+
     def validate_spreadsheet(self, file):
         """Validate uploaded spreadsheet against template format with detailed checking"""
         self.validation_errors = []
         try:
-            # Read all sheets
-            xlsx = pd.ExcelFile(file)
-            sheets_data = {}
-            metadata = {}
-            
-            for sheet_name in xlsx.sheet_names:
-                if sheet_name == 'Summary':
-                    continue
-                    
-                df = pd.read_excel(xlsx, sheet_name=sheet_name, header=1)
-                sheets_data[sheet_name] = df
-                
-                # Extract metadata from hidden row
-                meta_row = pd.read_excel(xlsx, sheet_name=sheet_name, nrows=1)
-                metadata[sheet_name] = self._parse_metadata(meta_row)
-                
-            # Validate each sheet
-            for sheet_name, df in sheets_data.items():
-                self._validate_sheet(df, metadata[sheet_name], sheet_name)
-                
+            sheets = self._read_sheets(file)
+            self._validate_sheets(sheets)
+
             if self.validation_errors:
                 return False, self._format_validation_errors()
                 
@@ -233,94 +273,109 @@ class SpreadsheetTemplate:
             
         except Exception as e:
             return False, f"Error validating spreadsheet: {str(e)}"
+
+    def _validate_sheets(self, sheets):
+        """Validate every (rows, metadata) sheet against one load of the school's students"""
+        students = self._student_frame()
+        for sheet_name, (df, metadata) in sheets.items():
+            self._validate_sheet(df, metadata, sheet_name, students)
             
-    def _validate_sheet(self, df, metadata, sheet_name):
-        """Perform detailed validation on a single sheet"""
+    def _validate_sheet(self, df, metadata, sheet_name, students):
+        """
+        Perform detailed validation on a single sheet. Every check is a
+        column operation over the whole sheet; messages are only formatted
+        for failing rows, in row order and in the order of the checks.
+        """
         # Required columns check
-        required_columns = [
-            'Admission Number', 'Student Name', 'Stream',
-            'Marks', 'Status', 'Entry Date', 'Comments'
-        ]
+        required_columns = [name for name, _ in COLUMNS]
         missing_columns = [col for col in required_columns if col not in df.columns]
         if missing_columns:
             self.validation_errors.append(
                 f"Sheet '{sheet_name}' is missing columns: {', '.join(missing_columns)}"
             )
-            
-        # Student data integrity
-        for idx, row in df.iterrows():
-            self._validate_student_row(row, metadata, sheet_name, idx + 3)
-            
+            return
+        if metadata.get('exam_id') not in (None, self.exam.id):
+            self.validation_errors.append(f"Sheet '{sheet_name}' was downloaded for a different exam")
+            return
+        paper = self._sheet_paper(metadata)
+        if paper is False:
+            self.validation_errors.append(f"Sheet '{sheet_name}' was downloaded for a different subject or paper")
+            return
+
+        numbers, matched = self._match_students(df, students)
+        status = df['Status']
+        marks = df['Marks']
+        values = pd.to_numeric(marks, errors='coerce')
+        max_marks = float(paper.max_marks if paper else 100)
+        present = status.eq('P')
+        has_marks = marks.notna()
+        known = matched['student_id'].notna()
+        names = df['Student Name'].astype('string').str.strip().fillna('')
+        streams = df['Stream'].astype('string').str.strip().fillna('')
+
+        checks = [
+            (
+                status.notna() & ~status.isin(STATUSES),
+                lambda i: f"Invalid status '{status[i]}' in {sheet_name} row {i + 3}"
+            ),
+            (
+                present & ~has_marks,
+                lambda i: f"Missing marks for present student in {sheet_name} row {i + 3}"
+            ),
+            (
+                present & has_marks & ~(values.between(0, max_marks) & values.mod(1).eq(0)),
+                lambda i: f"Invalid marks '{marks[i]}' in {sheet_name} row {i + 3}"
+            ),
+            (
+                ~present & has_marks,
+                lambda i: f"Marks should not be entered for {status[i]} status in {sheet_name} row {i + 3}"
+            ),
+            (
+                known & (matched['name'].ne(names) | matched['stream'].ne(streams)),
+                lambda i: f"Student information mismatch in {sheet_name} row {i + 3}"
+            ),
+            (
+                ~known,
+                lambda i: f"Invalid admission number '{df.at[i, 'Admission Number']}' in {sheet_name} row {i + 3}"
+            ),
+        ]
+        failures = []
+        for order, (failed, message) in enumerate(checks):
+            failures.extend((i, order, message) for i in df.index[failed.to_numpy(dtype=bool)])
+        self.validation_errors.extend(message(i) for i, _, message in sorted(failures, key=lambda f: f[:2]))
+
         # Check for duplicate entries
-        duplicates = df['Admission Number'].duplicated()
+        duplicates = numbers.duplicated() & numbers.notna()
         if duplicates.any():
-            duplicate_numbers = df[duplicates]['Admission Number'].tolist()
+            duplicate_numbers = numbers[duplicates].tolist()
             self.validation_errors.append(
                 f"Sheet '{sheet_name}' has duplicate entries for: {', '.join(duplicate_numbers)}"
             )
-            
-    def _validate_student_row(self, row, metadata, sheet_name, row_num):
-        """Validate a single student row with detailed checks"""
-        # Status validation
-        if pd.notna(row['Status']) and row['Status'] not in ['P', 'A', 'D']:
-            self.validation_errors.append(
-                f"Invalid status '{row['Status']}' in {sheet_name} row {row_num}"
-            )
-            
-        # Marks validation
-        if row['Status'] == 'P':
-            if pd.isna(row['Marks']):
-                self.validation_errors.append(
-                    f"Missing marks for present student in {sheet_name} row {row_num}"
-                )
-            elif not (isinstance(row['Marks'], (int, float)) and 
-                     0 <= row['Marks'] <= float(metadata.get('max_marks', 100))):
-                self.validation_errors.append(
-                    f"Invalid marks '{row['Marks']}' in {sheet_name} row {row_num}"
-                )
-        elif pd.notna(row['Marks']):
-            self.validation_errors.append(
-                f"Marks should not be entered for {row['Status']} status in {sheet_name} row {row_num}"
-            )
-            
-        # Student existence check
-        try:
-            student = Student.objects.get(admission_number=row['Admission Number'])
-            if student.name != row['Student Name'] or student.stream != row['Stream']:
-                self.validation_errors.append(
-                    f"Student information mismatch in {sheet_name} row {row_num}"
-                )
-        except Student.DoesNotExist:
-            self.validation_errors.append(
-                f"Invalid admission number '{row['Admission Number']}' in {sheet_name} row {row_num}"
-            )
-    
+
+    def _format_validation_errors(self):
+        """One message listing every validation error"""
+        return f"{len(self.validation_errors)} validation error(s):\n" + "\n".join(self.validation_errors)
+
     def process_spreadsheet(self, file):
         """Process uploaded spreadsheet with progress tracking and summary generation"""
         try:
-            xlsx = pd.ExcelFile(file)
-            self.processing_progress['total'] = sum(
-                len(pd.read_excel(xlsx, sheet_name=name, header=1))
-                for name in xlsx.sheet_names if name != 'Summary'
-            )
-            
+            sheets = self._read_sheets(file)
+            self.processing_progress['total'] = sum(len(df) for df, _ in sheets.values())
+            self._save_progress()
+
+            students = self._student_frame()
             all_results = []
             sheet_summaries = {}
             
-            for sheet_name in xlsx.sheet_names:
-                if sheet_name == 'Summary':
-                    continue
-                    
-                df = pd.read_excel(xlsx, sheet_name=sheet_name, header=1)
-                meta_row = pd.read_excel(xlsx, sheet_name=sheet_name, nrows=1)
-                metadata = self._parse_metadata(meta_row)
-                
-                results, summary = self._process_sheet(df, metadata, sheet_name)
+            for sheet_name, (df, metadata) in sheets.items():
+                results, summary = self._process_sheet(df, metadata, sheet_name, students)
                 all_results.extend(results)
                 sheet_summaries[sheet_name] = summary
+                self.processing_progress['processed'] += len(df)
+                self._save_progress()
                 
-            # Bulk create all results
-            PaperResult.objects.bulk_create(all_results)
+            # Bulk write all results, replacing marks from an earlier upload
+            upsert(PaperResult, all_results, unique_fields=['exam', 'student', 'subject_paper'], update_fields=['marks'])
             
             # Generate final summary
             return self._generate_processing_summary(sheet_summaries)
@@ -328,61 +383,70 @@ class SpreadsheetTemplate:
         except Exception as e:
             raise Exception(f"Error processing spreadsheet: {str(e)}")
     
-    def _process_sheet(self, df, metadata, sheet_name):
-        """Process a single sheet and generate summary"""
-        results = []
+    def _process_sheet(self, df, metadata, sheet_name, students):
+        """Turn a validated sheet into PaperResults (one per present student) and a summary"""
+        paper = self._sheet_paper(metadata)
+        if paper is False:
+            raise ValueError(f"Sheet '{sheet_name}' was downloaded for a different exam, subject or paper")
+        paper_id = paper.id if paper else self._direct_entry_paper().id
+        numbers, matched = self._match_students(df, students)
+        status = df['Status']
+        marks = pd.to_numeric(df['Marks'], errors='coerce')
+        entered = status.notna() & matched['student_id'].notna()
+        present = entered & status.eq('P') & marks.notna()
+
+        unknown = status.notna() & ~entered
+        unmarked = entered & status.eq('P') & ~present
+        failed = unknown | unmarked
+        for i in df.index[failed.to_numpy(dtype=bool)]:
+            problem = f"unknown admission number '{numbers[i]}'" if unknown[i] else 'missing marks'
+            self.validation_errors.append(f"Error in {sheet_name} row {i + 3}: {problem}")
+
+        results = [
+            PaperResult(exam_id=self.exam.id, student_id=int(student_id), subject_paper_id=paper_id, marks=int(value))
+            for student_id, value in zip(matched.loc[present, 'student_id'], marks[present])
+        ]
+        grades = pd.cut(marks[present], bins=GRADE_BANDS, labels=GRADES[::-1], right=False).value_counts()
         summary = {
             'total': len(df),
-            'processed': 0,
-            'success': 0,
-            'errors': 0,
-            'absent': 0,
-            'disqualified': 0,
-            'marks_distribution': {
-                'A': 0, 'B': 0, 'C': 0, 'D': 0, 'E': 0
-            }
+            'processed': int(entered.sum()),
+            'success': len(results),
+            'errors': int(failed.sum()),
+            'absent': int((entered & status.eq('A')).sum()),
+            'disqualified': int((entered & status.eq('D')).sum()),
+            'marks_distribution': {grade: int(grades.get(grade, 0)) for grade in GRADES}
         }
-        
-        for idx, row in df.iterrows():
-            try:
-                if pd.isna(row['Status']):
-                    continue
-                    
-                student = Student.objects.get(admission_number=row['Admission Number'])
-                result = PaperResult(
-                    exam_id=metadata['exam_id'],
-                    student=student,
-                    subject_id=metadata['subject_id'],
-                    paper_id=metadata.get('paper_id'),
-                    marks=row['Marks'] if row['Status'] == 'P' else None,
-                    status=row['Status'],
-                    comments=row.get('Comments', '')
-                )
-                
-                # Update summary statistics
-                if row['Status'] == 'P':
-                    grade = self._calculate_grade(row['Marks'])
-                    summary['marks_distribution'][grade[0]] += 1
-                    summary['success'] += 1
-                elif row['Status'] == 'A':
-                    summary['absent'] += 1
-                elif row['Status'] == 'D':
-                    summary['disqualified'] += 1
-                    
-                results.append(result)
-                summary['processed'] += 1
-                
-            except Exception as e:
-                summary['errors'] += 1
-                self.validation_errors.append(
-                    f"Error in {sheet_name} row {idx + 3}: {str(e)}"
-                )
-                
-            # Update progress
-            self.processing_progress['processed'] += 1
-            
         return results, summary
+
+    def _sheet_paper(self, metadata):
+        """
+        The paper of this upload a sheet was downloaded for, None for the
+        direct entry sheet, or False if the sheet belongs to another exam,
+        subject or paper. The file's paper_id only picks among self.papers.
+        """
+        if metadata.get('exam_id') not in (None, self.exam.id) or metadata.get('subject_id') != self.subject.id:
+            return False
+        if not self.papers:
+            return None if metadata.get('paper_id') is None else False
+        return {paper.id: paper for paper in self.papers}.get(metadata.get('paper_id'), False)
+
+    def _direct_entry_paper(self):
+        """Direct entry marks are out of 100 and stored against the subject's first paper"""
+        paper, _ = SubjectPaper.objects.get_or_create(
+            subject=self.subject,
+            paper_number='1',
+            defaults={'max_marks': 100}
+        )
+        return paper
     
+    def _save_progress(self):
+        """Persist processing_progress on the background job, if there is one."""
+        if self.job is not None:
+            self.job.set_progress(
+                self.processing_progress['processed'],
+                self.processing_progress['total']
+            )
+
     def _generate_processing_summary(self, sheet_summaries):
         """Generate a detailed processing summary"""
         total_summary = {
@@ -396,22 +460,9 @@ class SpreadsheetTemplate:
         }
         
         # Aggregate marks distribution
-        for grade in ['A', 'B', 'C', 'D', 'E']:
+        for grade in GRADES:
             total_summary['marks_distribution'][grade] = sum(
                 s['marks_distribution'][grade] for s in sheet_summaries.values()
             )
             
         return total_summary
-        
-    def _calculate_grade(self, marks):
-        """Calculate grade for summary statistics"""
-        if marks >= 80:
-            return 'A'
-        elif marks >= 65:
-            return 'B'
-        elif marks >= 50:
-            return 'C'
-        elif marks >= 40:
-            return 'D'
-        else:
-            return 'E'
\ No newline at end of file
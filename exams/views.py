@@ -4,20 +4,18 @@ from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin,
 from django.contrib import messages
 from django.db.models import Count, Avg, Min, Max, F, Prefetch
 from django.views.generic import CreateView, UpdateView, DeleteView, ListView, TemplateView, DetailView
-from django.urls import reverse_lazy
-from django.http import HttpResponse, JsonResponse
+from django.urls import reverse, reverse_lazy
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
 from django.db import transaction
 from django.core.exceptions import PermissionDenied
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.views.decorators.http import require_http_methods
 
 import csv
+import uuid
 from io import TextIOWrapper
 
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_CENTER
-
 from students.models import Student
 from subjects.models import Subject, SubjectPaper, SubjectPaperRatio
 from school.models import School # This is the corrected import
@@ -30,17 +28,24 @@ from .models import (
     GradingRange,
     PaperResult
 )
-from accounts.models import TeacherClass, TeacherSubject
+from .broadsheet import Broadsheet
+from .completion import CompletionMatrix
+from .ingestion import ResultsCsvIngestor
+from .jobs import PROCESS_SPREADSHEET, RECALCULATE_SUMMARIES
+from .result_writer import PaperResultWriter
+from .utils.spreadsheet import SpreadsheetTemplate
+from jobs.models import Job
+from accounts.access import for_user
 from .forms import GradingSystemForm, GradingRangeForm, SubjectPaperRatioForm
 
 # Mixins for permissions
 class TeacherRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
     def test_func(self):
-        return self.request.user.is_superuser or self.request.user.profile.roles.filter(name='Teacher').exists()
+        return self.request.user.is_superuser or for_user(self.request.user).is_teacher
 
 class HODRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
     def test_func(self):
-        return self.request.user.is_superuser or self.request.user.profile.roles.filter(name='HOD').exists()
+        return self.request.user.is_superuser or for_user(self.request.user).has_role('HOD')
 
 
 # Exam CRUD Views
@@ -115,12 +120,7 @@ def exam_form_subjects(request, form_level):
     # Filter subjects based on teacher's assignments if not superuser
     if not request.user.is_superuser:
         # Get subjects assigned to this teacher
-        from accounts.models import TeacherSubject
-        teacher_subjects = TeacherSubject.objects.filter(
-            teacher=request.user,
-            form_level=form_level
-        ).values_list('subject', flat=True)
-        subjects = subjects.filter(id__in=teacher_subjects)
+        subjects = subjects.filter(id__in=for_user(request.user).subject_ids)
 
     context = {
         'form_level': form_level,
@@ -138,10 +138,12 @@ def exam_subject_results_entry(request, form_level, subject_id):
 
     # Check if teacher is assigned to this subject and form level
     if not request.user.is_superuser:
-        from accounts.models import TeacherSubject
-        if not TeacherSubject.objects.filter(teacher=request.user, subject=subject).exists():
+        if not for_user(request.user).teaches_subject(subject.id):
             messages.error(request, "You are not assigned to teach this subject.")
-            return redirect('exam_form_subjects', form_level=form_level)
+            return redirect('exams:exam_form_subjects', form_level=form_level)
+
+    if request.method == 'POST':
+        return handle_bulk_result_entry(request, form_level, subject_id)
 
     # Get students in this form level, grouped by stream
     students_by_stream = {}
@@ -180,77 +182,68 @@ def exam_subject_results_entry(request, form_level, subject_id):
         'exams': exams,
     }
 
-    if request.method == 'POST':
-        return handle_bulk_result_entry(request, form_level, subject_id)
-
     return render(request, 'exams/exam_subject_results_entry.html', context)
 
-@transaction.atomic
 def handle_bulk_result_entry(request, form_level, subject_id):
     """Handle bulk result entry for a subject"""
     subject = get_object_or_404(Subject, pk=subject_id)
     exam_id = request.POST.get('exam')
     exam = get_object_or_404(Exam, pk=exam_id)
 
-    success_count = 0
-    error_count = 0
+    # Single paper entry; multi-paper subjects are entered per student
+    paper, created = SubjectPaper.objects.get_or_create(
+        subject=subject,
+        paper_number='1',
+        defaults={'max_marks': 100}
+    )
 
-    # Process each student's marks
+    entries = {}
     for key, value in request.POST.items():
         if key.startswith('marks_'):
             parts = key.split('_')
-            if len(parts) == 3:
-                student_id = parts[1]
-                status_key = f'status_{student_id}'
-
-                marks_str = value.strip()
-                status = request.POST.get(status_key, 'P')
-
-                try:
-                    student = Student.objects.get(pk=student_id)
-
-                    # Validate marks
-                    if status == 'P' and marks_str:
-                        marks = float(marks_str)
-                        if marks < 0 or marks > 100:
-                            error_count += 1
-                            continue
-                    elif status in ['A', 'D']:
-                        marks = None
-                    else:
-                        marks = float(marks_str) if marks_str else None
+            if len(parts) == 2 and parts[1].isdigit():
+                entries[int(parts[1])] = value.strip()
 
-                    # Get or create subject paper (assuming single paper for simplicity)
-                    paper, created = SubjectPaper.objects.get_or_create(
-                        subject=subject,
-                        name='Paper 1',
-                        defaults={'paper_number': 1, 'max_marks': 100}
-                    )
+    students = Student.objects.filter(pk__in=entries)
+    if not request.user.is_superuser:
+        students = students.filter(school=request.user.school)
+    students = students.in_bulk()
 
-                    # Save result
-                    PaperResult.objects.update_or_create(
-                        exam=exam,
-                        student=student,
-                        subject_paper=paper,
-                        defaults={
-                            'marks': marks,
-                            'status': status,
-                            'entered_by': request.user
-                        }
-                    )
+    writer = PaperResultWriter(exam)
+    error_count = 0
+
+    # Process each student's marks
+    for student_id, marks_str in entries.items():
+        status = request.POST.get(f'status_{student_id}', 'P')
+        student = students.get(student_id)
+
+        # Absent and disqualified students have no paper mark recorded
+        if student is None or status in ['A', 'D'] or not marks_str:
+            if student is None:
+                error_count += 1
+            continue
+
+        try:
+            marks = round(float(marks_str))
+        except ValueError:
+            error_count += 1
+            continue
 
-                    success_count += 1
+        # Validate marks
+        if marks < 0 or marks > paper.max_marks:
+            error_count += 1
+            continue
 
-                except (ValueError, Student.DoesNotExist):
-                    error_count += 1
-                    continue
+        writer.add(student, paper, marks)
+
+    success_count = writer.flush()
 
     if success_count > 0:
         messages.success(request, f"Successfully saved {success_count} results.")
     if error_count > 0:
         messages.error(request, f"Failed to save {error_count} results due to errors.")
 
-    return redirect('exam_subject_results_entry', form_level=form_level, subject_id=subject_id)
+    return redirect('exams:exam_subject_results_entry', form_level=form_level, subject_id=subject_id)
 
 class GradingSystemCreateView(TeacherRequiredMixin, CreateView):
     model = GradingSystem
@@ -411,7 +404,7 @@ def exam_results_upload_choice(request, pk):
     if request.user.is_superuser:
         exam = get_object_or_404(Exam, pk=pk)
     else:
-        if not request.user.profile.roles.filter(name='Teacher').exists():
+        if not for_user(request.user).is_teacher:
             raise PermissionDenied
         exam = get_object_or_404(Exam, pk=pk, school=request.user.school)
 
@@ -482,27 +475,13 @@ def stream_results(request, exam_pk, form_level, stream):
     else:
         exam = get_object_or_404(Exam, pk=exam_pk, school=request.user.school)
 
-    # Get students in this stream
-    students = Student.objects.filter(
-        school=request.user.school,
-        form_level=form_level,
-        stream=stream
-    ).order_by('admission_number')
-
-    # Get subjects for this form level
-    subjects = Subject.objects.filter(
-        form_levels=form_level,
-        school=request.user.school
-    ).order_by('name')
-
-    # Get exam summaries for these students
-    stream_results = StudentExamSummary.objects.filter(
-        exam=exam,
-        student__in=students
-    ).select_related('student').order_by('stream_position')
+    # Summaries ranked by stream position, each with its subject results
+    broadsheet = Broadsheet(exam, form_level, stream, school=request.user.school).build()
+    stream_results = broadsheet.rows
+    subjects = broadsheet.subjects
 
     # Calculate stream statistics
-    if stream_results.exists():
+    if stream_results:
         totals = [r.total_marks for r in stream_results]
         points = [r.total_points for r in stream_results]
         grades = [r.mean_grade for r in stream_results]
@@ -523,26 +502,16 @@ def stream_results(request, exam_pk, form_level, stream):
             'mean_grade': 'N/A',
         }
 
-    # Get subject results for each student
-    for result in stream_results:
-        subject_results = {}
-        exam_results = ExamResult.objects.filter(
-            exam=exam,
-            student=result.student
-        ).select_related('subject')
-        for exam_result in exam_results:
-            subject_results[exam_result.subject.id] = exam_result
-        result.subject_results = subject_results
-
     # Get class teacher
     from accounts.models import TeacherClass, TeacherSubject
     class_teacher = None
     try:
         teacher_class = TeacherClass.objects.filter(
+            school=exam.school,
             form_level=form_level,
             stream=stream,
             is_class_teacher=True
-        ).first()
+        ).select_related('teacher').first()
         if teacher_class:
             class_teacher = teacher_class.teacher
     except:
@@ -592,62 +561,59 @@ def exam_results_entry(request, pk):
     }
 
     if request.method == 'POST':
-        with transaction.atomic():
-            try:
-                student_id = request.POST.get('student')
-                subject_id = request.POST.get('subject')
-
-                if not student_id or not subject_id:
-                    messages.error(request, "Please select both student and subject.")
-                    return redirect('exam_results_entry', pk=pk)
-
-                student = get_object_or_404(Student, pk=student_id, school=request.user.school)
-                subject = get_object_or_404(Subject, pk=subject_id)
-
-                # Process paper data
-                paper_index = 0
-                while f'paper_{paper_index}_marks' in request.POST:
-                    marks_str = request.POST.get(f'paper_{paper_index}_marks', '')
-                    ratio_str = request.POST.get(f'paper_{paper_index}_ratio', '')
-                    paper_name = request.POST.get(f'paper_{paper_index}_name', '')
-
-                    if marks_str and ratio_str:
-                        marks = int(marks_str)
-                        ratio = int(ratio_str)
-
-                        # Get or create the subject paper
-                        paper, created = SubjectPaper.objects.get_or_create(
-                            subject=subject,
-                            name=paper_name,
-                            defaults={'paper_number': paper_index + 1, 'max_marks': 100}
-                        )
-
-                        # Save paper result
-                        PaperResult.objects.update_or_create(
-                            exam=exam,
-                            student=student,
-                            subject_paper=paper,
-                            defaults={
-                                'marks': marks,
-                                'status': 'P'  # Present
-                            }
-                        )
-
-                        # Update or create subject paper ratio
-                        SubjectPaperRatio.objects.update_or_create(
-                            subject=subject,
-                            paper=paper,
-                            defaults={'contribution_percentage': ratio}
-                        )
-
-                    paper_index += 1
-
-                messages.success(request, f"Results saved successfully for {student.name} in {subject.name}.")
-                return redirect('exam_results_entry', pk=pk)
-
-            except Exception as e:
-                messages.error(request, f"An error occurred: {e}")
-                return redirect('exam_results_entry', pk=pk)
+        try:
+            student_id = request.POST.get('student')
+            subject_id = request.POST.get('subject')
+
+            if not student_id or not subject_id:
+                messages.error(request, "Please select both student and subject.")
+                return redirect('exams:exam_results_entry', pk=pk)
+
+            student = get_object_or_404(Student, pk=student_id, school=request.user.school)
+            subject = get_object_or_404(Subject, pk=subject_id)
+
+            writer = PaperResultWriter(exam)
+            ratio_fields = {}
+
+            # Process paper data
+            paper_index = 0
+            while f'paper_{paper_index}_marks' in request.POST:
+                marks_str = request.POST.get(f'paper_{paper_index}_marks', '')
+                ratio_str = request.POST.get(f'paper_{paper_index}_ratio', '')
+                max_marks_str = request.POST.get(f'paper_{paper_index}_max_marks', '')
+
+                if marks_str and ratio_str:
+                    marks = int(marks_str)
+                    ratio = int(ratio_str)
+                    paper_number = paper_index + 1
+
+                    # Get or create the subject paper
+                    paper, created = SubjectPaper.objects.get_or_create(
+                        subject=subject,
+                        paper_number=str(paper_number),
+                        defaults={'max_marks': int(max_marks_str or 100)}
+                    )
+                    writer.add(student, paper, marks)
+
+                    # SubjectPaperRatio holds up to three papers
+                    if paper_number <= 3:
+                        ratio_fields[f'paper{paper_number}_max_marks'] = paper.max_marks
+                        ratio_fields[f'paper{paper_number}_contribution'] = ratio
+
+                paper_index += 1
+
+            with transaction.atomic():
+                # Update or create subject paper ratio
+                if ratio_fields:
+                    SubjectPaperRatio.objects.update_or_create(subject=subject, defaults=ratio_fields)
+                writer.flush()
+
+            messages.success(request, f"Results saved successfully for {student.name} in {subject.name}.")
+            return redirect('exams:exam_results_entry', pk=pk)
+
+        except Exception as e:
+            messages.error(request, f"An error occurred: {e}")
+            return redirect('exams:exam_results_entry', pk=pk)
 
     return render(request, 'exams/enter_results.html', context)
 
@@ -703,86 +669,107 @@ def upload_results(request, pk):
     else:
         exam = get_object_or_404(Exam, pk=pk, school=request.user.school)
 
-    if request.method == 'POST' and request.FILES.get('csv_file'):
-        csv_file = request.FILES['csv_file']
-
+    # The upload form names the field results_file; older clients send csv_file
+    csv_file = request.FILES.get('csv_file') or request.FILES.get('results_file')
+    if request.method == 'POST' and csv_file:
         if not csv_file.name.endswith('.csv'):
             messages.error(request, 'Please upload a CSV file.')
             return redirect('exams:exam_results_upload_choice', pk=pk)
 
         try:
-            decoded_file = csv_file.read().decode('utf-8')
-            csv_reader = csv.DictReader(decoded_file.splitlines())
-
-            success_count = 0
-            error_count = 0
-
-            for row in csv_reader:
-                try:
-                    admission_number = row.get('admission_number', '').strip()
-                    subject_name = row.get('subject_name', '').strip()
-                    marks_str = row.get('marks', '').strip()
-                    status = row.get('status', 'P').strip().upper()
-
-                    if not admission_number or not subject_name:
-                        error_count += 1
-                        continue
-
-                    # Get student
-                    try:
-                        student = Student.objects.get(
-                            admission_number=admission_number,
-                            school=request.user.school
-                        )
-                    except Student.DoesNotExist:
-                        error_count += 1
-                        continue
-
-                    # Get subject
-                    try:
-                        subject = Subject.objects.get(
-                            name=subject_name,
-                            school=request.user.school
-                        )
-                    except Subject.DoesNotExist:
-                        error_count += 1
-                        continue
-
-                    # Process marks
-                    if status == 'P' and marks_str:
-                        try:
-                            marks = float(marks_str)
-                        except ValueError:
-                            error_count += 1
-                            continue
-                    else:
-                        marks = None
-
-                    # Create or update ExamResult
-                    ExamResult.objects.update_or_create(
-                        exam=exam,
-                        student=student,
-                        subject=subject,
-                        defaults={
-                            'final_marks': marks,
-                            'status': status
-                        }
-                    )
+            report = ResultsCsvIngestor(exam).run(csv_file.file)
+            if report.saved:
+                # Grading and ranking the new marks runs on a background worker
+                Job.enqueue(RECALCULATE_SUMMARIES, {'exam_id': exam.id}, school=exam.school, created_by=request.user)
+        except (UnicodeDecodeError, csv.Error) as e:
+            messages.error(request, f'Error processing file: {str(e)}')
+            return redirect('exams:exam_results_summary', pk=pk)
+
+        messages.success(
+            request,
+            f'Successfully uploaded {report.saved} results. {report.error_count} errors, '
+            f'{report.skipped} skipped ({report.rows_per_second:.0f} rows/sec).'
+        )
+        if report.saved:
+            messages.info(request, 'Grades and rankings are being recalculated in the background.')
+        if report.errors:
+            # Show the per-row error report instead of redirecting, and keep it for download as CSV
+            token = uuid.uuid4()
+            default_storage.save(_upload_errors_path(exam.id, token), ContentFile(report.errors_as_csv().encode()))
+            return render(request, 'exams/upload_results.html', {
+                'exam': exam,
+                'report': report,
+                'errors_url': reverse('exams:download_upload_errors', args=[exam.pk, token]),
+            })
 
-                    success_count += 1
+        return redirect('exams:exam_results_summary', pk=pk)
 
-                except Exception as e:
-                    error_count += 1
-                    continue
+    return render(request, 'exams/upload_results.html', {'exam': exam})
 
-            messages.success(request, f'Successfully uploaded {success_count} results. {error_count} errors.')
+def _upload_errors_path(exam_id, token):
+    return f'uploads/errors/{exam_id}/{token.hex}.csv'
 
-        except Exception as e:
-            messages.error(request, f'Error processing file: {str(e)}')
+@login_required
+@permission_required('exams.add_examresult', raise_exception=True)
+def download_upload_errors(request, pk, token):
+    """The rejected rows of a results upload, as CSV."""
+    if request.user.is_superuser:
+        exam = get_object_or_404(Exam, pk=pk)
+    else:
+        exam = get_object_or_404(Exam, pk=pk, school=request.user.school)
 
-        return redirect('exams:exam_results_summary', pk=pk)
+    path = _upload_errors_path(exam.id, token)
+    if not default_storage.exists(path):
+        raise Http404("The upload error report is no longer available.")
+    return FileResponse(default_storage.open(path, 'rb'), as_attachment=True, filename=f"{exam.name}_upload_errors.csv")
 
-    return render(request, 'exams/upload_results.html', {'exam': exam})
+# Subject Spreadsheet View
+#----------------------------------------------------------------------
+@login_required
+@permission_required('exams.add_examresult', raise_exception=True)
+@require_http_methods(['GET', 'POST'])
+def subject_spreadsheet(request, exam_pk, subject_pk, paper_pk=None):
+    """
+    GET downloads the protected entry workbook of a subject (or one of its
+    papers); POST validates a filled workbook and queues it for processing
+    on a background worker, returning the job's status URL to poll.
+    """
+    if request.user.is_superuser:
+        exam = get_object_or_404(Exam, pk=exam_pk)
+    else:
+        exam = get_object_or_404(Exam, pk=exam_pk, school=request.user.school)
+    subject = get_object_or_404(Subject, pk=subject_pk, school=exam.school)
+    paper = get_object_or_404(SubjectPaper, pk=paper_pk, subject=subject) if paper_pk else None
+    template = SpreadsheetTemplate(exam, subject, paper)
+
+    if request.method == 'GET':
+        filename = f"{exam.name}_{subject.name}{f'_Paper_{paper.paper_number}' if paper else ''}_template.xlsx"
+        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        template.generate_template().save(response)
+        return response
+
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({'error': 'No file uploaded'}, status=400)
+    is_valid, message = template.validate_spreadsheet(upload)
+    if not is_valid:
+        return JsonResponse({'error': message}, status=400)
+
+    # Processing runs on a background worker; the client polls the job status
+    upload.seek(0)
+    path = default_storage.save(f'jobs/uploads/{uuid.uuid4().hex}_{upload.name}', upload)
+    job = Job.enqueue(
+        PROCESS_SPREADSHEET,
+        {'exam_id': exam.id, 'subject_id': subject.id, 'paper_id': paper.id if paper else None, 'path': path},
+        school=exam.school,
+        created_by=request.user,
+    )
+    return JsonResponse({
+        'success': True,
+        'job_id': job.pk,
+        'status_url': reverse('jobs:job_status', args=[job.pk]),
+    }, status=202)
 
 # Exam Results Summary View
 #----------------------------------------------------------------------
@@ -832,7 +819,7 @@ def exam_results_summary(request, pk):
 @login_required
 def my_classes_exam_management(request):
     """View for teachers to manage exams for their classes"""
-    if not request.user.is_superuser and not request.user.profile.roles.filter(name='Teacher').exists():
+    if not request.user.is_superuser and not for_user(request.user).is_teacher:
         messages.error(request, "You do not have permission to access this page.")
         return redirect('home')
 
@@ -852,65 +839,61 @@ def my_classes_exam_management(request):
     else:
         selected_exam = available_exams.first()
 
-    # Get teacher's classes
-    teacher_classes = TeacherClass.objects.filter(teacher=request.user).select_related('school')
+    # Teacher's classes and the forms their subjects are offered in, the
+    # forms sitting the selected exam and its completion, each loaded once
+    # for every class
+    access = for_user(request.user)
+    teacher_classes = access.classes
+    subject_ids = access.subject_ids
+    subject_forms = access.subject_forms
+    if selected_exam:
+        participating_forms = set(selected_exam.participating_forms.values_list('id', flat=True))
+        matrix = CompletionMatrix(selected_exam.school_id).load([selected_exam.id])
+    else:
+        participating_forms = set()
+
+    def class_status(tc, subjects, action_button):
+        """Status columns of a class row; completion covers the given subjects (None: all)"""
+        if tc['form_level_id'] not in participating_forms:
+            return {'status': 'not_active', 'status_text': 'Not Participating', 'action_button': None}
+        enrolled, entered = matrix.total(selected_exam.id, tc['form_level_id'], tc['stream'], subjects)
+        completion = matrix.percentage(enrolled, entered)
+        return {
+            'status': 'active',
+            'status_text': f'Active ({completion:.0f}% entered)',
+            'action_button': action_button,
+            'enrolled': enrolled,
+            'entered': entered,
+            'completion_percentage': completion,
+        }
 
     # Prepare subject classes data (classes where teacher teaches subjects)
     subject_classes = []
     for tc in teacher_classes:
         # Check if teacher has subjects in this class
-        has_subjects = TeacherSubject.objects.filter(
-            teacher=request.user,
-            subject__form_levels=tc.form_level
-        ).exists()
-
-        if has_subjects:
-            # Determine status based on exam participation
-            if selected_exam and tc.form_level in selected_exam.participating_forms.all().values_list('id', flat=True):
-                status = 'active'
-                status_text = 'Active'
-                action_button = {
+        if tc['form_level_id'] in subject_forms:
+            subject_classes.append({
+                'id': tc['id'],
+                'name': tc['name'],
+                **class_status(tc, subject_ids, {
                     'text': 'Manage Results',
                     'class': 'btn-primary btn-sm',
-                    'url': f'/exams/results/form/{tc.form_level}/subjects/'
-                }
-            else:
-                status = 'not_active'
-                status_text = 'Not Participating'
-                action_button = None
-
-            subject_classes.append({
-                'id': tc.id,
-                'name': tc.class_name,
-                'status': status,
-                'status_text': status_text,
-                'action_button': action_button
+                    'url': f"/exams/results/form/{tc['form_level']}/subjects/"
+                }),
             })
 
     # Prepare supervised classes data (classes where teacher is class teacher)
     supervised_classes = []
     for tc in teacher_classes:
-        if tc.is_class_teacher:
-            # Similar logic for supervised classes
-            if selected_exam and tc.form_level in selected_exam.participating_forms.all().values_list('id', flat=True):
-                status = 'active'
-                status_text = 'Active'
-                action_button = {
+        if tc['is_class_teacher']:
+            supervised_classes.append({
+                'id': tc['id'],
+                'name': tc['name'],
+                **class_status(tc, None, {
                     'text': 'View Class',
                     'class': 'btn-success btn-sm',
-                    'url': f'/school/stream/{tc.form_level}/{tc.stream}/'
-                }
-            else:
-                status = 'not_active'
-                status_text = 'Not Participating'
-                action_button = None
-
-            supervised_classes.append({
-                'id': tc.id,
-                'name': tc.class_name,
-                'status': status,
-                'status_text': status_text,
-                'action_button': action_button
+                    'url': f"/school/stream/{tc['form_level']}/{tc['stream']}/"
+                }),
             })
 
     context = {
@@ -925,7 +908,7 @@ def my_classes_exam_management(request):
 @login_required
 def update_exam_selection(request):
     """Handle updating exam selections for teacher's classes"""
-    if not request.user.is_superuser and not request.user.profile.roles.filter(name='Teacher').exists():
+    if not request.user.is_superuser and not for_user(request.user).is_teacher:
         return JsonResponse({'error': 'Permission denied'}, status=403)
 
     if request.method == 'POST':
@@ -941,24 +924,22 @@ def update_exam_selection(request):
                 exam = Exam.objects.get(pk=exam_id, school=request.user.school, is_active=True)
 
             # Get teacher's classes
-            teacher_classes = TeacherClass.objects.filter(teacher=request.user).select_related('school')
+            access = for_user(request.user)
+            teacher_classes = access.classes
+            subject_forms = access.subject_forms
+            participating_forms = set(exam.participating_forms.values_list('id', flat=True))
 
             # Prepare subject classes data
             subject_classes = []
             for tc in teacher_classes:
-                has_subjects = TeacherSubject.objects.filter(
-                    teacher=request.user,
-                    subject__form_levels=tc.form_level
-                ).exists()
-
-                if has_subjects:
-                    if exam and tc.form_level in exam.participating_forms.all().values_list('id', flat=True):
+                if tc['form_level_id'] in subject_forms:
+                    if tc['form_level_id'] in participating_forms:
                         status = 'active'
                         status_text = 'Active'
                         action_button = {
                             'text': 'Manage Results',
                             'class': 'btn-primary btn-sm',
-                            'url': f'/exams/results/form/{tc.form_level}/subjects/'
+                            'url': f"/exams/results/form/{tc['form_level']}/subjects/"
                         }
                     else:
                         status = 'not_active'
@@ -966,8 +947,8 @@ def update_exam_selection(request):
                         action_button = None
 
                     subject_classes.append({
-                        'id': tc.id,
-                        'name': tc.class_name,
+                        'id': tc['id'],
+                        'name': tc['name'],
                         'status': status,
                         'status_text': status_text,
                         'action_button': action_button
@@ -976,14 +957,14 @@ def update_exam_selection(request):
             # Prepare supervised classes data
             supervised_classes = []
             for tc in teacher_classes:
-                if tc.is_class_teacher:
-                    if exam and tc.form_level in exam.participating_forms.all().values_list('id', flat=True):
+                if tc['is_class_teacher']:
+                    if tc['form_level_id'] in participating_forms:
                         status = 'active'
                         status_text = 'Active'
                         action_button = {
                             'text': 'View Class',
                             'class': 'btn-success btn-sm',
-                            'url': f'/school/stream/{tc.form_level}/{tc.stream}/'
+                            'url': f"/school/stream/{tc['form_level']}/{tc['stream']}/"
                         }
                     else:
                         status = 'not_active'
@@ -991,8 +972,8 @@ def update_exam_selection(request):
                         action_button = None
 
                     supervised_classes.append({
-                        'id': tc.id,
-                        'name': tc.class_name,
+                        'id': tc['id'],
+                        'name': tc['name'],
                         'status': status,
                         'status_text': status_text,
                         'action_button': action_button
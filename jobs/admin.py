@@ -0,0 +1,8 @@
+from django.contrib import admin
+from .models import Job
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'school', 'progress_done', 'progress_total', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind', 'school')
+    readonly_fields = ('created_at', 'started_at', 'finished_at', 'worker')
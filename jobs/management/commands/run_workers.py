@@ -0,0 +1,80 @@
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.registry import execute_job, init_worker, worker_name
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs in a pool of worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=max(1, multiprocessing.cpu_count() - 1), help='Number of worker processes')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait between polls when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is drained')
+        parser.add_argument('--stale-after', type=int, default=3600, help='Requeue jobs left running for this many seconds by a dead worker')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        self.requeue_stale(options['stale_after'])
+        self.stdout.write(self.style.SUCCESS(f'Starting {workers} job workers'))
+
+        # Spawned workers set Django up themselves and never share the parent's connections
+        context = multiprocessing.get_context('spawn')
+        in_flight = {}
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker) as pool:
+            try:
+                while True:
+                    while len(in_flight) < workers:
+                        job = self.claim_next()
+                        if job is None:
+                            break
+                        self.stdout.write(f'Running {job}')
+                        in_flight[pool.submit(execute_job, job.pk)] = job
+
+                    if not in_flight:
+                        if options['once']:
+                            break
+                        connections.close_all()
+                        time.sleep(options['poll_interval'])
+                        continue
+
+                    done, _ = wait(in_flight, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                    for future in done:
+                        job = in_flight.pop(future)
+                        try:
+                            status = future.result()
+                        except Exception as e:
+                            # The worker process itself died; record it on the job
+                            Job.objects.filter(pk=job.pk).update(status=Job.FAILED, error=str(e), finished_at=timezone.now())
+                            status = Job.FAILED
+                        self.stdout.write(f'Job {job.kind} #{job.pk}: {status}')
+            except KeyboardInterrupt:
+                self.stdout.write(self.style.WARNING('Stopping workers; running jobs will finish first'))
+
+        self.stdout.write(self.style.SUCCESS('Workers stopped'))
+
+    def claim_next(self):
+        """Claim the oldest queued job, retrying if another worker takes it first."""
+        name = worker_name()
+        for job in Job.objects.filter(status=Job.QUEUED).order_by('created_at')[:20]:
+            if job.claim(name):
+                return job
+        return None
+
+    def requeue_stale(self, seconds):
+        cutoff = timezone.now() - timedelta(seconds=seconds)
+        count = Job.objects.filter(status=Job.RUNNING, started_at__lt=cutoff).update(
+            status=Job.QUEUED, started_at=None, worker=''
+        )
+        if count:
+            self.stdout.write(self.style.WARNING(f'Requeued {count} stale jobs'))
@@ -0,0 +1,106 @@
+from django.db import models
+from django.conf import settings
+from django.utils import timezone
+from school.models import School
+
+class Job(models.Model):
+    """
+    A unit of background work, stored in the database and picked up by
+    `manage.py run_workers`. Handlers are looked up by kind in jobs.registry.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=100)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='jobs', null=True, blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    payload = models.JSONField(default=dict, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    progress_total = models.PositiveIntegerField(default=0)
+    progress_done = models.PositiveIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True, help_text="Host and pid of the worker running the job")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+    @classmethod
+    def enqueue(cls, kind, payload=None, school=None, created_by=None):
+        return cls.objects.create(kind=kind, payload=payload or {}, school=school, created_by=created_by)
+
+    @property
+    def is_finished(self):
+        return self.status in (self.SUCCEEDED, self.FAILED)
+
+    @property
+    def percent_complete(self):
+        if self.status == self.SUCCEEDED:
+            return 100
+        if not self.progress_total:
+            return 0
+        return min(100, round(self.progress_done * 100 / self.progress_total))
+
+    def set_progress(self, done, total=None):
+        """Persist progress without touching the rest of the row."""
+        self.progress_done = done
+        fields = {'progress_done': done}
+        if total is not None:
+            self.progress_total = total
+            fields['progress_total'] = total
+        Job.objects.filter(pk=self.pk).update(**fields)
+
+    def claim(self, worker):
+        """Atomically move a queued job to running; False if another worker got it first."""
+        now = timezone.now()
+        claimed = Job.objects.filter(pk=self.pk, status=self.QUEUED).update(
+            status=self.RUNNING, started_at=now, worker=worker
+        )
+        if claimed:
+            self.status, self.started_at, self.worker = self.RUNNING, now, worker
+        return bool(claimed)
+
+    def finish(self, result=None, error=''):
+        self.status = self.FAILED if error else self.SUCCEEDED
+        self.result = result
+        self.error = error
+        self.finished_at = timezone.now()
+        if not error and self.progress_total:
+            self.progress_done = self.progress_total
+        self.save(update_fields=['status', 'result', 'error', 'finished_at', 'progress_done'])
+
+    def as_status(self):
+        """JSON-ready state for the polling endpoint."""
+        return {
+            'id': self.pk,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': {
+                'done': self.progress_done,
+                'total': self.progress_total,
+                'percent': self.percent_complete,
+            },
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
@@ -0,0 +1,79 @@
+# jobs/registry.py
+"""
+Job handler registry.
+
+Apps declare handlers in their own jobs.py module, which JobsConfig.ready()
+imports on startup:
+
+    @register('exams.recalculate_summaries')
+    def recalculate_summaries(job):
+        ...
+        return {'students': 120}
+
+A handler receives the Job, may report progress with job.set_progress(),
+and returns a JSON-serialisable result. Raising marks the job failed.
+"""
+import logging
+import os
+import socket
+import traceback
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+
+
+class UnknownJobKind(Exception):
+    pass
+
+
+def register(kind):
+    def decorator(func):
+        _handlers[kind] = func
+        return func
+    return decorator
+
+
+def get_handler(kind):
+    try:
+        return _handlers[kind]
+    except KeyError:
+        raise UnknownJobKind(f"No handler registered for job kind '{kind}'")
+
+
+def registered_kinds():
+    return sorted(_handlers)
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def init_worker():
+    """Process pool initializer: set Django up in a freshly spawned worker."""
+    import django
+    django.setup()
+
+
+def execute_job(job_id):
+    """
+    Run one claimed job to completion, recording its result or error.
+    Runs inside a worker process, so it manages its own connections.
+    """
+    from .models import Job
+
+    close_old_connections()
+    job = Job.objects.get(pk=job_id)
+    try:
+        result = get_handler(job.kind)(job)
+    except Exception as e:
+        logger.error(f"Job {job} failed: {e}")
+        job.finish(error=f"{e}\n\n{traceback.format_exc()}")
+    else:
+        job.finish(result=result)
+        logger.info(f"Job {job} finished")
+    finally:
+        close_old_connections()
+    return job.status
@@ -0,0 +1,279 @@
+import io
+import threading
+from concurrent.futures import Future
+from datetime import timedelta
+from unittest import mock
+
+import openpyxl
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from exams.jobs import PROCESS_SPREADSHEET, RECALCULATE_SUMMARIES
+from exams.models import Exam, PaperResult, StudentExamSummary
+from exams.utils.spreadsheet import SpreadsheetTemplate
+from school.models import FormLevel, School
+from students.models import Student
+from subjects.models import Subject, SubjectPaper
+from .models import Job
+from .registry import execute_job, register
+
+SUCCEEDING = 'jobs.tests.succeeding'
+FAILING = 'jobs.tests.failing'
+
+
+@register(SUCCEEDING)
+def succeeding(job):
+    job.set_progress(1, 2)
+    return {'echo': job.payload.get('value')}
+
+
+@register(FAILING)
+def failing(job):
+    job.set_progress(1, 2)
+    raise ValueError('no marks for this exam')
+
+
+class InlinePool:
+    """
+    Stands in for run_workers' spawned process pool, whose workers would set
+    Django up against the configured database rather than the test one.
+    """
+
+    def __init__(self, max_workers, mp_context=None, initializer=None):
+        self.max_workers = max_workers
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+class JobClaimTests(TransactionTestCase):
+    """Workers racing for the same queued job: exactly one claims it."""
+
+    def test_concurrent_claims(self):
+        job = Job.enqueue(SUCCEEDING)
+        workers = 6
+        barrier = threading.Barrier(workers)
+        claimed = {}
+
+        def claim(name):
+            copy = Job.objects.get(pk=job.pk)
+            barrier.wait()
+            try:
+                claimed[name] = copy.claim(name)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=claim, args=(f'worker-{n}',)) for n in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        [winner] = [name for name, won in claimed.items() if won]
+        self.assertEqual(len(claimed), workers)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker), (Job.RUNNING, winner))
+        self.assertIsNotNone(job.started_at)
+
+    def test_stale_copy_cannot_claim(self):
+        job = Job.enqueue(SUCCEEDING)
+        stale = Job.objects.get(pk=job.pk)
+        self.assertTrue(job.claim('first'))
+        self.assertFalse(stale.claim('second'))
+        self.assertEqual(stale.status, Job.QUEUED)
+        self.assertEqual(Job.objects.get(pk=job.pk).worker, 'first')
+
+
+class RunWorkersTests(TransactionTestCase):
+    """execute_job and the run_workers loop, with the process pool run inline."""
+
+    def run_workers(self, **options):
+        output = io.StringIO()
+        with mock.patch('jobs.management.commands.run_workers.ProcessPoolExecutor', InlinePool):
+            call_command('run_workers', once=True, workers=2, stdout=output, **options)
+        return output.getvalue()
+
+    def test_execute_job_success(self):
+        job = Job.enqueue(SUCCEEDING, {'value': 7})
+        self.assertEqual(execute_job(job.pk), Job.SUCCEEDED)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.error), (Job.SUCCEEDED, {'echo': 7}, ''))
+        self.assertEqual((job.progress_done, job.percent_complete), (2, 100))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_execute_job_failure(self):
+        job = Job.enqueue(FAILING)
+        self.assertEqual(execute_job(job.pk), Job.FAILED)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.progress_done), (Job.FAILED, None, 1))
+        self.assertTrue(job.error.startswith('no marks for this exam'))
+        self.assertIn('Traceback', job.error)
+
+    def test_execute_unknown_kind(self):
+        job = Job.enqueue('jobs.tests.unregistered')
+        self.assertEqual(execute_job(job.pk), Job.FAILED)
+        self.assertIn("No handler registered for job kind 'jobs.tests.unregistered'", Job.objects.get(pk=job.pk).error)
+
+    def test_queue_drained_in_order(self):
+        jobs = [Job.enqueue(SUCCEEDING, {'value': n}) for n in range(3)] + [Job.enqueue(FAILING)]
+        output = self.run_workers()
+        statuses = {job.pk: job.status for job in Job.objects.all()}
+        self.assertEqual([statuses[job.pk] for job in jobs], [Job.SUCCEEDED] * 3 + [Job.FAILED])
+        self.assertEqual([job.result for job in Job.objects.filter(kind=SUCCEEDING)], [{'echo': n} for n in range(3)])
+        self.assertIn(f'Job {FAILING} #{jobs[-1].pk}: failed', output)
+
+    def test_requeue_stale(self):
+        now = timezone.now()
+        stale = Job.objects.create(kind=SUCCEEDING, status=Job.RUNNING, started_at=now - timedelta(hours=2), worker='dead:1')
+        running = Job.objects.create(kind=SUCCEEDING, status=Job.RUNNING, started_at=now - timedelta(minutes=5), worker='live:2')
+        finished = Job.objects.create(kind=SUCCEEDING, status=Job.FAILED, started_at=now - timedelta(hours=2), worker='dead:1')
+
+        output = self.run_workers(stale_after=3600)
+        self.assertIn('Requeued 1 stale jobs', output)
+        stale.refresh_from_db()
+        self.assertEqual((stale.status, stale.result), (Job.SUCCEEDED, {'echo': None}))
+        self.assertNotEqual(stale.worker, 'dead:1')
+        running.refresh_from_db()
+        self.assertEqual((running.status, running.worker), (Job.RUNNING, 'live:2'))
+        self.assertEqual(Job.objects.get(pk=finished.pk).status, Job.FAILED)
+
+    def test_dead_worker_fails_the_job(self):
+        job = Job.enqueue(SUCCEEDING)
+        with mock.patch('jobs.management.commands.run_workers.execute_job', side_effect=OSError('worker exited')):
+            self.run_workers()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), (Job.FAILED, 'worker exited'))
+        self.assertIsNotNone(job.finished_at)
+
+
+class JobStatusTests(TestCase):
+    """The polling endpoint shows a job only to users of the school that owns it."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.school = School.objects.create(name='Owning School')
+        other = School.objects.create(name='Other School')
+        cls.user = CustomUser.objects.create_user('clerk', password='x', school=cls.school)
+        cls.colleague = CustomUser.objects.create_user('colleague', password='x', school=cls.school)
+        cls.outsider = CustomUser.objects.create_user('outsider', password='x', school=other)
+        cls.job = Job.enqueue(SUCCEEDING, school=cls.school, created_by=cls.user)
+        cls.job.set_progress(3, 4)
+        cls.unowned = Job.enqueue(SUCCEEDING)
+
+    def status(self, user, job):
+        if user is not None:
+            self.client.force_login(user)
+        return self.client.get(reverse('jobs:job_status', args=[job.pk]))
+
+    def test_owner_and_school(self):
+        for user in (self.user, self.colleague):
+            response = self.status(user, self.job)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            self.assertEqual((data['id'], data['kind'], data['status']), (self.job.pk, SUCCEEDING, Job.QUEUED))
+            self.assertEqual(data['progress'], {'done': 3, 'total': 4, 'percent': 75})
+
+    def test_other_school(self):
+        self.assertEqual(self.status(self.outsider, self.job).status_code, 404)
+        self.assertEqual(self.status(self.user, self.unowned).status_code, 404)
+
+    def test_superuser(self):
+        admin = CustomUser.objects.create_superuser('admin', password='x', school=None)
+        for job in (self.job, self.unowned):
+            self.assertEqual(self.status(admin, job).status_code, 200)
+
+    def test_login_required(self):
+        self.assertEqual(self.status(None, self.job).status_code, 302)
+
+
+class ExamHandlerTests(TransactionTestCase):
+    """The exams job handlers, run through execute_job as a worker would."""
+
+    def setUp(self):
+        self.school = School.objects.create(name='Handler School')
+        form = FormLevel.objects.create(school=self.school, number=1)
+        self.exam = Exam.objects.create(school=self.school, name='Opener', form_level=1, year=2026, term=1)
+        self.subject = Subject.objects.create(school=self.school, name='Mathematics', code='MAT')
+        self.paper = SubjectPaper.objects.create(subject=self.subject, paper_number='1', max_marks=100)
+        self.students = []
+        for n in range(3):
+            student = Student.objects.create(
+                school=self.school, name=f'Student {n}', admission_number=f'H{n}', form_level=form, stream='East'
+            )
+            student.subjects.add(self.subject)
+            self.students.append(student)
+
+    def test_recalculate_summaries(self):
+        for marks, student in zip((50, 70, 60), self.students):
+            PaperResult.objects.create(exam=self.exam, student=student, subject_paper=self.paper, marks=marks)
+        StudentExamSummary.objects.filter(exam=self.exam).update(overall_position=0)
+
+        job = Job.enqueue(RECALCULATE_SUMMARIES, {'exam_id': self.exam.id}, school=self.school)
+        self.assertEqual(execute_job(job.pk), Job.SUCCEEDED)
+        job.refresh_from_db()
+        self.assertEqual(job.result, {'exams': 1, 'students': 3})
+        self.assertEqual((job.progress_done, job.progress_total), (1, 1))
+        self.assertEqual(
+            list(StudentExamSummary.objects.filter(exam=self.exam).order_by('student__admission_number').values_list('overall_position', flat=True)),
+            [3, 1, 2],
+        )
+
+    def upload(self, paper, marks):
+        output = io.BytesIO()
+        SpreadsheetTemplate(self.exam, paper.subject, paper).generate_template().save(output)
+        workbook = openpyxl.load_workbook(io.BytesIO(output.getvalue()))
+        sheet = workbook.worksheets[-1]
+        for row, value in enumerate(marks, 3):
+            sheet.cell(row=row, column=4, value=value)
+            sheet.cell(row=row, column=5, value='P')
+        output = io.BytesIO()
+        workbook.save(output)
+        return default_storage.save('jobs/uploads/handler-test.xlsx', ContentFile(output.getvalue()))
+
+    def test_process_spreadsheet(self):
+        path = self.upload(self.paper, [40, 80, 60])
+        job = Job.enqueue(
+            PROCESS_SPREADSHEET,
+            {'exam_id': self.exam.id, 'subject_id': self.subject.id, 'paper_id': self.paper.id, 'path': path},
+            school=self.school,
+        )
+        self.assertEqual(execute_job(job.pk), Job.SUCCEEDED, Job.objects.get(pk=job.pk).error)
+        self.assertFalse(default_storage.exists(path))
+        self.assertEqual(
+            sorted(PaperResult.objects.filter(exam=self.exam).values_list('student__admission_number', 'marks')),
+            [('H0', 40), ('H1', 80), ('H2', 60)],
+        )
+        self.assertEqual(
+            StudentExamSummary.objects.get(exam=self.exam, student=self.students[1]).overall_position, 1
+        )
+
+    def test_process_spreadsheet_paper_of_another_subject(self):
+        other = Subject.objects.create(school=self.school, name='Physics', code='PHY')
+        other_paper = SubjectPaper.objects.create(subject=other, paper_number='1', max_marks=100)
+        path = self.upload(self.paper, [40, 80, 60])
+        job = Job.enqueue(
+            PROCESS_SPREADSHEET,
+            {'exam_id': self.exam.id, 'subject_id': self.subject.id, 'paper_id': other_paper.id, 'path': path},
+            school=self.school,
+        )
+        self.assertEqual(execute_job(job.pk), Job.FAILED)
+        self.assertIn('SubjectPaper matching query does not exist', Job.objects.get(pk=job.pk).error)
+        self.assertFalse(PaperResult.objects.exists())
+        default_storage.delete(path)
@@ -0,0 +1,8 @@
+from django.urls import path
+from . import views
+
+app_name = 'jobs'
+
+urlpatterns = [
+    path('<int:pk>/status/', views.job_status, name='job_status'),
+]
@@ -0,0 +1,13 @@
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from .models import Job
+
+@login_required
+def job_status(request, pk):
+    """Polling endpoint: current status and progress of a background job."""
+    if request.user.is_superuser:
+        job = get_object_or_404(Job, pk=pk)
+    else:
+        job = get_object_or_404(Job, pk=pk, school=request.user.school)
+    return JsonResponse(job.as_status())
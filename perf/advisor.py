@@ -0,0 +1,127 @@
+# perf/advisor.py
+"""
+Query plan analysis for index_advisor.
+
+Each captured statement is replayed under EXPLAIN (EXPLAIN QUERY PLAN on
+SQLite) and the plan is checked for:
+
+    scan     a table read end to end instead of through an index
+    partial  an index used for some of the equality filters on a table while
+             further equality filters on the same table are applied row by row
+    sort     ORDER BY satisfied with a temporary sort instead of an index
+
+For scans and partial index use the columns the statement filters that table
+on are suggested as a composite index, equality columns first.
+"""
+import re
+
+from django.db import connection
+
+ALIAS = re.compile(r'"(\w+)" ([TU]\d+)\b')
+SQLITE_SCAN = re.compile(r'^SCAN (\w+)(.*)$')
+SQLITE_SEARCH = re.compile(r'^SEARCH (\w+) USING (?:COVERING )?INDEX \w+ \((.*)\)$')
+SQLITE_SORT = re.compile(r'USE TEMP B-TREE FOR (?:RIGHT PART OF )?ORDER BY')
+POSTGRES_SCAN = re.compile(r'Seq Scan on (\w+)(?: (\w+))?')
+POSTGRES_SORT = re.compile(r'^\s*(?:->\s*)?Sort\b')
+EQUALITY_OPERATORS = ('=', 'IN', 'IS')
+
+
+def explain(sql, params):
+    """Plan lines for a statement on the default database."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[3] for row in cursor.fetchall()]
+        cursor.execute(f'EXPLAIN {sql}', params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def filter_columns(sql, table):
+    """
+    Columns of table that the statement compares against a value or another
+    column, as (column, operator) pairs in order of appearance.
+    """
+    names = [table] + [alias for name, alias in ALIAS.findall(sql) if name == table]
+    columns = []
+    for name in names:
+        pattern = re.compile(rf'"?{name}"?\."(\w+)"\s*(=|IN\b|IS\b|<=|>=|<|>|LIKE\b)', re.IGNORECASE)
+        for column, operator in pattern.findall(sql):
+            pair = (column, operator.upper())
+            if pair not in columns:
+                columns.append(pair)
+    return columns
+
+
+def suggest_index(sql, table, exclude=()):
+    """Equality columns first, then range columns; None if there is nothing to index."""
+    columns = filter_columns(sql, table)
+    equality = [column for column, operator in columns if operator in EQUALITY_OPERATORS]
+    ranges = [column for column, operator in columns if operator not in EQUALITY_OPERATORS]
+    suggestion = []
+    for column in equality + ranges:
+        if column not in suggestion and column not in exclude:
+            suggestion.append(column)
+    return suggestion or None
+
+
+def _resolve(sql, name):
+    """Map a Django join alias (T3, U1) in a plan back to its table name."""
+    for table, alias in ALIAS.findall(sql):
+        if alias == name:
+            return table
+    return name
+
+
+def analyse(sql, plan):
+    """Findings for one statement: dicts with kind, table and suggested columns."""
+    tables = set(connection.introspection.table_names())
+    findings = []
+    for line in plan:
+        detail = line.strip()
+        if connection.vendor == 'sqlite':
+            scan = SQLITE_SCAN.match(detail)
+            search = SQLITE_SEARCH.match(detail)
+            if scan and 'USING' not in scan.group(2):
+                table = _resolve(sql, scan.group(1))
+                if table not in tables:
+                    continue  # derived table or CTE
+                findings.append({'kind': 'scan', 'table': table, 'columns': suggest_index(sql, table)})
+            elif search:
+                table = _resolve(sql, search.group(1))
+                used = re.findall(r'(\w+)[=<>]', search.group(2))
+                extra = [column for column, operator in filter_columns(sql, table)
+                         if operator in EQUALITY_OPERATORS and column not in used]
+                if extra:
+                    findings.append({'kind': 'partial', 'table': table, 'columns': used + extra})
+            elif SQLITE_SORT.search(detail):
+                findings.append({'kind': 'sort', 'table': None, 'columns': None})
+        else:
+            scan = POSTGRES_SCAN.search(detail)
+            if scan and scan.group(1) in tables:
+                table = scan.group(1)
+                findings.append({'kind': 'scan', 'table': table, 'columns': suggest_index(sql, table)})
+            elif POSTGRES_SORT.match(detail):
+                findings.append({'kind': 'sort', 'table': None, 'columns': None})
+    return findings
+
+
+def existing_indexes(table):
+    """Column lists of the indexes on a table, primary key included."""
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    return [
+        constraint['columns']
+        for constraint in constraints.values()
+        if constraint['index'] or constraint['primary_key'] or constraint['unique']
+    ]
+
+
+def table_rows(table):
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+        return cursor.fetchone()[0]
+
+
+def is_covered(columns, indexes):
+    """True when an existing index starts with the suggested columns, in any order."""
+    return any(set(index[:len(columns)]) == set(columns) for index in indexes)
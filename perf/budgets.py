@@ -0,0 +1,18 @@
+# perf/budgets.py
+"""
+Query budgets for hot views, keyed by URL name.
+
+Each budget is the most queries one request to the view may run against the
+school seeded by bench_views. bench_views fails when a view goes over, and
+QueryInstrumentationMiddleware logs a warning for any request that does.
+Lower a budget whenever a view gets cheaper so regressions are caught.
+"""
+
+QUERY_BUDGETS = {
+    'exams:stream_results': 13,
+    'school:exam_merit_list': 8,
+    'school:department_dashboard': 8,
+    'accounts:teacher_dashboard': 11,
+    'school:school_dashboard': 13,
+    'exams:my_classes_exam_management': 11,
+}
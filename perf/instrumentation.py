@@ -0,0 +1,194 @@
+# perf/instrumentation.py
+"""
+Per-request query and timing capture.
+
+QueryInstrumentationMiddleware records the resolved view name, SQL query
+count, time spent in the database, time spent rendering templates, total
+time and dashboard cache hits and misses of every request into a
+fixed-size, per-process ring buffer. The buffer
+is read back by bench_views; with PERF_CAPTURE_SQL enabled each record also
+keeps the statements that were run, and with PERF_QUERY_LOG set they are
+appended to that file as JSON lines for index_advisor to replay.
+
+Settings:
+    PERF_RING_BUFFER_SIZE  records kept per process (default 500)
+    PERF_CAPTURE_SQL       keep the SQL and parameters of each query (default False)
+    PERF_QUERY_LOG         file to append captured queries to (default None)
+"""
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.template.base import Template
+
+from exams import dashboard_cache
+
+from .budgets import QUERY_BUDGETS
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_lock = threading.Lock()
+_buffer = deque(maxlen=getattr(settings, 'PERF_RING_BUFFER_SIZE', 500))
+_render_timer_installed = False
+
+
+class RequestRecorder:
+    """Collects query and render timings for one request."""
+
+    def __init__(self, capture_sql=False):
+        self.capture_sql = capture_sql
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.rendering = False
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            if self.capture_sql and not many:
+                self.statements.append((sql, _loggable_params(params)))
+
+
+def _loggable_params(params):
+    """Query parameters as JSON-safe values, so a logged query can be replayed."""
+    if params is None:
+        return []
+    return [value if value is None or isinstance(value, (bool, int, float, str)) else str(value) for value in params]
+
+
+def _install_render_timer():
+    """
+    Time the outermost Template.render call of the current request. Nested
+    renders ({% include %}, inclusion tags) are counted in their parent.
+    """
+    global _render_timer_installed
+    if _render_timer_installed:
+        return
+    original_render = Template.render
+
+    def timed_render(self, context):
+        recorder = getattr(_local, 'recorder', None)
+        if recorder is None or recorder.rendering:
+            return original_render(self, context)
+        recorder.rendering = True
+        started = time.perf_counter()
+        try:
+            return original_render(self, context)
+        finally:
+            recorder.render_time += time.perf_counter() - started
+            recorder.rendering = False
+
+    Template.render = timed_render
+    _render_timer_installed = True
+
+
+class QueryInstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.query_log = getattr(settings, 'PERF_QUERY_LOG', None)
+        self.capture_sql = getattr(settings, 'PERF_CAPTURE_SQL', False) or bool(self.query_log)
+        _install_render_timer()
+
+    def __call__(self, request):
+        recorder = RequestRecorder(capture_sql=self.capture_sql)
+        _local.recorder = recorder
+        started = time.perf_counter()
+        hits_before, misses_before = dashboard_cache.thread_counts()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(recorder))
+                response = self.get_response(request)
+        finally:
+            _local.recorder = None
+        total_time = time.perf_counter() - started
+        hits, misses = dashboard_cache.thread_counts()
+
+        match = request.resolver_match
+        view = match.view_name if match else request.path
+        record = {
+            'view': view,
+            'path': request.path,
+            'method': request.method,
+            'status': response.status_code,
+            'queries': recorder.queries,
+            'db_ms': round(recorder.db_time * 1000, 2),
+            'render_ms': round(recorder.render_time * 1000, 2),
+            'total_ms': round(total_time * 1000, 2),
+            'cache_hits': hits - hits_before,
+            'cache_misses': misses - misses_before,
+            'sql': recorder.statements,
+        }
+        with _lock:
+            _buffer.append(record)
+            if self.query_log and recorder.statements:
+                self._write_query_log(view, recorder.statements)
+
+        budget = QUERY_BUDGETS.get(view)
+        if budget is not None and recorder.queries > budget:
+            logger.warning(f"{view} ran {recorder.queries} queries (budget {budget}) for {request.path}")
+
+        if settings.DEBUG:
+            response['Server-Timing'] = (
+                f"db;dur={record['db_ms']};desc=\"{recorder.queries} queries\", "
+                f"render;dur={record['render_ms']}, total;dur={record['total_ms']}, "
+                f"cache;desc=\"{record['cache_hits']} hits, {record['cache_misses']} misses\""
+            )
+        return response
+
+    def _write_query_log(self, view, statements):
+        with open(self.query_log, 'a') as log:
+            for sql, params in statements:
+                log.write(json.dumps({'view': view, 'sql': sql, 'params': params}) + '\n')
+
+
+# Ring buffer access
+#----------------------------------------------------------------------
+def recent(view=None):
+    """Records currently in the buffer, oldest first, optionally for one view."""
+    with _lock:
+        records = list(_buffer)
+    if view is not None:
+        records = [record for record in records if record['view'] == view]
+    return records
+
+
+def clear():
+    with _lock:
+        _buffer.clear()
+
+
+def summarize(records):
+    """Per-view count, worst query count and median/max timings."""
+    by_view = {}
+    for record in records:
+        by_view.setdefault(record['view'], []).append(record)
+
+    summary = {}
+    for view, rows in by_view.items():
+        def median(key):
+            values = sorted(row[key] for row in rows)
+            return values[len(values) // 2]
+
+        summary[view] = {
+            'requests': len(rows),
+            'queries': max(row['queries'] for row in rows),
+            'db_ms': median('db_ms'),
+            'render_ms': median('render_ms'),
+            'total_ms': median('total_ms'),
+            'max_total_ms': max(row['total_ms'] for row in rows),
+            'cache_hits': sum(row['cache_hits'] for row in rows),
+            'cache_misses': sum(row['cache_misses'] for row in rows),
+        }
+    return summary
@@ -0,0 +1,142 @@
+import random
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+
+from exams.models import Exam, ExamResult, PaperResult, StudentExamSummary
+from exams.result_writer import PaperResultWriter
+from perf import scenario
+from students.models import Student
+from subjects.models import SubjectPaper
+
+WRITE_EXAM = 'END TERM EXAM'  # created by create_exams but left without results
+
+
+class Command(BaseCommand):
+    help = ('Simulate several teachers saving a class list of marks at the same moment, row by row and through '
+            'the batched PaperResultWriter, with and without the SQLite tuning from settings')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=400, help='Approximate number of students to seed')
+        parser.add_argument('--teachers', type=int, default=8, help='Teachers saving marks concurrently')
+
+    def handle(self, *args, **options):
+        with scenario.throwaway_database(on_disk=True):
+            scenario.seed_school(options['students'], self.stdout)
+            exam = Exam.objects.filter(name=WRITE_EXAM).order_by('form_level').first()
+            if exam is None:
+                raise CommandError(f'No {WRITE_EXAM} was seeded')
+            assignments = self.assignments(exam, options['teachers'])
+            results = self.run_profiles(exam, assignments)
+
+        self.report(results)
+
+    def assignments(self, exam, teachers):
+        """One (stream students, paper) class list per teacher, spread over streams first."""
+        students = Student.objects.filter(school=exam.school, form_level_id=exam.form_level).order_by('stream', 'id')
+        by_stream = {}
+        for student in students:
+            by_stream.setdefault(student.stream, []).append(student)
+        streams = list(by_stream.values())
+        papers = list(SubjectPaper.objects.filter(subject__school=exam.school).order_by('id')[:teachers])
+        if not streams or not papers:
+            raise CommandError('The seeded school has no students or subject papers for this exam')
+        return [(streams[i % len(streams)], papers[(i // len(streams)) % len(papers)]) for i in range(teachers)]
+
+    # Runs
+    #----------------------------------------------------------------------
+    def run_profiles(self, exam, assignments):
+        options = connection.settings_dict['OPTIONS']
+        if connection.vendor == 'sqlite':
+            profiles = [('untuned', {}), ('tuned', dict(options))]
+        else:
+            profiles = [(connection.vendor, dict(options))]
+
+        results = []
+        try:
+            for profile, profile_options in profiles:
+                self.use_options(profile_options)
+                for writer_name, save in (('row by row', self.save_row_by_row), ('batched', self.save_batched)):
+                    self.reset(exam)
+                    results.append((profile, writer_name) + self.run_teachers(exam, assignments, save))
+        finally:
+            self.use_options(options)
+        return results
+
+    def use_options(self, options):
+        """Reconnect with the given OPTIONS; other threads pick them up when they connect."""
+        connection.close()
+        connection.settings_dict['OPTIONS'] = options
+        if connection.vendor == 'sqlite' and 'init_command' not in options:
+            # journal_mode is stored in the database file, so WAL has to be switched off explicitly
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode=DELETE')
+
+    def reset(self, exam):
+        PaperResult.objects.filter(exam=exam).delete()
+        ExamResult.objects.filter(exam=exam).delete()
+        StudentExamSummary.objects.filter(exam=exam).delete()
+
+    def run_teachers(self, exam, assignments, save):
+        latencies = []
+        failures = []
+        barrier = threading.Barrier(len(assignments))
+
+        def teacher(students, paper):
+            try:
+                barrier.wait()
+                started = time.perf_counter()
+                try:
+                    save(exam, students, paper)
+                except OperationalError as e:
+                    failures.append(str(e))
+                else:
+                    latencies.append(time.perf_counter() - started)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=teacher, args=assignment) for assignment in assignments]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        rows = PaperResult.objects.filter(exam=exam).count()
+        return rows, elapsed, sorted(latencies), failures
+
+    # Write methods, as a mark entry view would call them
+    #----------------------------------------------------------------------
+    def save_row_by_row(self, exam, students, paper):
+        with transaction.atomic():
+            for student in students:
+                PaperResult.objects.update_or_create(
+                    exam=exam, student=student, subject_paper=paper,
+                    defaults={'marks': random.randint(0, paper.max_marks)},
+                )
+
+    def save_batched(self, exam, students, paper):
+        writer = PaperResultWriter(exam)
+        for student in students:
+            writer.add(student, paper, random.randint(0, paper.max_marks))
+        writer.flush()
+
+    def report(self, results):
+        self.stdout.write(
+            f"\n{'Profile':<10}{'Writer':<12}{'Rows':>7}{'Seconds':>9}{'Rows/sec':>10}"
+            f"{'p50 ms':>9}{'Max ms':>9}{'Failed':>8}"
+        )
+        for profile, writer_name, rows, elapsed, latencies, failures in results:
+            p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0
+            worst = latencies[-1] * 1000 if latencies else 0
+            line = (
+                f'{profile:<10}{writer_name:<12}{rows:>7}{elapsed:>9.2f}{rows / elapsed:>10.0f}'
+                f'{p50:>9.0f}{worst:>9.0f}{len(failures):>8}'
+            )
+            self.stdout.write(self.style.ERROR(line) if failures else line)
+        for profile, writer_name, rows, elapsed, latencies, failures in results:
+            for failure in sorted(set(failures)):
+                self.stdout.write(f'{profile}/{writer_name}: {failures.count(failure)} x {failure}')
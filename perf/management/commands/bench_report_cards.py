@@ -0,0 +1,77 @@
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from exams.models import Exam
+from perf import scenario
+from reports import pdf_resources
+from reports.report_cards import ReportCardBatch, render_card
+
+
+class Command(BaseCommand):
+    help = ('Time rendering report cards, one at a time and as a batch, with styles, fonts and the school logo '
+            'rebuilt for every card (cold) and taken from the per-process cache (cached)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=400, help='Approximate number of students to seed')
+        parser.add_argument('--cards', type=int, default=100, help='Cards in the batch case')
+        parser.add_argument('--repeat', type=int, default=20, help='Renders of the single card case')
+        parser.add_argument('--logo-size', type=int, default=1200, help='Pixel size of the generated school logo')
+
+    def handle(self, *args, **options):
+        with scenario.throwaway_database(), tempfile.TemporaryDirectory() as directory:
+            scenario.seed_school(options['students'], self.stdout)
+            exam = Exam.objects.filter(name=scenario.BENCH_EXAM).select_related('school').order_by('form_level').first()
+            if exam is None:
+                raise CommandError(f'No {scenario.BENCH_EXAM} was seeded')
+            cards = ReportCardBatch(exam, workers=1).load().cards[:options['cards']]
+            if not cards:
+                raise CommandError('The seeded exam has no report cards')
+            self.use_logo(cards, os.path.join(directory, 'logo.png'), options['logo_size'])
+
+            results = []
+            for mode in ('cold', 'cached'):
+                results.append(('single', mode) + self.run_cards(cards[:1] * options['repeat'], mode))
+            for mode in ('cold', 'cached'):
+                results.append(('batch', mode) + self.run_cards(cards, mode))
+
+        self.report(results)
+
+    def use_logo(self, cards, path, size):
+        """Give the school a large photographic logo, as schools tend to upload."""
+        from PIL import Image
+
+        Image.effect_mandelbrot((size, size), (-2, -1.5, 1, 1.5), 100).convert('RGB').save(path)
+        for card in cards:
+            card['school'].update(logo_path=path, logo_version=os.path.getmtime(path))
+
+    def run_cards(self, cards, mode):
+        pdf_resources.clear()
+        if mode == 'cached':
+            school = cards[0]['school']
+            pdf_resources.warm(school['id'], school['logo_path'], school['logo_version'])
+
+        latencies = []
+        pages = 0
+        for card in cards:
+            if mode == 'cold':
+                pdf_resources.clear()
+            started = time.perf_counter()
+            pdf, card_pages = render_card(card)
+            latencies.append(time.perf_counter() - started)
+            pages += card_pages
+        return len(cards), pages, sorted(latencies)
+
+    def report(self, results):
+        self.stdout.write(f"\n{'Case':<8}{'Mode':<8}{'Cards':>7}{'Pages':>7}{'p50 ms':>9}{'Max ms':>9}{'Seconds':>9}{'Pages/sec':>11}")
+        for case, mode, cards, pages, latencies in results:
+            elapsed = sum(latencies)
+            self.stdout.write(
+                f'{case:<8}{mode:<8}{cards:>7}{pages:>7}{latencies[len(latencies) // 2] * 1000:>9.1f}'
+                f'{latencies[-1] * 1000:>9.1f}{elapsed:>9.2f}{pages / elapsed:>11.1f}'
+            )
+        totals = {(case, mode): sum(latencies) for case, mode, _, _, latencies in results}
+        for case in ('single', 'batch'):
+            self.stdout.write(f"{case}: {totals[(case, 'cold')] / totals[(case, 'cached')]:.1f}x faster with cached resources")
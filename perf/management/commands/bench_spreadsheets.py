@@ -0,0 +1,176 @@
+import io
+import random
+import time
+import tracemalloc
+
+import pandas as pd
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from openpyxl import load_workbook
+
+from exams.models import Exam
+from exams.utils.spreadsheet import SpreadsheetTemplate
+from perf import scenario
+from students.models import Student
+from subjects.models import Subject
+
+WRITE_EXAM = 'END TERM EXAM'  # created by create_exams but left without results
+
+
+class Command(BaseCommand):
+    help = ('Time generating a mark entry spreadsheet template for one form of a subject, checking that its '
+            'peak memory does not grow with the number of students, and validating a filled-in upload '
+            'row by row and with column operations')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=2000, help='Students in the template form')
+        parser.add_argument('--papers', type=int, default=3, help='Paper sheets in the template')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed generations per size')
+        parser.add_argument('--upload-rows', type=int, default=5000, help='Student rows per sheet of the validated upload')
+        parser.add_argument('--error-rate', type=float, default=0.01, help='Share of upload rows with a mistake')
+
+    def handle(self, *args, **options):
+        with scenario.throwaway_database():
+            scenario.seed_school(scenario.STREAMS_PER_SCHOOL, self.stdout)
+            exam = Exam.objects.filter(name=WRITE_EXAM).select_related('school').order_by('form_level').first()
+            if exam is None:
+                raise CommandError(f'No {WRITE_EXAM} was seeded')
+            subject = (
+                Subject.objects.filter(school=exam.school)
+                .annotate(paper_count=Count('papers')).filter(paper_count__gte=options['papers'])
+                .first()
+            )
+            if subject is None:
+                raise CommandError(f"No seeded subject has {options['papers']} papers")
+            papers = list(subject.papers.order_by('paper_number')[:options['papers']])
+
+            results = []
+            for size in sorted({max(1, options['students'] // 4), options['students']}):
+                self.fill_form(exam, subject, size)
+                results.append(self.run_generation(exam, subject, papers, size, options['repeat']))
+
+            self.fill_form(exam, subject, options['upload_rows'])
+            upload = self.filled_upload(exam, subject, papers, options['error_rate'])
+            validations = self.run_validation(exam, subject, papers, upload)
+
+        self.report(results)
+        self.report_validation(validations)
+
+    def fill_form(self, exam, subject, size):
+        """Top the exam's form up to size students enrolled in subject."""
+        students = Student.objects.filter(school=exam.school, form_level_id=exam.form_level, subjects=subject)
+        missing = size - students.count()
+        if missing <= 0:
+            return
+        created = Student.objects.bulk_create([
+            Student(
+                school=exam.school, form_level_id=exam.form_level, stream=f'S{n % 4}',
+                name=f'Bench Student {n}', admission_number=f'B{exam.form_level}{n:06d}',
+            )
+            for n in range(students.count(), size)
+        ])
+        Student.subjects.through.objects.bulk_create([
+            Student.subjects.through(student_id=student.id, subject_id=subject.id) for student in created
+        ])
+
+    def run_generation(self, exam, subject, papers, size, repeat):
+        def generate():
+            output = io.BytesIO()
+            SpreadsheetTemplate(exam, subject, papers).generate_template().save(output)
+            return output.getbuffer().nbytes
+
+        generate()  # warm up imports and query compilation
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            nbytes = generate()
+            timings.append(time.perf_counter() - started)
+
+        tracemalloc.start()
+        try:
+            generate()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return size, len(papers), min(timings), peak, nbytes
+
+    # Validation
+    #----------------------------------------------------------------------
+    def filled_upload(self, exam, subject, papers, error_rate):
+        """A template for the whole form with marks entered, and a mistake in error_rate of the rows."""
+        template = io.BytesIO()
+        SpreadsheetTemplate(exam, subject, papers).generate_template().save(template)
+        workbook = load_workbook(io.BytesIO(template.getvalue()))
+        mistakes = [
+            lambda ws, row: ws.cell(row, 4, 999),
+            lambda ws, row: ws.cell(row, 5, 'X'),
+            lambda ws, row: ws.cell(row, 1, 'UNKNOWN'),
+            lambda ws, row: ws.cell(row, 2, 'Someone Else'),
+        ]
+        for ws in workbook.worksheets[1:]:
+            for row in range(3, ws.max_row + 1):
+                ws.cell(row, 4, random.randint(0, 60))
+                ws.cell(row, 5, 'P')
+                if random.random() < error_rate:
+                    random.choice(mistakes)(ws, row)
+        upload = io.BytesIO()
+        workbook.save(upload)
+        return upload.getvalue()
+
+    def run_validation(self, exam, subject, papers, upload):
+        template = SpreadsheetTemplate(exam, subject, papers)
+        started = time.perf_counter()
+        sheets = template._read_sheets(io.BytesIO(upload))
+        read_seconds = time.perf_counter() - started
+        rows = sum(len(df) for df, _ in sheets.values())
+
+        results = []
+        for name, validate in (('row by row', self.validate_row_by_row), ('vectorized', self.validate_vectorized)):
+            started = time.perf_counter()
+            errors = validate(template, sheets)
+            results.append((name, len(sheets), rows, time.perf_counter() - started, len(errors)))
+        return read_seconds, results
+
+    def validate_vectorized(self, template, sheets):
+        template.validation_errors = []
+        template._validate_sheets(sheets)
+        return template.validation_errors
+
+    def validate_row_by_row(self, template, sheets):
+        """The checks as SpreadsheetTemplate made them before: one iterrows pass and one query per row."""
+        errors = []
+        for sheet_name, (df, metadata) in sheets.items():
+            for idx, row in df.iterrows():
+                if pd.notna(row['Status']) and row['Status'] not in ['P', 'A', 'D']:
+                    errors.append(f"Invalid status '{row['Status']}' in {sheet_name} row {idx + 3}")
+                if row['Status'] == 'P':
+                    if pd.isna(row['Marks']) or not 0 <= row['Marks'] <= float(metadata.get('max_marks', 100)):
+                        errors.append(f"Invalid marks '{row['Marks']}' in {sheet_name} row {idx + 3}")
+                elif pd.notna(row['Marks']):
+                    errors.append(f"Marks should not be entered in {sheet_name} row {idx + 3}")
+                try:
+                    student = Student.objects.get(admission_number=row['Admission Number'])
+                    if student.name != row['Student Name'] or (student.stream or '') != row['Stream']:
+                        errors.append(f"Student information mismatch in {sheet_name} row {idx + 3}")
+                except Student.DoesNotExist:
+                    errors.append(f"Invalid admission number '{row['Admission Number']}' in {sheet_name} row {idx + 3}")
+            duplicates = df['Admission Number'].duplicated()
+            if duplicates.any():
+                errors.append(f"Sheet '{sheet_name}' has duplicate entries")
+        return errors
+
+    def report(self, results):
+        self.stdout.write(f"\n{'Students':>9}{'Papers':>8}{'Seconds':>9}{'Rows/sec':>10}{'Peak MB':>9}{'File KB':>9}")
+        for size, papers, seconds, peak, nbytes in results:
+            self.stdout.write(
+                f'{size:>9}{papers:>8}{seconds:>9.3f}{size * papers / seconds:>10.0f}'
+                f'{peak / 2 ** 20:>9.1f}{nbytes / 2 ** 10:>9.0f}'
+            )
+
+    def report_validation(self, validations):
+        read_seconds, results = validations
+        self.stdout.write(f'\nUpload read in {read_seconds:.2f}s')
+        self.stdout.write(f"{'Validator':<12}{'Sheets':>7}{'Rows':>7}{'Seconds':>9}{'Rows/sec':>10}{'Errors':>8}")
+        for name, sheets, rows, seconds, errors in results:
+            self.stdout.write(f'{name:<12}{sheets:>7}{rows:>7}{seconds:>9.3f}{rows / seconds:>10.0f}{errors:>8}')
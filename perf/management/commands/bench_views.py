@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from perf import instrumentation, scenario
+from perf.budgets import QUERY_BUDGETS
+
+
+class Command(BaseCommand):
+    help = 'Seed a realistic school in a throwaway database and check hot views against their query budgets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=2000, help='Approximate number of students to seed')
+        parser.add_argument('--repeat', type=int, default=5, help='Measured requests per view')
+
+    def handle(self, *args, **options):
+        with scenario.throwaway_database():
+            scenario.seed_school(options['students'], self.stdout)
+            results = self.run_views(options['repeat'])
+
+        self.report(results)
+
+    def run_views(self, repeat):
+        client_for = scenario.logged_in_clients()
+        results = []
+        for username, name, url in scenario.bench_requests():
+            client = client_for(username)
+
+            # The first request warms per-process caches (grading tables, rank indexes)
+            response = client.get(url)
+            if response.status_code != 200:
+                raise CommandError(f'{name} returned {response.status_code} for {url}')
+
+            instrumentation.clear()
+            for _ in range(repeat):
+                client.get(url)
+            summary = instrumentation.summarize(instrumentation.recent(name)).get(name)
+            if summary is None:
+                raise CommandError('No requests were recorded; is QueryInstrumentationMiddleware installed?')
+            summary['budget'] = QUERY_BUDGETS.get(name)
+            results.append((name, summary))
+        return results
+
+    def report(self, results):
+        self.stdout.write(
+            f"\n{'View':<36}{'Queries':>9}{'Budget':>8}{'DB ms':>9}{'Render ms':>11}{'Total ms':>10}"
+            f"{'Cache hit/miss':>16}"
+        )
+        over_budget = []
+        for name, summary in results:
+            budget = summary['budget']
+            line = (
+                f"{name:<36}{summary['queries']:>9}{budget if budget is not None else '-':>8}"
+                f"{summary['db_ms']:>9.1f}{summary['render_ms']:>11.1f}{summary['total_ms']:>10.1f}"
+                f"{str(summary['cache_hits']) + '/' + str(summary['cache_misses']):>16}"
+            )
+            if budget is not None and summary['queries'] > budget:
+                over_budget.append(name)
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+
+        if over_budget:
+            raise CommandError(f"Over query budget: {', '.join(over_budget)}")
+        self.stdout.write(self.style.SUCCESS('All views within their query budgets'))
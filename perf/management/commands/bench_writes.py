@@ -0,0 +1,88 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from exams.bulk_writes import upsert
+from exams.incremental import suspend_incremental_updates
+from exams.models import Exam, PaperResult
+from perf import scenario
+from students.models import Student
+from subjects.models import SubjectPaper
+
+WRITE_EXAM = 'END TERM EXAM'  # created by create_exams but left without results
+
+
+class Command(BaseCommand):
+    help = ('Time writing a whole exam of paper marks row by row, with bulk_create and with the importer '
+            'upsert (COPY on PostgreSQL); run once per database profile to compare backends')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=400, help='Approximate number of students to seed')
+        parser.add_argument('--papers', type=int, default=10, help='Subject papers written per student')
+
+    def handle(self, *args, **options):
+        with scenario.throwaway_database():
+            scenario.seed_school(options['students'], self.stdout)
+            exam = Exam.objects.filter(name=WRITE_EXAM).order_by('form_level').first()
+            if exam is None:
+                raise CommandError(f'No {WRITE_EXAM} was seeded')
+            students = list(Student.objects.filter(school=exam.school, form_level_id=exam.form_level))
+            papers = list(SubjectPaper.objects.filter(subject__school=exam.school)[:options['papers']])
+            results = self.run_methods(exam, students, papers)
+
+        self.report(results)
+
+    def run_methods(self, exam, students, papers):
+        methods = [
+            ('update_or_create', self.write_row_by_row),
+            ('bulk_create', self.write_bulk_create),
+            ('upsert', self.write_upsert),
+        ]
+        results = []
+        for name, write in methods:
+            PaperResult.objects.filter(exam=exam).delete()
+            for phase in ('insert', 'update'):
+                rows = self.marks(exam, students, papers)
+                started = time.perf_counter()
+                with suspend_incremental_updates():
+                    write(exam, rows)
+                elapsed = time.perf_counter() - started
+                if PaperResult.objects.filter(exam=exam).count() != len(rows):
+                    raise CommandError(f'{name} {phase} wrote the wrong number of rows')
+                results.append((name, phase, len(rows), elapsed))
+        return results
+
+    def marks(self, exam, students, papers):
+        return [
+            PaperResult(exam=exam, student=student, subject_paper=paper, marks=random.randint(0, paper.max_marks))
+            for student in students
+            for paper in papers
+        ]
+
+    # Write methods
+    #----------------------------------------------------------------------
+    def write_row_by_row(self, exam, rows):
+        with transaction.atomic():
+            for row in rows:
+                PaperResult.objects.update_or_create(
+                    exam=exam, student=row.student, subject_paper=row.subject_paper,
+                    defaults={'marks': row.marks},
+                )
+
+    def write_bulk_create(self, exam, rows):
+        with transaction.atomic():
+            PaperResult.objects.bulk_create(
+                rows, batch_size=1000, update_conflicts=True,
+                unique_fields=['exam', 'student', 'subject_paper'], update_fields=['marks'],
+            )
+
+    def write_upsert(self, exam, rows):
+        upsert(PaperResult, rows, unique_fields=['exam', 'student', 'subject_paper'], update_fields=['marks'])
+
+    def report(self, results):
+        self.stdout.write(f'\nBackend: {connection.vendor}')
+        self.stdout.write(f"{'Method':<20}{'Phase':<8}{'Rows':>8}{'Seconds':>10}{'Rows/sec':>12}")
+        for name, phase, rows, elapsed in results:
+            self.stdout.write(f'{name:<20}{phase:<8}{rows:>8}{elapsed:>10.3f}{rows / elapsed:>12.0f}')
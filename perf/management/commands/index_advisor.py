@@ -0,0 +1,101 @@
+import json
+from collections import OrderedDict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from perf import advisor, instrumentation, scenario
+
+
+class Command(BaseCommand):
+    help = 'Replay captured queries under EXPLAIN and report table scans and missing indexes per view'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', help='Query log written by QueryInstrumentationMiddleware (PERF_QUERY_LOG) '
+                                          'to replay against this database')
+        parser.add_argument('--students', type=int, default=2000,
+                            help='Without --log: size of the benchmark school to seed and capture')
+        parser.add_argument('--min-rows', type=int, default=500,
+                            help='Ignore scans of tables with fewer rows than this')
+
+    def handle(self, *args, **options):
+        self.min_rows = options['min_rows']
+        if options['log']:
+            self.report(self.read_log(options['log']))
+            return
+
+        with scenario.throwaway_database():
+            scenario.seed_school(options['students'], self.stdout)
+            # Give the planner real statistics for the seeded tables
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            self.report(self.capture_bench_views())
+
+    # Statement sources
+    #----------------------------------------------------------------------
+    def read_log(self, path):
+        statements = OrderedDict()
+        try:
+            with open(path) as log:
+                for line in log:
+                    entry = json.loads(line)
+                    statements.setdefault((entry['view'], entry['sql']), entry['params'])
+        except OSError as e:
+            raise CommandError(f'Cannot read query log: {e}')
+        return statements
+
+    def capture_bench_views(self):
+        statements = OrderedDict()
+        instrumentation.clear()
+        with override_settings(PERF_CAPTURE_SQL=True):
+            client_for = scenario.logged_in_clients()
+            for username, name, url in scenario.bench_requests():
+                client_for(username).get(url)
+        for record in instrumentation.recent():
+            for sql, params in record['sql']:
+                statements.setdefault((record['view'], sql), params)
+        return statements
+
+    # Report
+    #----------------------------------------------------------------------
+    def report(self, statements):
+        rows = {}
+        indexes = {}
+        by_view = OrderedDict()
+        for (view, sql), params in statements.items():
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            findings = by_view.setdefault(view, {'statements': 0, 'issues': OrderedDict()})
+            findings['statements'] += 1
+            for finding in advisor.analyse(sql, advisor.explain(sql, params)):
+                table = finding['table']
+                if table is not None:
+                    if table not in rows:
+                        rows[table] = advisor.table_rows(table)
+                        indexes[table] = advisor.existing_indexes(table)
+                    if rows[table] < self.min_rows:
+                        continue
+                key = (finding['kind'], table, tuple(finding['columns'] or ()))
+                findings['issues'][key] = findings['issues'].get(key, 0) + 1
+
+        for view, findings in by_view.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n{view} ({findings['statements']} SELECT statements)"))
+            if not findings['issues']:
+                self.stdout.write('  no scans or sorts')
+                continue
+            for (kind, table, columns), count in findings['issues'].items():
+                self.stdout.write(f'  {self.describe(kind, table, list(columns), rows, indexes)}  x{count}')
+
+    def describe(self, kind, table, columns, rows, indexes):
+        if kind == 'sort':
+            return 'ORDER BY sorted in a temporary structure'
+        where = f'{table} ({rows[table]} rows)'
+        if not columns:
+            return f'{kind} of {where} with no filter columns'
+        if advisor.is_covered(columns, indexes[table]):
+            advice = f'index on ({", ".join(columns)}) exists but was not used'
+        else:
+            advice = self.style.WARNING(f'missing index on ({", ".join(columns)})')
+        label = 'full scan' if kind == 'scan' else 'partial index use'
+        return f'{label} of {where}: {advice}'
@@ -0,0 +1,102 @@
+# perf/scenario.py
+"""
+The benchmark school shared by bench_views and index_advisor.
+
+throwaway_database() swaps the default connection onto a fresh test
+database for the duration of a block; seed_school() fills it through the
+existing population commands; bench_requests() lists the hot views to hit
+and the user to hit them as.
+"""
+import io
+import math
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth.models import Permission
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from accounts.models import CustomUser, TeacherClass
+from exams.models import Exam
+from school.models import School
+from subjects.models import SubjectCategory
+
+STREAMS_PER_SCHOOL = 16  # populate_complete_data creates 4 forms x 4 streams
+BENCH_EXAM = 'MID YEAR EXAM'
+PRINCIPAL = 'john_doe'
+CLASS_TEACHER = 'amira_amara'
+BENCH_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'perf-bench'}}
+
+
+@contextmanager
+def throwaway_database(on_disk=False):
+    """
+    on_disk keeps a SQLite test database in a file rather than in memory, so
+    that connections from other threads contend for it like separate workers.
+    The cache is swapped for a private local memory cache as well, so that
+    the seeded school never reads or writes a shared cache's entries.
+    """
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    old_test_name = connection.settings_dict['TEST']['NAME']
+    with tempfile.TemporaryDirectory() as directory, override_settings(CACHES=BENCH_CACHES):
+        if on_disk and connection.vendor == 'sqlite':
+            connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'bench.sqlite3')
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            connection.settings_dict['TEST']['NAME'] = old_test_name
+            teardown_test_environment()
+
+
+def seed_school(students, stdout):
+    per_stream = max(1, math.ceil(students / STREAMS_PER_SCHOOL))
+    stdout.write(f'Seeding {per_stream * STREAMS_PER_SCHOOL} students...')
+    started = time.perf_counter()
+
+    call_command('populate_complete_data', students_per_stream=per_stream, stdout=io.StringIO())
+    call_command('create_exams', stdout=io.StringIO())
+    for exam in Exam.objects.filter(name=BENCH_EXAM):
+        call_command('generate_exam_results', exam_id=exam.id, stdout=io.StringIO())
+
+    # stream_results is guarded by a model permission rather than a role
+    principal = CustomUser.objects.get(username=PRINCIPAL)
+    principal.user_permissions.add(Permission.objects.get(codename='view_examresult'))
+
+    stdout.write(f'Seeded in {time.perf_counter() - started:.1f}s')
+
+
+def bench_requests():
+    """(username, url name, url) for each benchmarked view."""
+    school = School.objects.get()
+    klass = TeacherClass.objects.filter(teacher__username=CLASS_TEACHER).first()
+    exam = Exam.objects.get(school=school, name=BENCH_EXAM, form_level=klass.form_level)
+    category = SubjectCategory.objects.filter(school=school).order_by('id').first()
+    return [
+        (PRINCIPAL, 'school:school_dashboard', reverse('school:school_dashboard')),
+        (PRINCIPAL, 'school:exam_merit_list', reverse('school:exam_merit_list', args=[klass.form_level, exam.id])),
+        (PRINCIPAL, 'school:department_dashboard', reverse('school:department_dashboard', args=[category.id])),
+        (PRINCIPAL, 'exams:stream_results', reverse('exams:stream_results', args=[exam.id, klass.form_level, klass.stream])),
+        (CLASS_TEACHER, 'accounts:teacher_dashboard', reverse('accounts:teacher_dashboard')),
+        (CLASS_TEACHER, 'exams:my_classes_exam_management',
+         reverse('exams:my_classes_exam_management') + f'?exam={exam.id}'),
+    ]
+
+
+def logged_in_clients():
+    """A Client per username, created and logged in on first use."""
+    clients = {}
+
+    def client_for(username):
+        if username not in clients:
+            clients[username] = Client()
+            clients[username].force_login(CustomUser.objects.get(username=username))
+        return clients[username]
+    return client_for
@@ -0,0 +1,38 @@
+import io
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from . import scenario
+from .budgets import QUERY_BUDGETS
+
+
+class QueryBudgetTests(TestCase):
+    """Each hot view stays within its budget in perf/budgets.py, on a small seeded school."""
+
+    @classmethod
+    def setUpTestData(cls):
+        scenario.seed_school(scenario.STREAMS_PER_SCHOOL * 2, io.StringIO())
+
+    def setUp(self):
+        cache.clear()
+
+    def test_every_budget_is_benchmarked(self):
+        self.assertEqual({name for _, name, _ in scenario.bench_requests()}, set(QUERY_BUDGETS))
+
+    def test_views_within_budget(self):
+        client_for = scenario.logged_in_clients()
+        for username, name, url in scenario.bench_requests():
+            with self.subTest(view=name):
+                client = client_for(username)
+                # The first request warms per-process caches (grading tables, rank indexes), as in bench_views
+                self.assertEqual(client.get(url).status_code, 200)
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertLessEqual(
+                    len(queries), QUERY_BUDGETS[name],
+                    f"{name} ran {len(queries)} queries:\n" + '\n'.join(q['sql'] for q in queries.captured_queries)
+                )
@@ -0,0 +1,37 @@
+# reports/jobs.py
+"""Background job handlers for report generation (see jobs.registry)."""
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.utils.text import slugify
+
+from exams.models import Exam
+from jobs.registry import register
+from .report_cards import ReportCardBatch
+
+GENERATE_REPORT_CARDS = 'reports.generate_report_cards'
+
+# Cards between progress writes
+PROGRESS_EVERY = 50
+
+
+@register(GENERATE_REPORT_CARDS)
+def generate_report_cards(job):
+    exam = Exam.objects.select_related('school').get(pk=job.payload['exam_id'])
+    fmt = job.payload.get('format', 'zip')
+    stream = job.payload.get('stream')
+    batch = ReportCardBatch(exam, job.payload.get('form_level'), stream).load()
+    job.set_progress(0, len(batch.cards))
+
+    def report_progress(done, total):
+        if done % PROGRESS_EVERY == 0:
+            job.set_progress(done)
+
+    name = f"report_cards/exports/{exam.id}-form{batch.form_number}{'-' + slugify(stream) if stream else ''}.{fmt}"
+    with tempfile.TemporaryFile() as output:
+        stats = batch.write(output, fmt, progress=report_progress)
+        output.seek(0)
+        path = default_storage.save(name, File(output))
+    job.set_progress(len(batch.cards))
+    return {**stats, 'path': path, 'format': fmt}
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from exams.models import Exam
+from reports.report_cards import FORMATS, ReportCardBatch
+
+
+class Command(BaseCommand):
+    help = 'Render the report cards of an exam into a ZIP of PDFs or one merged PDF'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exam', type=int, required=True, help='Exam ID')
+        parser.add_argument('--form', type=int, help='Form level ID (default: the exam form)')
+        parser.add_argument('--stream', help='Only this stream')
+        parser.add_argument('--format', choices=FORMATS, default='zip')
+        parser.add_argument('--workers', type=int, help='Rendering processes (default: CPU count)')
+        parser.add_argument('--output', required=True, help='File to write')
+
+    def handle(self, *args, **options):
+        try:
+            exam = Exam.objects.select_related('school').get(pk=options['exam'])
+        except Exam.DoesNotExist:
+            raise CommandError(f"Exam {options['exam']} does not exist")
+
+        batch = ReportCardBatch(exam, options['form'], options['stream'], workers=options['workers']).load()
+        if not batch.cards:
+            raise CommandError('No students with results in this exam and form')
+
+        with open(options['output'], 'wb') as output:
+            stats = batch.write(output, options['format'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {stats['students']} report cards ({stats['pages']} pages) to {options['output']}: "
+            f"{stats['rendered']} rendered, {stats['reused']} unchanged, "
+            f"{stats['pages_per_second']} pages/sec with {batch.workers} workers"
+        ))
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-17 23:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0005_result_access_indexes'),
+        ('reports', '0002_initial'),
+        ('students', '0002_result_access_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportCardRender',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('pdf', models.FileField(upload_to='report_cards/')),
+                ('pages', models.PositiveIntegerField(default=1)),
+                ('rendered_at', models.DateTimeField(auto_now=True)),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='report_card_renders', to='exams.exam')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='report_card_renders', to='students.student')),
+            ],
+            options={
+                'unique_together': {('exam', 'student')},
+            },
+        ),
+    ]
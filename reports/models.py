@@ -21,3 +21,21 @@ class ReportSettings(models.Model):
     
     def __str__(self):
         return f"Report Settings for {self.school.name}"
+
+class ReportCardRender(models.Model):
+    """
+    The last rendered report card of a student for an exam, with the hash of
+    the data it was rendered from, so unchanged cards are not rendered again.
+    """
+    exam = models.ForeignKey('exams.Exam', on_delete=models.CASCADE, related_name='report_card_renders')
+    student = models.ForeignKey('students.Student', on_delete=models.CASCADE, related_name='report_card_renders')
+    content_hash = models.CharField(max_length=64)
+    pdf = models.FileField(upload_to='report_cards/')
+    pages = models.PositiveIntegerField(default=1)
+    rendered_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('exam', 'student')
+
+    def __str__(self):
+        return f"Report card for {self.student} in {self.exam}"
@@ -0,0 +1,167 @@
+# reports/pdf_resources.py
+"""
+Per-process cache of what the report card layout draws with.
+
+The paragraph and table styles are built once per process and the card
+font, a TrueType face that covers names outside Latin-1, is parsed and
+registered with ReportLab once. School logos are decoded and scaled down to
+their largest printed size once per school, keyed by
+(school_id, logo path, modification time) so that a replaced logo is picked
+up without a restart. ReportCardBatch workers warm the cache in their
+initializer; after that rendering a card only does layout.
+"""
+import os
+import threading
+
+import reportlab
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import Flowable, TableStyle
+
+FONT = 'CardSans'
+FONT_BOLD = 'CardSans-Bold'
+
+# First family found wins; ReportLab ships Bitstream Vera, so the last one always exists
+FONT_FILES = [
+    ('/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf', '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf'),
+    ('/usr/share/fonts/dejavu/DejaVuSans.ttf', '/usr/share/fonts/dejavu/DejaVuSans-Bold.ttf'),
+    tuple(os.path.join(os.path.dirname(reportlab.__file__), 'fonts', name) for name in ('Vera.ttf', 'VeraBd.ttf')),
+]
+
+# Logos are never printed larger than the cover logo
+LOGO_SIZE = 40 * mm
+LOGO_DPI = 200
+
+_lock = threading.RLock()
+_fonts = None     # (regular path, bold path) registered in this process
+_styles = None
+_logos = {}       # school_id -> ((path, mtime), ImageReader)
+
+
+def fonts():
+    """Register the card font family once and return its (regular, bold) files."""
+    global _fonts
+    if _fonts is None:
+        with _lock:
+            if _fonts is None:
+                regular, bold = next(files for files in FONT_FILES if all(os.path.exists(path) for path in files))
+                pdfmetrics.registerFont(TTFont(FONT, regular))
+                pdfmetrics.registerFont(TTFont(FONT_BOLD, bold))
+                pdfmetrics.registerFontFamily(FONT, normal=FONT, bold=FONT_BOLD, italic=FONT, boldItalic=FONT_BOLD)
+                _fonts = (regular, bold)
+    return _fonts
+
+
+def styles():
+    """Paragraph and table styles of the card layout, by name."""
+    global _styles
+    if _styles is None:
+        with _lock:
+            if _styles is None:
+                _styles = _build_styles()
+    return _styles
+
+
+def _build_styles():
+    fonts()
+    sample = getSampleStyleSheet()
+    body = ParagraphStyle('CardBody', parent=sample['Normal'], fontName=FONT)
+    info = TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), FONT),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+    ])
+    return {
+        'title': ParagraphStyle('CardTitle', parent=sample['Title'], fontName=FONT_BOLD, fontSize=16, alignment=TA_CENTER, spaceAfter=2),
+        'subtitle': ParagraphStyle('CardSubtitle', parent=body, fontSize=11, alignment=TA_CENTER),
+        'section': ParagraphStyle('CardSection', parent=sample['Heading4'], fontName=FONT_BOLD, spaceBefore=8, spaceAfter=4),
+        'body': body,
+        'details': info,
+        'summary': info,
+        'subjects': TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), FONT),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f2f2f2')),
+            ('FONTNAME', (0, 0), (-1, 0), FONT_BOLD),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#dddddd')),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ]),
+        'fees': TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), FONT),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#dddddd')),
+        ]),
+        'signatures': TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), FONT),
+            ('LINEABOVE', (0, 1), (-1, 1), 0.5, colors.black),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ]),
+    }
+
+
+def logo(school_id, path, version=None):
+    """
+    The school's logo as an ImageReader, decoded and scaled once per
+    (path, version). version is the file's modification time, as recorded
+    when the card was loaded; None if it has no logo.
+    """
+    if not path:
+        return None
+    key = (path, version)
+    cached = _logos.get(school_id)
+    if cached is None or cached[0] != key:
+        with _lock:
+            cached = _logos.get(school_id)
+            if cached is None or cached[0] != key:
+                cached = (key, _load_logo(path))
+                _logos[school_id] = cached
+    return cached[1]
+
+
+def _load_logo(path):
+    from PIL import Image as PILImage
+
+    with PILImage.open(path) as image:
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+        largest = round(LOGO_SIZE / 72 * LOGO_DPI)
+        image.thumbnail((largest, largest))
+        return ImageReader(image)
+
+
+class Logo(Flowable):
+    """A cached logo drawn within a size x size box, keeping its aspect ratio."""
+
+    def __init__(self, reader, size):
+        super().__init__()
+        self.reader = reader
+        width, height = reader.getSize()
+        factor = size / max(width, height)
+        self.width, self.height = width * factor, height * factor
+        self.hAlign = 'CENTER'
+
+    def wrap(self, available_width, available_height):
+        return self.width, self.height
+
+    def draw(self):
+        self.canv.drawImage(self.reader, 0, 0, self.width, self.height, mask='auto')
+
+
+def warm(school_id=None, logo_path=None, logo_version=None):
+    """Build the process-wide resources, and a school's logo if given."""
+    styles()
+    logo(school_id, logo_path, logo_version)
+
+
+def clear():
+    """Drop every cached resource; the next card builds them again."""
+    global _fonts, _styles
+    with _lock:
+        _fonts = None
+        _styles = None
+        _logos.clear()
@@ -0,0 +1,507 @@
+# reports/report_cards.py
+"""
+Bulk report card generation for an exam.
+
+ReportCardBatch loads everything the cards of an exam need (summaries,
+positions, subject results, teachers, report settings) in a handful of
+queries through the exam Broadsheet and turns each student into a plain
+dict. The dicts are rendered with ReportLab across a ProcessPoolExecutor and
+each PDF is stored and streamed, in merit order, into one ZIP archive or one
+merged PDF as soon as it is rendered, so a run holds only the cards in flight.
+Styles, fonts and logos come from the per-process cache in pdf_resources.
+
+Every card's data is hashed. A student whose hash matches their stored
+ReportCardRender reuses that PDF instead of being rendered again, so a
+re-run after a few mark corrections only renders the affected students.
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+from django.utils.text import slugify
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table
+
+from accounts.models import CustomUser, TeacherSubject
+from exams.broadsheet import Broadsheet
+from school.models import FormLevel
+from . import pdf_resources
+from .models import ReportCardRender, ReportSettings
+
+logger = logging.getLogger(__name__)
+
+# Part of every content hash; bump it when the card layout changes so that
+# stored cards are rendered again.
+LAYOUT_VERSION = 2
+
+FORMATS = ('zip', 'pdf')
+
+SETTING_FIELDS = [
+    'show_report_cover', 'show_subject_grades', 'show_student_remarks',
+    'show_stream_rank', 'show_overall_rank', 'show_teacher_initials',
+    'show_watermark', 'show_school_fees_layout', 'closing_date',
+    'next_term_begins', 'class_teacher_remarks', 'principal_remarks',
+]
+
+
+class ReportCardBatch:
+    """
+    ReportCardBatch(exam, form_level_id, stream).load().write(output, 'zip')
+    renders the cards of one form (or stream) of an exam into output, a
+    binary file object, and returns the run statistics. Without a
+    form_level_id the exam's own form is used; Exam.form_level is a form
+    number, so load() resolves it to the school's FormLevel.
+    """
+
+    def __init__(self, exam, form_level_id=None, stream=None, workers=None):
+        self.exam = exam
+        self.form_level_id = form_level_id
+        self.form_number = None
+        self.stream = stream
+        self.workers = workers or os.cpu_count() or 1
+        self.cards = []
+        self.renders = {}
+
+    # Loading
+    #----------------------------------------------------------------------
+    def load(self):
+        forms = FormLevel.objects.filter(school_id=self.exam.school_id)
+        form = forms.filter(pk=self.form_level_id) if self.form_level_id else forms.filter(number=self.exam.form_level)
+        self.form_level_id, self.form_number = form.values_list('id', 'number').first() or (None, None)
+        if self.form_level_id is None:
+            return self
+
+        broadsheet = Broadsheet(self.exam, self.form_level_id).build()
+        rows = broadsheet.rows
+        subjects = {subject.id: subject.name for subject in broadsheet.subjects}
+        stream_sizes = {}
+        for row in rows:
+            stream_sizes[row.student.stream] = stream_sizes.get(row.student.stream, 0) + 1
+        if self.stream is not None:
+            rows = [row for row in rows if row.student.stream == self.stream]
+
+        school = self._school()
+        settings = self._settings()
+        initials = self._teacher_initials(rows, subjects)
+
+        for row in rows:
+            student = row.student
+            results = sorted(row.subject_results.values(), key=lambda result: subjects[result.subject_id])
+            card = {
+                'layout': LAYOUT_VERSION,
+                'school': school,
+                'settings': settings,
+                'exam': {'name': self.exam.name, 'year': self.exam.year, 'term': self.exam.term},
+                'student': {
+                    'id': student.id,
+                    'name': student.name,
+                    'admission_number': student.admission_number,
+                    'form': self.form_number,
+                    'stream': student.stream or '',
+                },
+                'subjects': [
+                    {
+                        'name': subjects[result.subject_id],
+                        'marks': result.final_marks,
+                        'grade': result.grade,
+                        'points': result.points,
+                        'comment': result.comment,
+                        'teacher': initials.get((result.subject_id, result.teacher_id), ''),
+                    }
+                    for result in results
+                ],
+                'summary': {
+                    'total_marks': row.total_marks,
+                    'mean_marks': round(row.mean_marks, 2),
+                    'mean_grade': row.mean_grade,
+                    'total_points': row.total_points,
+                    'stream_position': row.stream_position,
+                    'stream_size': stream_sizes[student.stream],
+                    'overall_position': row.overall_position,
+                    'overall_size': len(broadsheet.rows),
+                },
+            }
+            card['hash'] = content_hash(card)
+            self.cards.append(card)
+
+        self.renders = {
+            render.student_id: render
+            for render in ReportCardRender.objects.filter(exam=self.exam, student_id__in=[row.student_id for row in rows])
+        }
+        return self
+
+    def _school(self):
+        school = self.exam.school
+        logo_path = logo_version = None
+        if school.logo and default_storage.exists(school.logo.name):
+            logo_path = school.logo.path
+            logo_version = os.path.getmtime(logo_path)
+        return {
+            'id': school.id,
+            'name': school.name,
+            'address': school.address or '',
+            'phone_number': school.phone_number or '',
+            'email': school.email or '',
+            'logo_path': logo_path,
+            'logo_version': logo_version,
+        }
+
+    def _settings(self):
+        settings = ReportSettings.objects.filter(school_id=self.exam.school_id).first() or ReportSettings()
+        return {field: getattr(settings, field) for field in SETTING_FIELDS}
+
+    def _teacher_initials(self, rows, subjects):
+        """(subject_id, result teacher_id) -> initials, falling back to the subject's assigned teacher."""
+        teacher_ids = {result.teacher_id for row in rows for result in row.subject_results.values() if result.teacher_id}
+        assigned = {}
+        for subject_id, teacher_id in TeacherSubject.objects.filter(subject_id__in=subjects).values_list('subject_id', 'teacher_id'):
+            assigned.setdefault(subject_id, teacher_id)
+        names = {
+            user.id: _initials(user)
+            for user in CustomUser.objects.filter(id__in=teacher_ids | set(assigned.values())).only('id', 'first_name', 'last_name', 'username')
+        }
+        initials = {}
+        for row in rows:
+            for result in row.subject_results.values():
+                teacher_id = result.teacher_id or assigned.get(result.subject_id)
+                initials[(result.subject_id, result.teacher_id)] = names.get(teacher_id, '')
+        return initials
+
+    # Rendering
+    #----------------------------------------------------------------------
+    def write(self, output, fmt='zip', progress=None):
+        """
+        Render the loaded cards into output as a ZIP of PDFs or a single merged
+        PDF. progress(done, total) is called as cards are written.
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown report card format '{fmt}'")
+
+        if fmt == 'zip':
+            archive = zipfile.ZipFile(output, 'w', zipfile.ZIP_STORED)
+        else:
+            from pypdf import PdfWriter
+            archive = PdfWriter()
+
+        # Renders arrive in card order and each is written out as it arrives,
+        # so only the cards still in flight are held in memory
+        stale = [card for card in self.cards if not self._is_current(card)]
+        stale_ids = {card['student']['id'] for card in stale}
+        started = time.perf_counter()
+        rendered = self._render(stale)
+        renders = []
+        pages = rendered_pages = 0
+        render_seconds = 0.0
+        for done, card in enumerate(self.cards, 1):
+            student_id = card['student']['id']
+            if student_id in stale_ids:
+                pdf, card_pages = next(rendered)
+                render_seconds = time.perf_counter() - started
+                renders.append(self._store(card, pdf, card_pages))
+                rendered_pages += card_pages
+            else:
+                render = self.renders[student_id]
+                with default_storage.open(render.pdf.name, 'rb') as stored_pdf:
+                    pdf, card_pages = stored_pdf.read(), render.pages
+            pages += card_pages
+            if fmt == 'zip':
+                archive.writestr(card_filename(card), pdf)
+            else:
+                archive.append(io.BytesIO(pdf))
+            if progress is not None:
+                progress(done, len(self.cards))
+        rendered.close()
+        self._save_renders(renders)
+
+        if fmt == 'zip':
+            archive.close()
+        else:
+            archive.write(output)
+
+        stats = {
+            'students': len(self.cards),
+            'rendered': len(renders),
+            'reused': len(self.cards) - len(renders),
+            'pages': pages,
+            'render_seconds': round(render_seconds, 3),
+            'pages_per_second': round(rendered_pages / render_seconds, 1) if rendered_pages else 0,
+        }
+        logger.info(
+            f"Report cards for {self.exam}: {stats['rendered']} rendered, {stats['reused']} reused, "
+            f"{stats['pages']} pages ({stats['pages_per_second']} pages/sec with {self.workers} workers)"
+        )
+        return stats
+
+    def _is_current(self, card):
+        render = self.renders.get(card['student']['id'])
+        return (
+            render is not None
+            and render.content_hash == card['hash']
+            and default_storage.exists(render.pdf.name)
+        )
+
+    def _render(self, cards):
+        """Yield (pdf bytes, page count) for each card, in order, as the workers finish them."""
+        if not cards:
+            return
+        if self.workers == 1 or len(cards) == 1:
+            yield from map(render_card, cards)
+            return
+
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+        workers = min(self.workers, len(cards))
+        chunksize = max(1, len(cards) // (workers * 4))
+        school = cards[0]['school']
+        initargs = (school['id'], school['logo_path'], school['logo_version'])
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as executor:
+            yield from executor.map(render_card, cards, chunksize=chunksize)
+
+    def _store(self, card, pdf, pages):
+        """Save a newly rendered PDF, replacing the student's older file. Returns the unsaved render."""
+        student_id = card['student']['id']
+        previous = self.renders.get(student_id)
+        if previous is not None and previous.pdf.name:
+            default_storage.delete(previous.pdf.name)
+        name = default_storage.save(
+            f"report_cards/{self.exam.id}/{student_id}-{card['hash'][:12]}.pdf", ContentFile(pdf)
+        )
+        render = ReportCardRender(exam=self.exam, student_id=student_id, content_hash=card['hash'], pdf=name, pages=pages)
+        self.renders[student_id] = render
+        return render
+
+    def _save_renders(self, renders):
+        if renders:
+            ReportCardRender.objects.bulk_create(
+                renders,
+                update_conflicts=True,
+                unique_fields=['exam', 'student'],
+                update_fields=['content_hash', 'pdf', 'pages', 'rendered_at'],
+            )
+
+
+def content_hash(card):
+    payload = json.dumps(card, sort_keys=True, default=str).encode()
+    return hashlib.sha256(payload).hexdigest()
+
+
+def card_filename(card):
+    student = card['student']
+    folder = slugify(student['stream']) or 'no-stream'
+    return f"{folder}/{student['admission_number']}-{slugify(student['name'])}.pdf"
+
+
+def _initials(user):
+    names = [name for name in (user.first_name, user.last_name) if name]
+    return ''.join(name[0].upper() for name in names) or user.username[:3].upper()
+
+
+def _init_worker(school_id, logo_path, logo_version):
+    import django
+    from django.apps import apps
+
+    # Spawned (rather than forked) workers start without Django configured
+    if not apps.ready:
+        django.setup()
+    pdf_resources.warm(school_id, logo_path, logo_version)
+
+
+# Card layout
+#----------------------------------------------------------------------
+def render_card(card):
+    """Render one report card to PDF. Returns (pdf bytes, page count)."""
+    settings = card['settings']
+    school = card['school']
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        leftMargin=15 * mm,
+        rightMargin=15 * mm,
+        topMargin=15 * mm,
+        bottomMargin=15 * mm,
+        title=f"Report Card - {card['student']['name']}",
+    )
+
+    styles = pdf_resources.styles()
+    title_style = styles['title']
+    subtitle_style = styles['subtitle']
+    section_style = styles['section']
+    body_style = styles['body']
+
+    story = []
+    if settings['show_report_cover']:
+        story.extend(_cover(card, title_style, subtitle_style))
+        story.append(PageBreak())
+
+    story.extend(_header(card, title_style, subtitle_style))
+    story.append(_details_table(card, styles))
+    story.append(Paragraph('Subject Performance', section_style))
+    story.append(_subjects_table(card, styles))
+    story.append(Paragraph('Overall Summary', section_style))
+    story.append(_summary_table(card, styles))
+
+    if settings['show_student_remarks']:
+        story.append(Paragraph("Class Teacher's Remarks", section_style))
+        story.append(Paragraph(settings['class_teacher_remarks'] or 'N/A', body_style))
+        story.append(Paragraph("Principal's Remarks", section_style))
+        story.append(Paragraph(settings['principal_remarks'] or 'N/A', body_style))
+
+    if settings['show_school_fees_layout']:
+        story.append(Paragraph('Term Dates and Fees', section_style))
+        story.append(_fees_table(settings, styles))
+    elif settings['closing_date'] or settings['next_term_begins']:
+        story.append(Spacer(1, 6))
+        story.append(Paragraph(
+            f"Closing date: {settings['closing_date'] or '-'} &nbsp;&nbsp; "
+            f"Next term begins: {settings['next_term_begins'] or '-'}",
+            body_style,
+        ))
+
+    story.append(Spacer(1, 18 * mm))
+    story.append(_signatures_table(styles))
+
+    def decorate(canvas, doc):
+        if settings['show_watermark']:
+            canvas.saveState()
+            canvas.setFont(pdf_resources.FONT_BOLD, 48)
+            canvas.setFillColor(colors.Color(0, 0, 0, alpha=0.06))
+            canvas.translate(A4[0] / 2, A4[1] / 2)
+            canvas.rotate(45)
+            canvas.drawCentredString(0, 0, school['name'])
+            canvas.restoreState()
+
+    doc.build(story, onFirstPage=decorate, onLaterPages=decorate)
+    return buffer.getvalue(), doc.page
+
+
+def _logo(school, size):
+    reader = pdf_resources.logo(school['id'], school['logo_path'], school['logo_version'])
+    if reader is None:
+        return None
+    return pdf_resources.Logo(reader, size)
+
+
+def _cover(card, title_style, subtitle_style):
+    school = card['school']
+    student = card['student']
+    exam = card['exam']
+    story = [Spacer(1, 50 * mm)]
+    logo = _logo(school, 40 * mm)
+    if logo is not None:
+        story.extend([logo, Spacer(1, 10 * mm)])
+    story.extend([
+        Paragraph(school['name'], title_style),
+        Paragraph(f"{exam['name']} - {exam['year']} Term {exam['term']}", subtitle_style),
+        Spacer(1, 20 * mm),
+        Paragraph(student['name'], title_style),
+        Paragraph(
+            f"Adm No: {student['admission_number']} &nbsp; Form {student['form']} {student['stream']}",
+            subtitle_style,
+        ),
+    ])
+    return story
+
+
+def _header(card, title_style, subtitle_style):
+    school = card['school']
+    contact = ', '.join(part for part in (school['address'], school['phone_number'], school['email']) if part)
+    story = []
+    logo = _logo(school, 20 * mm)
+    if logo is not None:
+        story.append(logo)
+    story.append(Paragraph(school['name'], title_style))
+    story.append(Paragraph(f"Academic Report Form - {card['exam']['name']}", subtitle_style))
+    if contact:
+        story.append(Paragraph(contact, subtitle_style))
+    story.append(Spacer(1, 6 * mm))
+    return story
+
+
+def _details_table(card, styles):
+    student = card['student']
+    exam = card['exam']
+    table = Table([
+        [f"Name: {student['name']}", f"Admission No: {student['admission_number']}"],
+        [f"Form: {student['form']} {student['stream']}", f"Exam: {exam['name']} ({exam['year']} Term {exam['term']})"],
+    ], colWidths=['50%', '50%'])
+    table.setStyle(styles['details'])
+    return table
+
+
+def _subjects_table(card, styles):
+    settings = card['settings']
+    header = ['Subject', 'Marks']
+    if settings['show_subject_grades']:
+        header += ['Grade', 'Points']
+    if settings['show_student_remarks']:
+        header.append('Comment')
+    if settings['show_teacher_initials']:
+        header.append('Teacher')
+
+    rows = [header]
+    for subject in card['subjects']:
+        row = [subject['name'], subject['marks']]
+        if settings['show_subject_grades']:
+            row += [subject['grade'], subject['points']]
+        if settings['show_student_remarks']:
+            row.append(subject['comment'] or '')
+        if settings['show_teacher_initials']:
+            row.append(subject['teacher'])
+        rows.append(row)
+    if len(rows) == 1:
+        rows.append(['No results found for this student.'] + [''] * (len(header) - 1))
+
+    table = Table(rows, repeatRows=1)
+    table.setStyle(styles['subjects'])
+    return table
+
+
+def _summary_table(card, styles):
+    settings = card['settings']
+    summary = card['summary']
+    rows = [
+        [f"Total Marks: {summary['total_marks']}", f"Mean Marks: {summary['mean_marks']}"],
+        [f"Total Points: {summary['total_points']}", f"Mean Grade: {summary['mean_grade']}"],
+    ]
+    positions = []
+    if settings['show_stream_rank']:
+        positions.append(f"Stream Position: {summary['stream_position']} of {summary['stream_size']}")
+    if settings['show_overall_rank']:
+        positions.append(f"Overall Position: {summary['overall_position']} of {summary['overall_size']}")
+    if positions:
+        rows.append(positions + [''] * (2 - len(positions)))
+
+    table = Table(rows, colWidths=['50%', '50%'])
+    table.setStyle(styles['summary'])
+    return table
+
+
+def _fees_table(settings, styles):
+    table = Table([
+        ['Closing date', settings['closing_date'] or ''],
+        ['Next term begins', settings['next_term_begins'] or ''],
+        ['Fees balance', ''],
+        ['Next term fees', ''],
+    ], colWidths=['40%', '60%'])
+    table.setStyle(styles['fees'])
+    return table
+
+
+def _signatures_table(styles):
+    table = Table([
+        ['', '', ''],
+        ["Class Teacher's Signature", "Principal's Signature", "Parent's Signature"],
+    ], colWidths=['33%', '34%', '33%'])
+    table.setStyle(styles['signatures'])
+    return table
@@ -1,3 +1,145 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+import zipfile
 
-# Create your tests here.
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from pypdf import PdfReader
+
+from exams.models import Exam, ExamResult, StudentExamSummary
+from school.models import FormLevel, School
+from students.models import Student
+from subjects.models import Subject
+from .models import ReportCardRender
+from .report_cards import ReportCardBatch, card_filename
+
+
+class ReportCardFormTests(TestCase):
+    """Exam.form_level is a form number; cards are loaded by FormLevel id and print the number."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Another school's forms first, so this school's FormLevel ids are not 1-4
+        other = School.objects.create(name='Other School')
+        for number in range(1, 5):
+            FormLevel.objects.create(school=other, number=number)
+
+        cls.school = School.objects.create(name='Report School')
+        cls.forms = {number: FormLevel.objects.create(school=cls.school, number=number) for number in range(1, 5)}
+        cls.exam = Exam.objects.create(school=cls.school, name='End Term', form_level=2, year=2026, term=3)
+        subject = Subject.objects.create(school=cls.school, name='Chemistry', code='CHE')
+        for number, admission_number in ((2, 'F2'), (3, 'F3')):
+            student = Student.objects.create(
+                school=cls.school, name=f'Student {admission_number}', admission_number=admission_number,
+                form_level=cls.forms[number], stream='East',
+            )
+            ExamResult.objects.create(exam=cls.exam, student=student, subject=subject, final_marks=70)
+            StudentExamSummary.objects.create(
+                exam=cls.exam, student=student, total_marks=70, mean_marks=70, mean_grade='B+', total_points=10,
+                stream_position=1, overall_position=1,
+            )
+
+    def test_exam_form_by_default(self):
+        batch = ReportCardBatch(self.exam, workers=1).load()
+        self.assertEqual((batch.form_level_id, batch.form_number), (self.forms[2].id, 2))
+        self.assertEqual([(card['student']['admission_number'], card['student']['form']) for card in batch.cards], [('F2', 2)])
+
+    def test_given_form_level_id(self):
+        batch = ReportCardBatch(self.exam, self.forms[3].id, workers=1).load()
+        self.assertEqual([(card['student']['admission_number'], card['student']['form']) for card in batch.cards], [('F3', 3)])
+
+    def test_form_of_another_school(self):
+        other_form = FormLevel.objects.exclude(school=self.school).first()
+        self.assertEqual(ReportCardBatch(self.exam, other_form.id, workers=1).load().cards, [])
+
+
+class ReportCardOutputTests(TestCase):
+    """Cards written to a ZIP or merged PDF as they are rendered, reusing unchanged stored cards."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.school = School.objects.create(name='Output School')
+        form = FormLevel.objects.create(school=cls.school, number=1)
+        cls.exam = Exam.objects.create(school=cls.school, name='Mid Term', form_level=1, year=2026, term=2)
+        cls.subject = Subject.objects.create(school=cls.school, name='Biology', code='BIO')
+        cls.students = []
+        for position, (name, marks) in enumerate((('Amani', 80), ('Baraka', 65), ('Chebet', 50)), 1):
+            student = Student.objects.create(
+                school=cls.school, name=name, admission_number=f'O{position}', form_level=form, stream='West',
+            )
+            ExamResult.objects.create(exam=cls.exam, student=student, subject=cls.subject, final_marks=marks)
+            StudentExamSummary.objects.create(
+                exam=cls.exam, student=student, total_marks=marks, mean_marks=marks, mean_grade='B', total_points=8,
+                stream_position=position, overall_position=position,
+            )
+            cls.students.append(student)
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def write(self, fmt='zip', progress=None):
+        batch = ReportCardBatch(self.exam, workers=1).load()
+        output = io.BytesIO()
+        stats = batch.write(output, fmt, progress=progress)
+        output.seek(0)
+        return batch, output, stats
+
+    def stored_files(self):
+        return sorted(default_storage.listdir(f'report_cards/{self.exam.id}')[1])
+
+    def test_zip_output(self):
+        batch, output, stats = self.write()
+        with zipfile.ZipFile(output) as archive:
+            names = archive.namelist()
+            self.assertEqual(names, ['west/O1-amani.pdf', 'west/O2-baraka.pdf', 'west/O3-chebet.pdf'])
+            self.assertEqual(names, [card_filename(card) for card in batch.cards])
+            for name in names:
+                self.assertIn('Mid Term', PdfReader(io.BytesIO(archive.read(name))).pages[0].extract_text())
+        self.assertEqual((stats['students'], stats['rendered'], stats['reused']), (3, 3, 0))
+        self.assertEqual(
+            dict(ReportCardRender.objects.filter(exam=self.exam).values_list('student_id', 'content_hash')),
+            {card['student']['id']: card['hash'] for card in batch.cards},
+        )
+
+    def test_merged_pdf_output(self):
+        _, output, stats = self.write('pdf')
+        reader = PdfReader(output)
+        self.assertEqual(len(reader.pages), stats['pages'])
+        self.assertEqual(stats['pages'], sum(ReportCardRender.objects.filter(exam=self.exam).values_list('pages', flat=True)))
+        texts = [page.extract_text() for page in reader.pages]
+        self.assertEqual(
+            [next(name for name in ('Amani', 'Baraka', 'Chebet') if name in text) for text in texts],
+            ['Amani', 'Amani', 'Baraka', 'Baraka', 'Chebet', 'Chebet'],  # a cover page and the report
+        )
+
+    def test_cards_stored_as_they_are_rendered(self):
+        stored = []
+        self.write(progress=lambda done, total: stored.append((done, len(self.stored_files()))))
+        self.assertEqual(stored, [(1, 1), (2, 2), (3, 3)])
+
+    def test_unchanged_cards_reused(self):
+        _, first, _ = self.write()
+        _, second, stats = self.write()
+        self.assertEqual((stats['rendered'], stats['reused']), (0, 3))
+        self.assertEqual(first.getvalue(), second.getvalue())
+
+        ExamResult.objects.filter(exam=self.exam, student=self.students[1]).update(final_marks=66)
+        previous = ReportCardRender.objects.get(exam=self.exam, student=self.students[1]).pdf.name
+        _, output, stats = self.write()
+        self.assertEqual((stats['rendered'], stats['reused']), (1, 2))
+        current = ReportCardRender.objects.get(exam=self.exam, student=self.students[1])
+        self.assertNotEqual(current.pdf.name, previous)
+        self.assertFalse(default_storage.exists(previous))
+        self.assertEqual(len(self.stored_files()), 3)
+        with zipfile.ZipFile(output) as archive:
+            self.assertIn('66', PdfReader(io.BytesIO(archive.read('west/O2-baraka.pdf'))).pages[-1].extract_text())
+
+        # A stored file that has gone missing is rendered again
+        default_storage.delete(ReportCardRender.objects.get(exam=self.exam, student=self.students[0]).pdf.name)
+        _, _, stats = self.write('pdf')
+        self.assertEqual((stats['rendered'], stats['reused']), (1, 2))
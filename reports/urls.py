@@ -4,4 +4,6 @@ from . import views
 urlpatterns = [
     path('settings/create/', views.ReportSettingsCreateView.as_view(), name='report_settings_create'),
     path('settings/update/', views.ReportSettingsUpdateView.as_view(), name='report_settings_update'),
+    path('report-cards/<int:exam_id>/generate/', views.generate_report_cards, name='generate_report_cards'),
+    path('report-cards/<int:job_id>/download/', views.download_report_cards, name='download_report_cards'),
 ]
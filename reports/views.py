@@ -1,17 +1,28 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.generic import CreateView, UpdateView
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, JsonResponse
+from django.views.decorators.http import require_POST
+from accounts.access import for_user
+from .jobs import GENERATE_REPORT_CARDS
 from .models import ReportSettings
+from .report_cards import FORMATS
+from exams.models import Exam
+from jobs.models import Job
 from school.models import School
 
+def is_school_admin_or_hod(user):
+    if user.is_superuser:
+        return True
+    return for_user(user).has_role('School Admin', 'HOD')
+
 # Mixin to restrict views to school admins and HODs
 class SchoolAdminOrHODRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
     def test_func(self):
-        user = self.request.user
-        if user.is_superuser:
-            return True
-        return user.profile.roles.filter(name__in=['School Admin', 'HOD']).exists()
+        return is_school_admin_or_hod(self.request.user)
 
 class ReportSettingsCreateView(SchoolAdminOrHODRequiredMixin, CreateView):
     model = ReportSettings
@@ -41,3 +52,47 @@ class ReportSettingsUpdateView(SchoolAdminOrHODRequiredMixin, UpdateView):
 
     def get_object(self, queryset=None):
         return get_object_or_404(ReportSettings, school=self.request.user.school)
+
+# Bulk report cards
+#----------------------------------------------------------------------
+@login_required
+@user_passes_test(is_school_admin_or_hod)
+@require_POST
+def generate_report_cards(request, exam_id):
+    """Queue rendering of an exam's report cards; poll the returned status URL for progress."""
+    if request.user.is_superuser:
+        exam = get_object_or_404(Exam, pk=exam_id)
+    else:
+        exam = get_object_or_404(Exam, pk=exam_id, school=request.user.school)
+
+    fmt = request.POST.get('format', 'zip')
+    if fmt not in FORMATS:
+        return JsonResponse({'error': f"format must be one of {', '.join(FORMATS)}"}, status=400)
+    payload = {'exam_id': exam.id, 'format': fmt}
+    if request.POST.get('form_level'):
+        if not request.POST['form_level'].isdigit():
+            return JsonResponse({'error': 'form_level must be a number'}, status=400)
+        payload['form_level'] = int(request.POST['form_level'])
+    if request.POST.get('stream'):
+        payload['stream'] = request.POST['stream']
+
+    job = Job.enqueue(GENERATE_REPORT_CARDS, payload, school=exam.school, created_by=request.user)
+    return JsonResponse({
+        'job_id': job.id,
+        'status_url': reverse('jobs:job_status', args=[job.id]),
+        'download_url': reverse('download_report_cards', args=[job.id]),
+    }, status=202)
+
+@login_required
+@user_passes_test(is_school_admin_or_hod)
+def download_report_cards(request, job_id):
+    """The ZIP or merged PDF produced by a finished report card job."""
+    jobs = Job.objects.filter(kind=GENERATE_REPORT_CARDS, status=Job.SUCCEEDED)
+    if not request.user.is_superuser:
+        jobs = jobs.filter(school=request.user.school)
+    job = get_object_or_404(jobs, pk=job_id)
+
+    path = (job.result or {}).get('path')
+    if not path or not default_storage.exists(path):
+        raise Http404("The report card file is no longer available.")
+    return FileResponse(default_storage.open(path, 'rb'), as_attachment=True, filename=path.rsplit('/', 1)[-1])
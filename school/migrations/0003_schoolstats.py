@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-17 23:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchoolStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('student_count', models.IntegerField(default=0)),
+                ('stream_count', models.IntegerField(default=0)),
+                ('teacher_count', models.IntegerField(default=0, help_text='Whole school only')),
+                ('exam_count', models.IntegerField(default=0, help_text='Active exams; for a form, those with results for its students')),
+                ('published_exam_count', models.IntegerField(default=0)),
+                ('summary_count', models.IntegerField(default=0, help_text='Student summaries of active, published exams')),
+                ('avg_points', models.FloatField(blank=True, null=True)),
+                ('avg_marks', models.FloatField(blank=True, null=True)),
+                ('is_stale', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('form_level', models.ForeignKey(blank=True, help_text='Empty for the whole school', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='school.formlevel')),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='school.school')),
+            ],
+            options={
+                'verbose_name_plural': 'School stats',
+                'constraints': [models.UniqueConstraint(fields=('school', 'form_level'), name='unique_school_form_stats'), models.UniqueConstraint(condition=models.Q(('form_level__isnull', True)), fields=('school',), name='unique_school_stats')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 00:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0003_schoolstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='school',
+            name='grading_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -14,9 +14,21 @@ class School(models.Model):
     address = models.CharField(max_length=255, blank=True, null=True)
     phone_number = models.CharField(max_length=20, blank=True, null=True)
     email = models.EmailField(blank=True, null=True)
+    # Stamps the grade tables each process caches (exams.grading_cache); only
+    # ever changed by an UPDATE in the transaction that changes the grading.
+    grading_version = models.PositiveIntegerField(default=0, editable=False)
     
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        # A school loaded before its grading changed must not write the older version back
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'grading_version'
+            ]
+        super().save(*args, **kwargs)
     
     class Meta:
         verbose_name_plural = "Schools"
@@ -73,3 +85,40 @@ class Resource(models.Model):
 
     def __str__(self):
         return f"{self.title} - {self.school.name}"
+
+# Denormalized counters per school (form_level empty) and per form, read by
+# the school dashboards in one query. The Student, Exam, StudentExamSummary
+# and teacher role signal handlers mark a school's rows stale in the writing
+# transaction (summaries, only their forms' rows once it commits);
+# school/stats.py recomputes them on the next read.
+class SchoolStats(models.Model):
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='stats')
+    form_level = models.ForeignKey(FormLevel, on_delete=models.CASCADE, null=True, blank=True, related_name='stats', help_text="Empty for the whole school")
+    student_count = models.IntegerField(default=0)
+    stream_count = models.IntegerField(default=0)
+    teacher_count = models.IntegerField(default=0, help_text="Whole school only")
+    exam_count = models.IntegerField(default=0, help_text="Active exams; for a form, those with results for its students")
+    published_exam_count = models.IntegerField(default=0)
+    summary_count = models.IntegerField(default=0, help_text="Student summaries of active, published exams")
+    avg_points = models.FloatField(null=True, blank=True)
+    avg_marks = models.FloatField(null=True, blank=True)
+    is_stale = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "School stats"
+        constraints = [
+            models.UniqueConstraint(fields=['school', 'form_level'], name='unique_school_form_stats'),
+            models.UniqueConstraint(fields=['school'], condition=models.Q(form_level__isnull=True), name='unique_school_stats'),
+        ]
+
+    def __str__(self):
+        scope = f"Form {self.form_level.number}" if self.form_level_id else "whole school"
+        return f"Stats for {self.school.name} ({scope})"
+
+@receiver(post_save, sender=FormLevel)
+def mark_stats_stale_on_form_level(sender, instance, created, raw=False, **kwargs):
+    from .stats import mark_stale
+
+    if created and not raw:
+        mark_stale(instance.school_id)
@@ -0,0 +1,269 @@
+# school/stats.py
+"""
+Refresh and reads of the denormalized SchoolStats table.
+
+Each school has one SchoolStats row for the whole school and one per form
+level, holding the student, stream, teacher and exam counts and the
+published summary averages that the school dashboards show. Writers do not
+recount anything: the Student, Exam and teacher role signal handlers call
+mark_stale() in their own transaction, so a rolled back write leaves the
+rows as they were, and the next SchoolCounters(school_id).load() reads the
+rows in one query and recomputes the whole school with a fixed number of
+grouped queries.
+
+Summaries are saved on every mark entry and only move the counters of their
+students' forms, so mark_summary_stale() collects them and, once the
+transaction commits, marks just those forms' rows (BulkSummaryEngine, whose
+upserts send no signals, calls mark_forms_stale()). The next read recounts
+the stale forms alone and carries the change in their summary totals into
+the whole school row, instead of grouping every result of the school again.
+"""
+import threading
+
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import FormLevel, SchoolStats
+
+WHOLE_SCHOOL = None
+
+COUNTERS = [
+    'student_count', 'stream_count', 'teacher_count', 'exam_count',
+    'published_exam_count', 'summary_count', 'avg_points', 'avg_marks',
+]
+
+_local = threading.local()
+
+
+def mark_stale(school_id):
+    """Have the next read recompute the school's counters."""
+    if school_id is not None:
+        SchoolStats.objects.filter(school_id=school_id, is_stale=False).update(is_stale=True)
+
+
+def mark_forms_stale(school_id, form_level_ids):
+    """Have the next read recount these forms; students without a form (None) count in the whole school only."""
+    form_level_ids = set(form_level_ids)
+    if None in form_level_ids:
+        mark_stale(school_id)
+    elif form_level_ids:
+        SchoolStats.objects.filter(school_id=school_id, form_level_id__in=form_level_ids, is_stale=False).update(is_stale=True)
+
+
+def mark_summary_stale(exam_id, student_id):
+    """mark_forms_stale() for a student's form, if the exam is active, once the transaction commits."""
+    connection = transaction.get_connection()
+    pending = getattr(_local, 'pending', None)
+    # A commit or rollback replaces run_on_commit, dropping the previous transaction's set
+    if pending is not None and pending[0] is connection.run_on_commit:
+        pending[1].add((exam_id, student_id))
+        return
+    pending = _local.pending = (connection.run_on_commit, {(exam_id, student_id)})
+    transaction.on_commit(lambda: _mark_summaries_stale(pending))
+
+
+def _mark_summaries_stale(pending):
+    from exams.models import Exam
+    from students.models import Student
+
+    if getattr(_local, 'pending', None) is pending:
+        _local.pending = None
+    exam_ids = {exam_id for exam_id, _ in pending[1]}
+    # Summaries of inactive exams are not counted; activating an exam marks the school stale
+    if not Exam.objects.filter(pk__in=exam_ids, is_active=True).exists():
+        return
+    students = Student.objects.filter(pk__in={student_id for _, student_id in pending[1]})
+    SchoolStats.objects.filter(
+        Q(form_level_id__in=students.values('form_level_id'))
+        | Q(form_level__isnull=True, school_id__in=students.filter(form_level__isnull=True).values('school_id')),
+        is_stale=False,
+    ).update(is_stale=True)
+
+
+def refresh(school_id):
+    """Recompute every SchoolStats row of a school. Returns {form_level_id or None: SchoolStats}."""
+    with transaction.atomic():
+        # Clear the flag before counting: a write that lands meanwhile marks the rows stale again
+        SchoolStats.objects.filter(school_id=school_id).update(is_stale=False)
+        counters = _count(school_id)
+
+        existing = set(SchoolStats.objects.filter(school_id=school_id).values_list('form_level_id', flat=True))
+        now = timezone.now()
+        for scope in existing & counters.keys():
+            SchoolStats.objects.filter(school_id=school_id, form_level_id=scope).update(updated_at=now, **counters[scope])
+        # A concurrent refresh may have created some of them; its counts are as current
+        SchoolStats.objects.bulk_create([
+            SchoolStats(school_id=school_id, form_level_id=scope, is_stale=False, **values)
+            for scope, values in counters.items() if scope not in existing
+        ], ignore_conflicts=True)
+    return _read(school_id)
+
+
+def refresh_forms(school_id):
+    """
+    Recount the stale form rows of a school and move the whole school row's
+    summary count and averages by the change in theirs. Returns the rows as
+    refresh() does.
+    """
+    with transaction.atomic():
+        # Locked, so a concurrent refresh of the same forms waits and then finds them current
+        stale = {
+            row.form_level_id: row
+            for row in SchoolStats.objects.select_for_update().filter(school_id=school_id, form_level__isnull=False, is_stale=True)
+        }
+        if not stale:
+            return _read(school_id)
+        SchoolStats.objects.filter(pk__in=[row.pk for row in stale.values()]).update(is_stale=False)
+        counters = _count(school_id, list(stale))
+
+        now = timezone.now()
+        count_change = points_change = marks_change = 0
+        for form_id, row in stale.items():
+            values = counters[form_id]
+            SchoolStats.objects.filter(pk=row.pk).update(updated_at=now, **values)
+            count_change += values['summary_count'] - row.summary_count
+            points_change += _total(values['avg_points'], values['summary_count']) - _total(row.avg_points, row.summary_count)
+            marks_change += _total(values['avg_marks'], values['summary_count']) - _total(row.avg_marks, row.summary_count)
+
+        if count_change or points_change or marks_change:
+            count = F('summary_count') + count_change
+
+            def moved_average(field, change):
+                # Every expression is evaluated against the row as it was before the update
+                return Case(
+                    When(summary_count=-count_change, then=Value(None)),
+                    default=(Coalesce(F(field), 0.0) * F('summary_count') + change) / count,
+                    output_field=FloatField(),
+                )
+
+            SchoolStats.objects.filter(school_id=school_id, form_level__isnull=True).update(
+                summary_count=count,
+                avg_points=moved_average('avg_points', points_change),
+                avg_marks=moved_average('avg_marks', marks_change),
+                updated_at=now,
+            )
+    return _read(school_id)
+
+
+def _total(average, count):
+    return average * count if average is not None else 0
+
+
+def _read(school_id):
+    return {row.form_level_id: row for row in SchoolStats.objects.filter(school_id=school_id).select_related('form_level')}
+
+
+def _count(school_id, form_ids=None):
+    """Counters of the whole school and each of its forms, or of just the forms in form_ids."""
+    from accounts.models import CustomUser
+    from exams.models import Exam, ExamResult, StudentExamSummary
+    from students.models import Student
+
+    whole_school = form_ids is None
+    if whole_school:
+        form_ids = list(FormLevel.objects.filter(school_id=school_id).values_list('id', flat=True))
+    counters = {scope: dict.fromkeys(COUNTERS, 0) for scope in ([WHOLE_SCHOOL] if whole_school else []) + form_ids}
+
+    def scopes(form_id):
+        form_scope = [form_id] if form_id in counters and form_id is not None else []
+        return [WHOLE_SCHOOL] + form_scope if whole_school else form_scope
+
+    def in_scope(queryset, field):
+        return queryset if whole_school else queryset.filter(**{f'{field}__in': form_ids})
+
+    # Students and distinct streams (no stream counts as one, as values('stream').distinct() does)
+    streams = {scope: set() for scope in counters}
+    rows = (
+        in_scope(Student.objects.filter(school_id=school_id), 'form_level_id')
+        .values('form_level_id', 'stream').annotate(count=Count('id'))
+        .values_list('form_level_id', 'stream', 'count')
+    )
+    for form_id, stream, count in rows:
+        for scope in scopes(form_id):
+            counters[scope]['student_count'] += count
+            streams[scope].add(stream)
+    for scope, names in streams.items():
+        counters[scope]['stream_count'] = len(names)
+
+    if whole_school:
+        counters[WHOLE_SCHOOL]['teacher_count'] = CustomUser.objects.filter(
+            school_id=school_id, profile__roles__name='Teacher'
+        ).distinct().count()
+
+        exams = Exam.objects.filter(school_id=school_id, is_active=True).aggregate(
+            exam_count=Count('id'), published_exam_count=Count('id', filter=Q(is_published=True))
+        )
+        counters[WHOLE_SCHOOL].update(exams)
+
+    # A form's exams are the active exams its students have results in
+    rows = (
+        ExamResult.objects.filter(exam__school_id=school_id, exam__is_active=True, student__form_level_id__in=form_ids)
+        .values('student__form_level_id')
+        .annotate(
+            exams=Count('exam_id', distinct=True),
+            published=Count('exam_id', distinct=True, filter=Q(exam__is_published=True)),
+        )
+        .values_list('student__form_level_id', 'exams', 'published')
+    )
+    for form_id, exam_count, published_count in rows:
+        counters[form_id].update(exam_count=exam_count, published_exam_count=published_count)
+
+    totals = {scope: [0, 0, 0.0] for scope in counters}  # summaries, points, marks
+    rows = (
+        in_scope(
+            StudentExamSummary.objects.filter(exam__school_id=school_id, exam__is_active=True, exam__is_published=True),
+            'student__form_level_id',
+        )
+        .values('student__form_level_id')
+        .annotate(count=Count('id'), points=Sum('total_points'), marks=Sum('mean_marks'))
+        .values_list('student__form_level_id', 'count', 'points', 'marks')
+    )
+    for form_id, count, points, marks in rows:
+        for scope in scopes(form_id):
+            totals[scope][0] += count
+            totals[scope][1] += points or 0
+            totals[scope][2] += marks or 0
+    for scope, (count, points, marks) in totals.items():
+        counters[scope].update(
+            summary_count=count,
+            avg_points=points / count if count else None,
+            avg_marks=marks / count if count else None,
+        )
+    return counters
+
+
+class SchoolCounters:
+    """
+    counters = SchoolCounters(school_id).load()
+    counters.school                 SchoolStats of the whole school
+    counters.form(form_level_id)    SchoolStats of a form (zeros if the school has no such form)
+    counters.form_number(number)    the same, by form number
+    """
+
+    def __init__(self, school_id):
+        self.school_id = school_id
+        self.rows = {}
+
+    def load(self):
+        rows = _read(self.school_id)
+        if WHOLE_SCHOOL not in rows or rows[WHOLE_SCHOOL].is_stale:
+            rows = refresh(self.school_id)
+        elif any(row.is_stale for row in rows.values()):
+            rows = refresh_forms(self.school_id)
+        self.rows = rows
+        return self
+
+    @property
+    def school(self):
+        return self.rows.get(WHOLE_SCHOOL) or SchoolStats(school_id=self.school_id)
+
+    def form(self, form_level_id):
+        return self.rows.get(form_level_id) or SchoolStats(school_id=self.school_id, form_level_id=form_level_id)
+
+    def form_number(self, number):
+        for form_level_id, row in self.rows.items():
+            if form_level_id is not None and row.form_level.number == number:
+                return row
+        return SchoolStats(school_id=self.school_id)
@@ -1,6 +1,8 @@
 # school/templatetags/custom_filters.py
 from django import template
 
+from accounts.access import for_user
+
 register = template.Library()
 
 @register.filter(name='get_item')
@@ -15,6 +17,4 @@ def is_teacher(user):
     """
     Returns True if the user has a 'Teacher' role, False otherwise.
     """
-    if hasattr(user, 'profile') and user.profile:
-        return user.profile.roles.filter(name='Teacher').exists()
-    return False
\ No newline at end of file
+    return for_user(user).is_teacher
\ No newline at end of file
@@ -1,3 +1,169 @@
+import random
+
+from django.db import connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from exams.models import Exam, ExamResult, StudentExamSummary
+from students.models import Student
+from subjects.models import Subject
+from .models import FormLevel, School, SchoolStats
+from .stats import COUNTERS, SchoolCounters, refresh
+
+
+class SummaryStalenessTests(TestCase):
+    """Summary writes mark their form's counters stale once per commit, not once per save."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.school = School.objects.create(name='Stats School')
+        form = FormLevel.objects.create(school=cls.school, number=1)
+        FormLevel.objects.create(school=cls.school, number=2)
+        cls.exam = Exam.objects.create(school=cls.school, name='Opener', form_level=1, year=2026, term=1)
+        cls.students = [
+            Student.objects.create(school=cls.school, name=f'Student {n}', admission_number=f'S{n}', form_level=form)
+            for n in range(3)
+        ]
+
+    def setUp(self):
+        SchoolCounters(self.school.id).load()
+        self.assertFalse(self.is_stale())
+
+    def is_stale(self):
+        return SchoolStats.objects.filter(school=self.school, is_stale=True).exists()
+
+    def stale_forms(self):
+        return set(SchoolStats.objects.filter(school=self.school, is_stale=True).values_list('form_level__number', flat=True))
+
+    def save_summaries(self):
+        for student in self.students:
+            StudentExamSummary.objects.update_or_create(
+                exam=self.exam, student=student,
+                defaults=dict(total_marks=50, mean_marks=50, mean_grade='C', total_points=6, stream_position=1, overall_position=1),
+            )
+
+    def test_marked_once_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                self.save_summaries()
+            self.assertFalse(self.is_stale())
+        self.assertEqual(sum(callback.__qualname__.startswith('mark_summary_stale') for callback in callbacks), 1)
+        self.assertEqual(self.stale_forms(), {1})
+
+        # The next transaction marks them again
+        SchoolCounters(self.school.id).load()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.save_summaries()
+        self.assertTrue(self.is_stale())
+
+    def test_rolled_back_writes_leave_counters(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.save_summaries()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertFalse(self.is_stale())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.save_summaries()
+        self.assertTrue(self.is_stale())
+
+    def test_inactive_exam_leaves_counters(self):
+        Exam.objects.filter(pk=self.exam.pk).update(is_active=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.save_summaries()
+        self.assertFalse(self.is_stale())
+
+    def test_student_without_form_marks_the_school(self):
+        student = Student.objects.create(school=self.school, name='No Form', admission_number='S-none')
+        SchoolCounters(self.school.id).load()
+        with self.captureOnCommitCallbacks(execute=True):
+            StudentExamSummary.objects.create(
+                exam=self.exam, student=student, total_marks=50, mean_marks=50, mean_grade='C', total_points=6,
+                stream_position=1, overall_position=1,
+            )
+        self.assertEqual(self.stale_forms(), {None})
+
+
+class FormRefreshTests(TestCase):
+    """Recounting only the stale forms against recounting the whole school."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.school = School.objects.create(name='Counting School')
+        cls.forms = [FormLevel.objects.create(school=cls.school, number=number) for number in (1, 2, 3)]
+        cls.subject = Subject.objects.create(school=cls.school, name='History', code='HIS')
+        cls.exams = [
+            Exam.objects.create(school=cls.school, name=name, form_level=1, year=2026, term=1, is_published=published)
+            for name, published in (('Opener', True), ('Mid Term', True), ('End Term', False))
+        ]
+        cls.students = [
+            Student.objects.create(
+                school=cls.school, name=f'Student {n}', admission_number=f'K{n}', form_level=cls.forms[n % 3], stream='NS'[n % 2]
+            )
+            for n in range(12)
+        ]
+
+    def counters(self, rows):
+        return {scope: [getattr(row, field) for field in COUNTERS] for scope, row in rows.items()}
+
+    def assert_matches_recount(self, rows):
+        actual = self.counters(rows)
+        expected = self.counters(refresh(self.school.id))
+        self.assertEqual(actual.keys(), expected.keys())
+        for scope, values in expected.items():
+            for field, value, expected_value in zip(COUNTERS, actual[scope], values):
+                if isinstance(expected_value, float):
+                    self.assertAlmostEqual(value, expected_value, places=6, msg=(scope, field))
+                else:
+                    self.assertEqual(value, expected_value, (scope, field))
+
+    def test_random_summary_changes(self):
+        generator = random.Random(12)
+        SchoolCounters(self.school.id).load()
+        for _ in range(25):
+            with self.captureOnCommitCallbacks(execute=True):
+                for _ in range(generator.randrange(1, 4)):
+                    exam, student = generator.choice(self.exams), generator.choice(self.students)
+                    if generator.random() < 0.25:
+                        StudentExamSummary.objects.filter(exam=exam, student=student).delete()
+                        ExamResult.objects.filter(exam=exam, student=student).delete()
+                        continue
+                    marks = generator.randrange(20, 90)
+                    ExamResult.objects.update_or_create(
+                        exam=exam, student=student, subject=self.subject, defaults={'final_marks': marks}
+                    )
+                    StudentExamSummary.objects.update_or_create(
+                        exam=exam, student=student,
+                        defaults=dict(
+                            total_marks=marks, mean_marks=marks / 7, mean_grade='C', total_points=generator.randrange(1, 12),
+                            stream_position=1, overall_position=1,
+                        ),
+                    )
+            self.assertFalse(SchoolStats.objects.filter(school=self.school, form_level__isnull=True, is_stale=True).exists())
+            self.assert_matches_recount(SchoolCounters(self.school.id).load().rows)
 
-# Create your tests here.
+    def test_only_stale_forms_recounted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for student in self.students:
+                StudentExamSummary.objects.create(
+                    exam=self.exams[0], student=student, total_marks=60, mean_marks=60, mean_grade='B', total_points=8,
+                    stream_position=1, overall_position=1,
+                )
+        SchoolCounters(self.school.id).load()
+        with self.captureOnCommitCallbacks(execute=True):
+            summary = StudentExamSummary.objects.get(exam=self.exams[0], student=self.students[0])
+            summary.total_points = 11
+            summary.save()
+        self.assertEqual(
+            set(SchoolStats.objects.filter(school=self.school, is_stale=True).values_list('form_level_id', flat=True)),
+            {self.forms[0].id},
+        )
+        with CaptureQueriesContext(connection) as queries:
+            rows = SchoolCounters(self.school.id).load().rows
+        self.assertFalse(any(row.is_stale for row in rows.values()))
+        self.assertFalse(any('users' in query['sql'] for query in queries.captured_queries))
+        self.assertEqual(rows[self.forms[0].id].avg_points, (11 + 8 * 3) / 4)
+        self.assert_matches_recount(rows)
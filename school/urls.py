@@ -50,12 +50,14 @@ urlpatterns = [
     path('subject/<int:form_level>/<str:stream>/<int:subject_id>/entry/', views.subject_entry, name='subject_entry'),
     path('school-wide/', views.school_wide_dashboard, name='school_wide_dashboard'),
     path('departments/', views.departments_dashboard, name='departments_dashboard'),
+    path('department/<int:category_id>/', views.department_dashboard, name='department_dashboard'),
     path('department/<int:category_id>/subjects/', views.category_subjects, name='category_subjects'),
     path('subject/<int:subject_id>/teachers/', views.subject_teachers, name='subject_teachers'),
     path('subject/<int:subject_id>/teachers/add/', views.add_teacher_to_subject, name='add_teacher_to_subject'),
     path('subject/<int:subject_id>/teachers/<int:teacher_id>/remove/', views.remove_teacher_from_subject, name='remove_teacher_from_subject'),
     # Exam Analysis URLs
     path('exam-analysis/<int:form_level>/<int:exam_id>/', views.exam_merit_list, name='exam_merit_list'),
+    path('exam-analysis/<int:form_level>/<int:exam_id>/api/', views.exam_merit_list_api, name='exam_merit_list_api'),
     path('upload-exam/<int:form_level>/<int:exam_id>/<str:stream>/', views.exam_upload_subjects, name='exam_upload_subjects'),
     path('upload-exam/<int:form_level>/<int:exam_id>/', views.exam_upload_streams, name='exam_upload_streams'),
     path('student-report-card/<int:form_level>/', views.form_report_card, name='form_report_card'),
@@ -1,18 +1,25 @@
 # Location: exam_system/school/views.py
 
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import JsonResponse
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.decorators import login_required, user_passes_test
+from accounts.access import for_user
 from accounts.models import CustomUser, Role, TeacherSubject, TeacherClass
 from django.contrib import messages
-from django.db.models import Q, Count, Avg, Max, Min
+from django.db.models import Q, Count, Avg, Max, Min, Sum, F, FloatField, ExpressionWrapper
 from .models import School, FormLevel, Stream
 from .forms import UserCreationForm, FormLevelForm
+from .stats import SchoolCounters
 from students.models import Student
 from subjects.models import Subject, SubjectCategory
-from exams.models import Exam, ExamResult, StudentExamSummary
+from exams.models import Exam, ExamResult, StudentExamSummary, ExamSubjectStats, ExamDepartmentStats
+from exams import analytics, dashboard_cache, grading_cache
+from exams.broadsheet import Broadsheet
+from exams.completion import CompletionMatrix
+from exams.merit_list import DEFAULT_PAGE_SIZE, MeritListPage
 import logging
 
 # Set up logging
@@ -62,35 +69,53 @@ def school_dashboard(request):
     """
     Main dashboard for the school.
     """
-    from events.models import Event
-    from datetime import datetime, timedelta
+    from events.occurrences import EventWindow
+    from datetime import date, datetime
+    from django.utils import timezone
     import calendar as cal
 
     school = request.user.school
 
-    # Get real statistics
-    teacher_count = CustomUser.objects.filter(
-        school=school,
-        profile__roles__name='Teacher'
-    ).distinct().count()
+    # Counts and exam performance come from the school's denormalized counters
+    stats = SchoolCounters(request.user.school_id).load().school
 
     # Calculate student count based on user role
     if request.user.is_superuser:
         # Admin sees all students in school
-        student_count = Student.objects.filter(school=school).count()
+        student_count = stats.student_count
     else:
-        # Teachers see students taking their subjects
-        teacher_subjects = TeacherSubject.objects.filter(teacher=request.user).values_list('subject', flat=True)
-        student_count = Student.objects.filter(
-            school=school,
-            subjects__in=teacher_subjects
-        ).distinct().count()
+        # Teachers see students taking their subjects, cached until students or assignments change
+        def count_students():
+            return Student.objects.filter(
+                school=school,
+                subjects__in=for_user(request.user).subject_ids
+            ).distinct().count()
+
+        student_count = dashboard_cache.get_or_build(
+            'school_dashboard_students', count_students, request.user.school_id, extra=request.user.id, results=False
+        )
 
-    # For now, staff count is 0 as we don't have a staff role yet
-    staff_count = 0
+    # Get overall school performance summary
+    school_performance = {}
+    if stats.summary_count:
+        school_performance = {
+            'avg_points': round(stats.avg_points or 0, 2),
+            'avg_marks': round(stats.avg_marks or 0, 2),
+            'total_exam_results': stats.summary_count,
+        }
 
-    # Count unique streams
-    stream_count = Student.objects.filter(school=school).values('stream').distinct().count()
+    overview = {
+        'teacher_count': stats.teacher_count,
+        'student_count': student_count,
+        # For now, staff count is 0 as we don't have a staff role yet
+        'staff_count': 0,
+        'stream_count': stats.stream_count,
+        'exam_data': {
+            'recent_exams_count': stats.exam_count,
+            'published_exams_count': stats.published_exam_count,
+            'school_performance': school_performance,
+        },
+    }
 
     # Get calendar data for current month
     year = int(request.GET.get('year', datetime.now().year))
@@ -100,61 +125,18 @@ def school_dashboard(request):
     cal_obj = cal.monthcalendar(year, month)
     month_name = cal.month_name[month]
 
-    # Get events for this month
-    start_date = datetime(year, month, 1)
-    if month == 12:
-        end_date = datetime(year + 1, 1, 1)
-    else:
-        end_date = datetime(year, month + 1, 1)
-
-    events = Event.objects.filter(
-        school=school,
-        start_date__gte=start_date,
-        start_date__lt=end_date
-    )
+    # Get events for this month, repeating events expanded; an event that
+    # began last month is listed on the 1st
+    window = EventWindow.for_view(request.user.school_id, 'month', date(year, month, 1)).load()
 
     # Organize events by day
     events_by_day = {}
-    for event in events:
-        day = event.start_date.day
+    for event in window.occurrences:
+        day = max(timezone.localtime(event.start_date).date(), window.first_day).day
         if day not in events_by_day:
             events_by_day[day] = []
         events_by_day[day].append(event)
 
-    # Get high-level exam overview for dashboard
-    recent_exams_count = Exam.objects.filter(
-        school=school,
-        is_active=True
-    ).count()
-
-    published_exams_count = Exam.objects.filter(
-        school=school,
-        is_active=True,
-        is_published=True
-    ).count()
-
-    # Get overall school performance summary
-    all_summaries = StudentExamSummary.objects.filter(
-        exam__school=school,
-        exam__is_active=True,
-        exam__is_published=True
-    )
-
-    school_performance = {}
-    if all_summaries.exists():
-        school_performance = {
-            'avg_points': round(all_summaries.aggregate(Avg('total_points'))['total_points__avg'] or 0, 2),
-            'avg_marks': round(all_summaries.aggregate(Avg('mean_marks'))['mean_marks__avg'] or 0, 2),
-            'total_exam_results': all_summaries.count(),
-        }
-
-    # Prepare exam data for template
-    exam_data = {
-        'recent_exams_count': recent_exams_count,
-        'published_exams_count': published_exams_count,
-        'school_performance': school_performance,
-    }
-
     # Get billing information
     from billing.models import Subscription
     try:
@@ -166,7 +148,6 @@ def school_dashboard(request):
             'amount': subscription.amount,
         }
         # Calculate days remaining
-        from datetime import date
         today = date.today()
         days_remaining = (subscription.end_date - today).days if subscription.end_date > today else 0
         billing_info['days_remaining'] = max(0, days_remaining)
@@ -199,10 +180,7 @@ def school_dashboard(request):
 
     context = {
         'school': school,
-        'teacher_count': teacher_count,
-        'student_count': student_count,
-        'staff_count': staff_count,
-        'stream_count': stream_count,
+        **overview,
         'calendar': cal_obj,
         'calendar_days': calendar_days,
         'year': year,
@@ -210,7 +188,6 @@ def school_dashboard(request):
         'month_name': month_name,
         'events_by_day': events_by_day,
         'today': datetime.now(),
-        'exam_data': exam_data,
         'billing_info': billing_info,
     }
     return render(request, 'school/school_dashboard.html', context)
@@ -280,18 +257,15 @@ def forms_dashboard(request):
     Renders the dashboard for managing forms and classes.
     Shows form levels 1-4 as clickable cards.
     """
-    school = request.user.school
-
     # Get form levels with student counts
+    counters = SchoolCounters(request.user.school_id).load()
     form_levels = []
     for form_level in range(1, 5):
-        student_count = Student.objects.filter(school=school, form_level__number=form_level).count()
-        stream_count = Student.objects.filter(school=school, form_level__number=form_level).values('stream').distinct().count()
-
+        stats = counters.form_number(form_level)
         form_levels.append({
             'form_level': form_level,
-            'student_count': student_count,
-            'stream_count': stream_count,
+            'student_count': stats.student_count,
+            'stream_count': stats.stream_count,
         })
 
     context = {
@@ -311,23 +285,16 @@ def reports_and_analysis(request):
     """
     Exam analysis dashboard showing form levels for analysis selection.
     """
-    school = request.user.school
-
     # Get form levels with exam data
+    counters = SchoolCounters(request.user.school_id).load()
     form_levels = []
     for form_level in range(1, 5):
-        student_count = Student.objects.filter(school=school, form_level=form_level).count()
-        exam_count = Exam.objects.filter(
-            school=school,
-            is_active=True,
-            exam_results__student__form_level=form_level
-        ).distinct().count()
-
-        if exam_count > 0:
+        stats = counters.form(form_level)
+        if stats.exam_count > 0:
             form_levels.append({
                 'form_level': form_level,
-                'student_count': student_count,
-                'exam_count': exam_count,
+                'student_count': stats.student_count,
+                'exam_count': stats.exam_count,
             })
 
     context = {
@@ -414,66 +381,47 @@ def stream_dashboard(request, form_level, stream):
         is_active=True
     ).order_by('name')
 
+    # One grouped query for every subject's stats in this stream
+    stats_by_subject = {
+        row['subject']: row
+        for row in ExamResult.objects.filter(
+            student__school=school,
+            student__form_level=form_level,
+            student__stream=stream,
+            exam__is_active=True
+        ).values('subject').annotate(
+            avg_marks=Avg('final_marks'),
+            max_marks=Max('final_marks'),
+            min_marks=Min('final_marks'),
+            total_marks=Sum('final_marks'),
+            student_count=Count('student', distinct=True)
+        ).order_by()
+    }
+
     # Get subject performance data for cards and table
     subject_stats = []
     subject_performance_data = []
 
     for subject in subjects:
-        # Get results for this subject and stream
-        results = ExamResult.objects.filter(
-            subject=subject,
-            student__school=school,
-            student__form_level=form_level,
-            student__stream=stream,
-            exam__is_active=True
-        ).select_related('student', 'exam')
-
-        if results.exists():
-            avg_marks = results.aggregate(Avg('final_marks'))['final_marks__avg'] or 0
-            max_marks = results.aggregate(Max('final_marks'))['final_marks__max'] or 0
-            min_marks = results.aggregate(Min('final_marks'))['final_marks__min'] or 0
-            total_marks = results.aggregate(Sum('final_marks'))['final_marks__sum'] or 0
-            student_count = results.values('student').distinct().count()
-
-            # Calculate average grade (simplified)
-            avg_grade = 'E'  # Default
-            if avg_marks >= 80:
-                avg_grade = 'A'
-            elif avg_marks >= 75:
-                avg_grade = 'A-'
-            elif avg_marks >= 70:
-                avg_grade = 'B+'
-            elif avg_marks >= 65:
-                avg_grade = 'B'
-            elif avg_marks >= 60:
-                avg_grade = 'B-'
-            elif avg_marks >= 55:
-                avg_grade = 'C+'
-            elif avg_marks >= 50:
-                avg_grade = 'C'
-            elif avg_marks >= 45:
-                avg_grade = 'C-'
-            elif avg_marks >= 40:
-                avg_grade = 'D+'
-            elif avg_marks >= 35:
-                avg_grade = 'D'
-            elif avg_marks >= 30:
-                avg_grade = 'D-'
+        row = stats_by_subject.get(subject.id)
+        if row:
+            avg_marks = row['avg_marks'] or 0
+            avg_grade, _ = grading_cache.grade_table_for(school.id, subject.category_id).grade_and_points(avg_marks)
 
             subject_stats.append({
                 'subject': subject,
                 'avg_marks': round(avg_marks, 2),
-                'student_count': student_count,
+                'student_count': row['student_count'],
             })
 
             subject_performance_data.append({
                 'subject': subject,
                 'average_marks': round(avg_marks, 2),
-                'total_marks': round(total_marks, 2),
-                'max_marks': max_marks,
-                'min_marks': min_marks,
-                'average_grade': avg_grade,
-                'student_count': student_count,
+                'total_marks': round(row['total_marks'] or 0, 2),
+                'max_marks': row['max_marks'] or 0,
+                'min_marks': row['min_marks'] or 0,
+                'average_grade': avg_grade or '-',
+                'student_count': row['student_count'],
             })
         else:
             subject_stats.append({
@@ -562,14 +510,15 @@ def school_wide_dashboard(request):
         student_count=Count('id')
     ).order_by('-avg_total_marks')[:4]
 
-    # Top performing subjects
-    subject_performance = ExamResult.objects.filter(
+    # Top performing subjects, from the materialized whole-form subject stats
+    subject_performance = ExamSubjectStats.objects.filter(
         exam__is_active=True,
-        student__school=school
+        exam__school=school,
+        stream=''
     ).values('subject__name').annotate(
-        avg_marks=Avg('final_marks'),
-        max_marks=Max('final_marks'),
-        student_count=Count('id')
+        students=Sum('student_count'),
+        max_marks=Max('max_marks'),
+        avg_marks=ExpressionWrapper(Sum('total_marks') * 1.0 / Sum('student_count'), output_field=FloatField())
     ).order_by('-avg_marks')[:10]
 
     # Recent exams
@@ -596,65 +545,73 @@ def department_dashboard(request, category_id):
     category = get_object_or_404(SubjectCategory, id=category_id, school=school)
 
     # Get all subjects in this category
-    subjects = Subject.objects.filter(category=category, school=school)
-
-    # Get form-level performance for this department
-    form_performance = []
-    for form_level in range(1, 5):  # Forms 1-4
-        students_in_form = Student.objects.filter(
-            school=school,
-            form_level=form_level
-        )
+    subjects = list(Subject.objects.filter(category=category, school=school))
+    subjects_by_id = {subject.id: subject for subject in subjects}
 
-        # Get exam results for subjects in this category
-        results = ExamResult.objects.filter(
-            subject__in=subjects,
-            student__in=students_in_form,
-            exam__is_active=True
-        ).select_related('student', 'exam', 'subject')
-
-        if results.exists():
-            avg_marks = results.aggregate(Avg('final_marks'))['final_marks__avg'] or 0
-            top_students = results.order_by('-final_marks')[:5]
-
-            # Calculate deviations
-            class_avg = avg_marks
-            deviations = []
-            for result in results.order_by('-exam__created_at')[:10]:
-                deviation = result.final_marks - class_avg
-                deviations.append({
-                    'student': result.student,
-                    'subject': result.subject,
-                    'marks': result.final_marks,
-                    'deviation': deviation,
-                    'exam': result.exam
-                })
+    # The department's rollups per form and exam, latest exam first within each form
+    rollups = list(ExamDepartmentStats.objects.filter(
+        category=category,
+        exam__school=school,
+        exam__is_active=True
+    ).select_related('exam', 'form_level').order_by('form_level__number', '-exam__created_at', '-exam_id'))
+    counters = SchoolCounters(request.user.school_id).load()
 
-            form_performance.append({
-                'form_level': form_level,
-                'student_count': students_in_form.count(),
-                'avg_marks': round(avg_marks, 2),
-                'top_students': top_students,
-                'deviations': deviations[:5],  # Show top 5 deviations
-                'subject_count': subjects.count()
-            })
+    rollups_by_form = {}
+    for rollup in rollups:
+        rollups_by_form.setdefault(rollup.form_level, []).append(rollup)
 
-    # Get overall department statistics
-    all_results = ExamResult.objects.filter(
-        subject__in=subjects,
-        exam__is_active=True,
-        student__school=school
-    )
+    # Every figure of a form covers the same rollups: all of its active exams
+    form_performance = []
+    for form_level, form_rollups in rollups_by_form.items():
+        avg_marks, std_dev = analytics.department_spread(form_rollups)
+        form_performance.append({
+            'form_level': form_level.number,
+            'student_count': counters.form(form_level.id).student_count,
+            'exam_count': len(form_rollups),
+            'avg_marks': round(avg_marks, 2),
+            'std_dev': std_dev,
+            'top_students': analytics.department_top_students(form_rollups, 5),
+            'deviations': analytics.department_deviations(form_rollups, 5),  # Show top 5 deviations
+            'subject_count': len(subjects)
+        })
+    exams = {rollup.exam_id: rollup.exam for rollup in rollups}
 
+    department_total = sum(rollup.total_marks for rollup in rollups)
+    department_count = sum(rollup.result_count for rollup in rollups)
     department_stats = {
-        'total_students': Student.objects.filter(school=school).count(),
-        'total_subjects': subjects.count(),
-        'avg_performance': all_results.aggregate(Avg('final_marks'))['final_marks__avg'] or 0,
-        'top_performers': all_results.values('student').annotate(
-            avg_marks=Avg('final_marks')
-        ).order_by('-avg_marks')[:10]
+        'total_students': counters.school.student_count,
+        'total_subjects': len(subjects),
+        'avg_performance': department_total / department_count if department_count else 0,
+        'top_performers': analytics.department_top_students(rollups, 10),
     }
 
+    # Resolve the student ids held by the rollups in one query
+    student_ids = {student_id for student_id, _ in department_stats['top_performers']}
+    for form_data in form_performance:
+        student_ids.update(student_id for student_id, _ in form_data['top_students'])
+        student_ids.update(deviation[1] for deviation in form_data['deviations'])
+    students = Student.objects.in_bulk(student_ids)
+
+    def ranked(top_students):
+        return [
+            {'student': students[student_id], 'avg_marks': avg_marks}
+            for student_id, avg_marks in top_students if student_id in students
+        ]
+
+    for form_data in form_performance:
+        form_data['top_students'] = ranked(form_data['top_students'])
+        form_data['deviations'] = [
+            {
+                'student': students[student_id],
+                'subject': subjects_by_id.get(subject_id),
+                'marks': marks,
+                'deviation': deviation,
+                'exam': exams[exam_id]
+            }
+            for exam_id, student_id, subject_id, marks, deviation in form_data['deviations'] if student_id in students
+        ]
+    department_stats['top_performers'] = ranked(department_stats['top_performers'])
+
     context = {
         'category': category,
         'subjects': subjects,
@@ -859,35 +816,18 @@ def exam_upload_streams(request, form_level, exam_id):
     school = request.user.school
     exam = get_object_or_404(Exam, id=exam_id, school=school, is_active=True)
 
-    # Get streams for this form
-    streams = Student.objects.filter(
-        school=school,
-        form_level=form_level
-    ).values_list('stream', flat=True).distinct().order_by('stream')
+    # Streams of this form and their completion, from one cached matrix
+    matrix = CompletionMatrix(school.id).load([exam.id])
 
     stream_data = []
-    for stream in streams:
-        student_count = Student.objects.filter(
-            school=school,
-            form_level=form_level,
-            stream=stream
-        ).count()
-
-        # Check completion for this stream
-        existing_results = ExamResult.objects.filter(
-            exam=exam,
-            student__form_level=form_level,
-            student__stream=stream,
-            student__school=school
-        ).count()
-
-        completion_percentage = (existing_results / student_count * 100) if student_count > 0 else 0
-
+    for stream in matrix.streams(form_level):
+        enrolled, entered = matrix.total(exam.id, form_level, stream)
         stream_data.append({
             'stream': stream,
-            'student_count': student_count,
-            'existing_results': existing_results,
-            'completion_percentage': completion_percentage,
+            'student_count': matrix.stream_size(form_level, stream),
+            'enrolled': enrolled,
+            'existing_results': entered,
+            'completion_percentage': matrix.percentage(enrolled, entered),
         })
 
     context = {
@@ -932,25 +872,19 @@ def form_upload_exam(request, form_level):
         is_active=True
     ).order_by('-created_at')
 
+    matrix = CompletionMatrix(school.id).load([exam.id for exam in exams])
+    total_students = matrix.stream_size(form_level)
+
     exam_data = []
     for exam in exams:
-        # Check if results already exist for this form
-        existing_results = ExamResult.objects.filter(
-            exam=exam,
-            student__form_level=form_level,
-            student__school=school
-        ).count()
-
-        total_students = Student.objects.filter(
-            school=school,
-            form_level=form_level
-        ).count()
-
+        # Results entered for this form against every subject its students take
+        enrolled, entered = matrix.total(exam.id, form_level)
         exam_data.append({
             'exam': exam,
-            'existing_results': existing_results,
+            'existing_results': entered,
+            'enrolled': enrolled,
             'total_students': total_students,
-            'completion_percentage': (existing_results / total_students * 100) if total_students > 0 else 0,
+            'completion_percentage': matrix.percentage(enrolled, entered),
         })
 
     context = {
@@ -963,12 +897,11 @@ def student_report_card(request):
     """
     Student Report Card generation - shows form levels for selection.
     """
-    school = request.user.school
-
     # Get form levels with student counts
+    counters = SchoolCounters(request.user.school_id).load()
     form_levels = []
     for form_level in range(1, 5):
-        student_count = Student.objects.filter(school=school, form_level=form_level).count()
+        student_count = counters.form(form_level).student_count
         if student_count > 0:
             form_levels.append({
                 'form_level': form_level,
@@ -985,23 +918,16 @@ def upload_exam(request):
     """
     Upload Exam results - shows form levels for selection.
     """
-    school = request.user.school
-
     # Get form levels with exam data
+    counters = SchoolCounters(request.user.school_id).load()
     form_levels = []
     for form_level in range(1, 5):
-        student_count = Student.objects.filter(school=school, form_level=form_level).count()
-        exam_count = Exam.objects.filter(
-            school=school,
-            is_active=True,
-            exam_results__student__form_level=form_level
-        ).distinct().count()
-
-        if exam_count > 0:
+        stats = counters.form(form_level)
+        if stats.exam_count > 0:
             form_levels.append({
                 'form_level': form_level,
-                'student_count': student_count,
-                'exam_count': exam_count,
+                'student_count': stats.student_count,
+                'exam_count': stats.exam_count,
             })
 
     context = {
@@ -1016,40 +942,28 @@ def exam_merit_list(request, form_level, exam_id):
     school = request.user.school
     exam = get_object_or_404(Exam, id=exam_id, school=school, is_active=True)
 
-    # Get student summaries for this exam and form
-    summaries = StudentExamSummary.objects.filter(
-        exam=exam,
-        student__form_level=form_level,
-        student__school=school
-    ).select_related('student').order_by('-total_marks')
-
-    # Get subjects for this exam
-    subjects = Subject.objects.filter(
-        school=school,
-        is_active=True
-    ).order_by('name')
-
-    # Get subject performance data
-    subject_performance = []
-    for subject in subjects:
-        results = ExamResult.objects.filter(
+    # Get student summaries for this exam and form, in merit order
+    summaries = Broadsheet(exam, form_level, school=school).build(include_results=False).rows
+
+    # Get subject performance data from the exam's materialized stats
+    subject_performance = [
+        {
+            'subject': stats.subject,
+            'avg_marks': stats.mean_marks,
+            'max_marks': stats.max_marks,
+            'min_marks': stats.min_marks,
+            'std_dev': stats.std_dev,
+            'mean_grade': stats.mean_grade,
+            'grade_distribution': stats.grade_distribution,
+            'student_count': stats.student_count,
+        }
+        for stats in ExamSubjectStats.objects.filter(
             exam=exam,
-            subject=subject,
-            student__form_level=form_level,
-            student__school=school
-        )
-
-        if results.exists():
-            avg_marks = results.aggregate(Avg('final_marks'))['final_marks__avg'] or 0
-            max_marks = results.aggregate(Max('final_marks'))['final_marks__max'] or 0
-            student_count = results.count()
-
-            subject_performance.append({
-                'subject': subject,
-                'avg_marks': round(avg_marks, 2),
-                'max_marks': max_marks,
-                'student_count': student_count,
-            })
+            form_level_id=form_level,
+            stream='',
+            subject__is_active=True
+        ).select_related('subject').order_by('subject__name')
+    ]
 
     context = {
         'exam': exam,
@@ -1058,6 +972,36 @@ def exam_merit_list(request, form_level, exam_id):
         'subject_performance': subject_performance,
     }
     return render(request, 'school/exam_merit_list.html', context)
+
+@login_required
+def exam_merit_list_api(request, form_level, exam_id):
+    """
+    JSON merit list pages for an exam and form.
+
+    Query parameters: stream, sort ('position' or 'subject:<id>'),
+    order ('asc'/'desc', for subject sorts), limit and after (the 'next'
+    cursor returned by the previous page).
+    """
+    school = request.user.school
+    exam = get_object_or_404(Exam, id=exam_id, school=school, is_active=True)
+
+    try:
+        page = MeritListPage(
+            exam,
+            form_level,
+            stream=request.GET.get('stream') or None,
+            school=school,
+            sort=request.GET.get('sort', 'position'),
+            order=request.GET.get('order', 'desc'),
+            limit=int(request.GET.get('limit', DEFAULT_PAGE_SIZE)),
+            after=request.GET.get('after'),
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse(page.fetch())
+
+
 @login_required
 def exam_form_analysis(request, form_level):
     """
@@ -1065,28 +1009,32 @@ def exam_form_analysis(request, form_level):
     """
     school = request.user.school
 
-    # Get exams that have results for this form level
-    exams = Exam.objects.filter(
-        school=school,
-        is_active=True,
-        exam_results__student__form_level=form_level
-    ).distinct().order_by('-created_at')
+    def build_exam_data():
+        # Get exams that have results for this form level
+        exams = Exam.objects.filter(
+            school=school,
+            is_active=True,
+            exam_results__student__form_level=form_level
+        ).distinct().order_by('-created_at')
 
-    exam_data = []
-    for exam in exams:
-        student_count = StudentExamSummary.objects.filter(
-            exam=exam,
-            student__form_level=form_level
-        ).count()
+        exam_data = []
+        for exam in exams:
+            student_count = StudentExamSummary.objects.filter(
+                exam=exam,
+                student__form_level=form_level
+            ).count()
 
-        exam_data.append({
-            'exam': exam,
-            'student_count': student_count,
-        })
+            exam_data.append({
+                'exam': exam,
+                'student_count': student_count,
+            })
+        return exam_data
 
     context = {
         'form_level': form_level,
-        'exam_data': exam_data,
+        'exam_data': dashboard_cache.get_or_build(
+            'exam_form_analysis', build_exam_data, request.user.school_id, form_id=form_level
+        ),
     }
     return render(request, 'school/exam_form_analysis.html', context)
 
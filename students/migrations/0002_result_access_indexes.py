@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-17 22:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0002_initial'),
+        ('students', '0001_initial'),
+        ('subjects', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['school', 'form_level', 'stream'], name='students_st_school__9e2170_idx'),
+        ),
+    ]
@@ -1,7 +1,7 @@
 # Location: exam_system/students/models.py
 
-from django.db import models
-from django.db.models.signals import post_save
+from django.db import models, transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -11,6 +11,8 @@ from django.core.validators import MinValueValidator, MaxValueValidator
 
 # We also need to import the School model to link students to a school.
 from school.models import School
+from school import stats as school_stats
+from exams import dashboard_cache
 
 class Student(models.Model):
     """
@@ -40,10 +42,35 @@ class Student(models.Model):
     
     class Meta:
         ordering = ['admission_number']
+        indexes = [
+            models.Index(fields=['school', 'form_level', 'stream']),
+        ]
         
     def __str__(self):
         return self.name
 
+# Dashboards count students per form and stream.
+@receiver([post_save, post_delete], sender=Student)
+def invalidate_dashboards_on_student_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    school_id = instance.school_id
+    transaction.on_commit(lambda: dashboard_cache.bump_structure(school_id))
+
+@receiver([post_save, post_delete], sender=Student)
+def mark_school_stats_stale_on_student_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        school_stats.mark_stale(instance.school_id)
+
+# Mark entry completion counts the students taking each subject. Students
+# and subjects both belong to one school, whichever side the change is on.
+@receiver(m2m_changed, sender=Student.subjects.through)
+def invalidate_dashboards_on_enrolment_change(sender, instance, action, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    school_id = instance.school_id
+    transaction.on_commit(lambda: dashboard_cache.bump_structure(school_id))
+
 class StudentAdvancement(models.Model):
     """
     Model to track student advancement from one form level to another.
@@ -3,8 +3,10 @@ from django.views.generic import ListView, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib import messages
+from accounts.access import for_user
 from .models import Student, StudentAdvancement
 from .forms import StudentForm
+from school.stats import SchoolCounters
 from subjects.models import Subject
 
 # Mixin to restrict views to school admins, HODs, and teachers
@@ -13,7 +15,7 @@ class SchoolAdminOrHODRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
         user = self.request.user
         if user.is_superuser:
             return True
-        return user.profile.roles.filter(name__in=['School Admin', 'HOD', 'Teacher']).exists()
+        return for_user(user).has_role('School Admin', 'HOD', 'Teacher')
 
 class StudentListView(LoginRequiredMixin, ListView):
     model = Student
@@ -30,11 +32,12 @@ class StudentListView(LoginRequiredMixin, ListView):
 
         # Get form levels with student counts
         form_levels = []
+        counters = None if self.request.user.is_superuser else SchoolCounters(self.request.user.school_id).load()
         for form_level in range(1, 5):
             if self.request.user.is_superuser:
                 student_count = Student.objects.filter(form_level=form_level).count()
             else:
-                student_count = Student.objects.filter(school=school, form_level=form_level).count()
+                student_count = counters.form(form_level).student_count
 
             if student_count > 0:
                 form_levels.append({
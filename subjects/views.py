@@ -3,6 +3,7 @@ from django.views.generic import ListView, CreateView, UpdateView, DeleteView, D
 from django.urls import reverse_lazy
 from django.forms import inlineformset_factory
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from accounts.access import for_user
 from .models import Subject, SubjectPaper, SubjectCategory
 from school.models import School
 
@@ -12,7 +13,7 @@ class SchoolAdminOrHODRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
         user = self.request.user
         if user.is_superuser:
             return True
-        return user.profile.roles.filter(name__in=['School Admin', 'HOD', 'Teacher']).exists()
+        return for_user(user).has_role('School Admin', 'HOD', 'Teacher')
 
 class SubjectListView(LoginRequiredMixin, ListView):
     model = Subject